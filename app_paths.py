@@ -0,0 +1,30 @@
+import os
+import sys
+
+APP_NAME = 'YTsectionDL'
+
+
+def cache_dir(*parts):
+    """Per-user cache directory for the app (created on demand)."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        root = os.path.join(base, APP_NAME, 'cache')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        root = os.path.join(base, APP_NAME.lower())
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_dir(*parts):
+    """Per-user directory for state that must survive cache clean-ups (created on demand)."""
+    if sys.platform == 'win32':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+        root = os.path.join(base, APP_NAME)
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        root = os.path.join(base, APP_NAME.lower())
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import re
+import subprocess
+import threading
+
+from app_paths import cache_dir
+from compilation import resolve_streams
+from download_engine import kill_process_tree, popen_kwargs
+
+# Loudness of a video's audio track, for putting cuts in pauses instead of mid-word.
+# ffmpeg decodes the audio to mono 16-bit PCM at a low rate and streams it through a pipe;
+# it is read in fixed-size chunks and reduced to one RMS value per window right away, so
+# memory stays small however long the video is. numpy is imported lazily like yt_dlp.
+
+SAMPLE_RATE = 8000
+WINDOW_SECONDS = 0.05
+CHUNK_SECONDS = 30  # PCM read per pipe read: 480 KB at the rates above
+AUDIO_FORMAT = 'bestaudio/best'
+SILENCE_DB = -40.0  # dBFS below which a window counts as silent
+LOUD_DB = -30.0  # dBFS above which a window counts towards a suggested segment
+MIN_SILENCE = 0.3
+SNAP_DISTANCE = 5.0
+MIN_SEGMENT = 2.0
+SEGMENT_GAP = 1.5  # quieter stretches shorter than this don't split a suggested segment
+SEGMENT_PADDING = 0.25
+FLOOR_DB = -100.0
+
+
+def _runs(mask):
+    """(first, last + 1) window index pairs of the runs of True in a boolean array."""
+    import numpy as np
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+class AudioAnalysis:
+    """RMS level (dBFS) of every window of a track, with silence and loudness queries on it."""
+
+    def __init__(self, levels, window=WINDOW_SECONDS, format_id=None):
+        import numpy as np
+        self.levels = np.asarray(levels, dtype=np.float32)
+        self.window = window
+        self.format_id = format_id
+
+    @property
+    def duration(self):
+        return len(self.levels) * self.window
+
+    def silences(self, threshold_db=SILENCE_DB, min_duration=MIN_SILENCE):
+        """(start, end) seconds of every stretch quieter than threshold_db lasting min_duration or more."""
+        runs = _runs(self.levels < threshold_db)
+        runs = runs[(runs[:, 1] - runs[:, 0]) * self.window >= min_duration]
+        return [(float(a * self.window), float(b * self.window)) for a, b in runs]
+
+    def snap(self, seconds, threshold_db=SILENCE_DB, min_duration=MIN_SILENCE, max_distance=SNAP_DISTANCE):
+        """Middle of the silence nearest to seconds, or None when none is within max_distance."""
+        import numpy as np
+        silences = self.silences(threshold_db, min_duration)
+        if not silences:
+            return None
+        bounds = np.array(silences)
+        # Zero inside a silence, otherwise the distance to its nearer edge
+        distance = np.maximum(np.maximum(bounds[:, 0] - seconds, seconds - bounds[:, 1]), 0.0)
+        nearest = int(np.argmin(distance))
+        if distance[nearest] > max_distance:
+            return None
+        return float(bounds[nearest].mean())
+
+    def suggest_segments(self, threshold_db=LOUD_DB, min_duration=MIN_SEGMENT, gap=SEGMENT_GAP,
+                         padding=SEGMENT_PADDING):
+        """(start, end) seconds of the stretches louder than threshold_db, short dips bridged."""
+        import numpy as np
+        runs = _runs(self.levels >= threshold_db)
+        if not len(runs):
+            return []
+        # A run starts a new segment when the dip before it is at least gap long
+        breaks = np.flatnonzero((runs[1:, 0] - runs[:-1, 1]) * self.window >= gap) + 1
+        starts = runs[np.concatenate(([0], breaks)), 0] * self.window
+        ends = runs[np.concatenate((breaks - 1, [len(runs) - 1])), 1] * self.window
+        keep = ends - starts >= min_duration
+        starts = np.maximum(starts[keep] - padding, 0.0)
+        ends = np.minimum(ends[keep] + padding, self.duration)
+        return [(round(float(a), 3), round(float(b), 3)) for a, b in zip(starts, ends)]
+
+
+def build_decode_command(source, headers=None, rate=SAMPLE_RATE):
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin']
+    if headers:
+        cmd += ['-headers', ''.join(f'{key}: {value}\r\n' for key, value in headers.items())]
+    return cmd + ['-i', source, '-vn', '-ac', '1', '-ar', str(rate), '-f', 's16le', 'pipe:1']
+
+
+def local_key(path):
+    """Cache key of a local file, changing whenever the file does."""
+    st = os.stat(path)
+    return 'file-' + hashlib.sha1(f'{os.path.abspath(path)}|{st.st_size}|{st.st_mtime}'.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Analyses on disk, one .npz per video id (or local_key of a file)."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or cache_dir('audio')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', key) + '.npz')
+
+    def load(self, key):
+        import numpy as np
+        try:
+            with np.load(self._path(key)) as data:
+                return AudioAnalysis(data['levels'], float(data['window']), str(data['format_id']) or None)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key, analysis):
+        import numpy as np
+        path = self._path(key)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, levels=analysis.levels, window=analysis.window, format_id=analysis.format_id or '')
+        os.replace(tmp, path)
+
+
+class AudioAnalyzer:
+    """Streams one track through ffmpeg into an AudioAnalysis.
+
+    on_progress(percent) is called from the thread running run(). One analyzer runs one
+    analysis: once cancelled, even before it starts, it stays cancelled.
+    """
+
+    def __init__(self, on_progress=None, rate=SAMPLE_RATE, window=WINDOW_SECONDS, chunk_seconds=CHUNK_SECONDS):
+        self.on_progress = on_progress
+        self.rate = rate
+        self.window = window
+        self.chunk_seconds = chunk_seconds
+        self._proc = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            proc = self._proc
+        if proc is not None:
+            kill_process_tree(proc)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self, url, info=None, cookies=None):
+        """Analyse the best audio of a YouTube video; None when cancelled, RuntimeError on failure."""
+        if self.cancelled:
+            return None
+        stream = resolve_streams(url, AUDIO_FORMAT, info, cookies)[0]
+        if self.cancelled:
+            return None
+        duration = (info or {}).get('duration') or stream.get('duration')
+        return self._decode(stream['url'], stream.get('http_headers'), duration, stream.get('format_id'))
+
+    def analyze(self, source, headers=None, duration=None, format_id=None):
+        """Analyse a stream URL or local file; None when cancelled, RuntimeError on failure."""
+        return self._decode(source, headers, duration, format_id)
+
+    def _decode(self, source, headers, duration, format_id):
+        import numpy as np
+        samples = max(int(self.rate * self.window), 1)
+        window_bytes = samples * 2
+        chunk_bytes = max(int(self.rate * self.chunk_seconds) * 2 // window_bytes, 1) * window_bytes
+        try:
+            proc = subprocess.Popen(build_decode_command(source, headers, self.rate), stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, **popen_kwargs())
+        except OSError as e:
+            raise RuntimeError(f'ffmpeg could not be started: {e}')
+        with self._lock:
+            self._proc = proc
+        if self.cancelled:
+            kill_process_tree(proc)
+        # stderr is drained on the side so a chatty ffmpeg can't fill its pipe and stall
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+        drain.start()
+        levels, pending, read = [], b'', 0
+        try:
+            while True:
+                chunk = proc.stdout.read(chunk_bytes)
+                if not chunk:
+                    break
+                read += len(chunk)
+                data = pending + chunk
+                usable = len(data) // window_bytes * window_bytes
+                pending = data[usable:]
+                if usable:
+                    frames = np.frombuffer(data[:usable], dtype='<i2').reshape(-1, samples) / 32768.0
+                    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+                    levels.append((20 * np.log10(np.maximum(rms, 10 ** (FLOOR_DB / 20)))).astype(np.float32))
+                if duration and self.on_progress is not None:
+                    self.on_progress(min(read / 2 / self.rate / duration * 100.0, 100.0))
+            proc.wait()
+            drain.join()
+        finally:
+            with self._lock:
+                self._proc = None
+            if proc.poll() is None:
+                kill_process_tree(proc)
+        if self.cancelled:
+            return None
+        if proc.returncode != 0:
+            message = b''.join(errors).decode('utf-8', 'replace').strip()
+            raise RuntimeError(message.splitlines()[-1] if message else f'ffmpeg exited with {proc.returncode}')
+        if not levels:
+            raise RuntimeError('The stream has no audio')
+        return AudioAnalysis(np.concatenate(levels), samples / self.rate, format_id)
@@ -0,0 +1,158 @@
+import math
+import re
+import threading
+import time
+
+# Admission control and bandwidth sharing for segment fetches across every engine in the process.
+#
+# The number of fetches allowed to run starts at the configured maximum. It shrinks by one
+# when running more of them stopped paying (the total rate they shared fell), halves with an
+# admission pause when YouTube throttles: HTTP 403/429 or a total rate that collapsed against
+# the recent average, and grows back by one after each window's worth of fetches that
+# finished without either. Short clips too small to measure a rate from count as well.
+# A global rate budget is split between the running fetches; yt-dlp enforces each share
+# with --limit-rate / ratelimit for its native downloader. ffmpeg-driven section downloads
+# ignore per-process limits, so for those the budget is kept by admission alone: no new
+# fetch starts while the measured total is at the budget.
+
+THROTTLE_ERROR_RE = re.compile(r'HTTP Error (403|429)|Too Many Requests|rate.?limit', re.IGNORECASE)
+COLLAPSE_RATIO = 0.25  # a total rate below this fraction of the recent average counts as throttling
+CONTENTION_RATIO = 0.9  # more concurrency that brings the total below this fraction is given back
+MIN_SAMPLE_BYTES = 512 * 1024  # smaller fetches say nothing about throughput
+RATE_SMOOTHING = 0.3  # weight of the newest fetch in the running average
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+MAX_FRAGMENTS = 8
+SECONDS_PER_FRAGMENT = 30.0  # one more concurrent fragment per this many seconds of media
+FRAGMENT_RATE_FLOOR = 512 * 1024  # bytes/s per fetch below which extra fragments only add contention
+
+
+def is_throttle_error(error):
+    return bool(error) and bool(THROTTLE_ERROR_RE.search(error))
+
+
+class Lease:
+    """Permission for one fetch to run, with the yt-dlp network settings it should use."""
+
+    def __init__(self, fragments, rate_limit):
+        self.fragments = fragments
+        self.rate_limit = rate_limit  # bytes/s, or None for unlimited
+        self.on_rate_change = None  # set by engines that can apply a new rate mid-download
+        self.timer = None
+        self.peers = 1  # most fetches running at once (this one included) during its lifetime
+
+    def set_rate(self, rate_limit):
+        self.rate_limit = rate_limit
+        if self.on_rate_change is not None:
+            self.on_rate_change(rate_limit)
+
+
+class BandwidthScheduler:
+    def __init__(self, max_concurrency, rate_limit=None, max_fragments=MAX_FRAGMENTS):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.rate_limit = rate_limit or None  # bytes/s across all fetches
+        self.max_fragments = max(1, max_fragments)
+        self.window = self.max_concurrency
+        self.average_rate = None  # smoothed bytes/s of a single finished fetch
+        self.aggregate_rate = None  # smoothed total bytes/s, estimated as a fetch's rate times its peers
+        self.backoff_until = 0.0
+        self.strikes = 0
+        self._successes = 0
+        self._active = []
+        self._cond = threading.Condition()
+
+    def acquire(self, media_seconds=None, cancel_event=None):
+        """Block until a fetch of media_seconds may start; returns a Lease, or None when cancelled."""
+        with self._cond:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                wait = self.backoff_until - time.monotonic()
+                if wait <= 0 and len(self._active) < self.window and not self._over_budget():
+                    break
+                self._cond.wait(min(wait, 1.0) if wait > 0 else 1.0)
+            lease = Lease(self._fragments_for(media_seconds), None)
+            self._active.append(lease)
+            for active in self._active:
+                active.peers = max(active.peers, len(self._active))
+            self._rebalance()
+            return lease
+
+    def release(self, lease, error=None):
+        """Account for a finished fetch and adapt the window to what it saw."""
+        if lease is None:
+            return
+        stats = lease.timer.as_dict() if lease.timer is not None else {}
+        with self._cond:
+            if lease in self._active:
+                self._active.remove(lease)
+            rate = stats.get('avg_bps')
+            measured = bool(rate) and (stats.get('bytes') or 0) >= MIN_SAMPLE_BYTES
+            # Sharing the link with peers lowers a fetch's own rate; only the total says if it paid off
+            aggregate = rate * lease.peers if measured else None
+            collapsed = measured and self.aggregate_rate and aggregate < COLLAPSE_RATIO * self.aggregate_rate
+            if is_throttle_error(error) or collapsed:
+                self._throttled()
+            elif measured:
+                contended = lease.peers > 1 and self.aggregate_rate and aggregate < CONTENTION_RATIO * self.aggregate_rate
+                self.average_rate = self._smooth(self.average_rate, rate)
+                self.aggregate_rate = self._smooth(self.aggregate_rate, aggregate)
+                self.strikes = 0
+                if contended:
+                    self.window = max(1, self.window - 1)
+                    self._successes = 0
+                else:
+                    self._succeeded()
+            elif not error:
+                self._succeeded()  # Too small to measure, but it wasn't throttled either
+            self._rebalance()
+            self._cond.notify_all()
+
+    def _succeeded(self):
+        self._successes += 1
+        if self._successes >= self.window and self.window < self.max_concurrency and not self._over_budget():
+            self.window += 1
+            self._successes = 0
+
+    @staticmethod
+    def _smooth(average, value):
+        return value if average is None else RATE_SMOOTHING * value + (1 - RATE_SMOOTHING) * average
+
+    def _throttled(self):
+        self.window = max(1, self.window // 2)
+        self._successes = 0
+        self.backoff_until = time.monotonic() + min(BACKOFF_BASE * 2 ** self.strikes, BACKOFF_MAX)
+        self.strikes += 1
+
+    def _current_rate(self):
+        total = 0.0
+        for lease in self._active:
+            timer = lease.timer
+            if timer is not None and timer.first_byte_at is not None:
+                elapsed = time.monotonic() - timer.first_byte_at
+                if elapsed > 0:
+                    total += timer.bytes / elapsed
+        return total
+
+    def _over_budget(self):
+        return self.rate_limit is not None and bool(self._active) and self._current_rate() >= self.rate_limit
+
+    def _fragments_for(self, media_seconds):
+        if self.strikes:
+            return 1  # Recently throttled: don't open more connections than needed
+        fragments = math.ceil((media_seconds or SECONDS_PER_FRAGMENT) / SECONDS_PER_FRAGMENT)
+        if self.average_rate is not None and self.average_rate < FRAGMENT_RATE_FLOOR:
+            fragments = 1
+        return max(1, min(fragments, self.max_fragments))
+
+    def _rebalance(self):
+        # Equal shares of the budget; engines that can, apply a new share to running downloads
+        share = int(self.rate_limit / max(len(self._active), 1)) if self.rate_limit else None
+        for lease in self._active:
+            if lease.rate_limit != share:
+                lease.set_rate(share)
+
+    def describe(self):
+        with self._cond:
+            rate = f', {self._current_rate() / 1e6:.1f} MB/s' if self._active else ''
+            return f'{len(self._active)}/{self.window} fetches running{rate}'
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bandwidth import BandwidthScheduler
+from clip_cache import DEFAULT_MAX_BYTES as CLIP_CACHE_BYTES, ClipCache
+from cutter import CUT_FAST, CUT_MODES
+from format_index import DEFAULT_CONSTRAINTS, build_format_index, parse_constraints, pick_format
+from download_engine import (DEFAULT_MAX_WORKERS, ENGINES, ENGINE_SUBPROCESS, build_format_string, format_timestamp,
+                             parse_timestamp)
+from job_queue import JobQueue, QueueRunner
+from metadata_cache import InfoCache, fetch_video_info
+from planner import STRATEGIES, STRATEGY_AUTO, estimate_selected_formats, plan_download
+from segments import SegmentList
+from telemetry import Telemetry
+
+# Headless batch mode: downloads the segments listed in a manifest without ever importing Qt.
+#   python batch.py jobs.json            (or: python something.py --batch jobs.json)
+#
+# JSON manifest, either a list of jobs or {"defaults": {...}, "jobs": [...]}:
+#   {"url": "https://www.youtube.com/watch?v=...", "segments": [["00:01:00", "00:02:30"], "1:00:00-1:01:30"],
+#    "type": "video", "format": "137", "output_dir": "clips"}
+# Without "format", "constraints" (default "<=1080p") picks one, e.g. "<=720p, smallest, h264".
+# CSV manifest with a header row: url,start,end and optionally type,format,constraints,output_dir,cookies;
+# rows with the same url form one job.
+
+log = logging.getLogger('batch')
+
+JOB_DEFAULTS = {
+    'type': 'video',
+    'format': None,  # custom format id; picked by constraints when unset
+    'constraints': DEFAULT_CONSTRAINTS,  # e.g. "<=1080p, smallest, h264"
+    'output_dir': '.',
+    'cookies': None,
+    'engine': ENGINE_SUBPROCESS,
+    'strategy': STRATEGY_AUTO,
+    'cut_mode': CUT_FAST,
+    'merge_gap': 0.0,
+}
+
+
+def parse_segment(segment):
+    if isinstance(segment, str):
+        start, sep, end = segment.partition('-')
+        if not sep:
+            raise ValueError(f'segment "{segment}" is not in "start-end" form')
+    else:
+        start, end = segment
+    start, end = (parse_timestamp(str(t).strip()) for t in (start, end))
+    if start is None or end is None or start >= end:
+        raise ValueError(f'invalid segment {segment!r}')
+    return start, end
+
+
+def load_manifest(path):
+    """Return a list of job dicts with defaults applied and segments parsed into a SegmentList."""
+    if path.lower().endswith('.csv'):
+        jobs = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+                job = jobs.setdefault(row['url'], {k: v for k, v in row.items() if k not in ('start', 'end') and v})
+                job.setdefault('segments', []).append([row['start'], row['end']])
+        defaults, raw_jobs = {}, list(jobs.values())
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            defaults, raw_jobs = {}, data
+        else:
+            defaults, raw_jobs = data.get('defaults', {}), data.get('jobs', [])
+    jobs = []
+    for raw in raw_jobs:
+        job = dict(JOB_DEFAULTS, **defaults)
+        job.update(raw)
+        if not job.get('url'):
+            raise ValueError(f'job without url: {raw!r}')
+        job['segments'] = SegmentList(parse_segment(s) for s in raw.get('segments', []))
+        job['merge_gap'] = float(job['merge_gap'])
+        jobs.append(job)
+    return jobs
+
+
+class BatchRunner:
+    """Runs manifest jobs concurrently; workers caps the downloads in flight across all videos.
+
+    One BandwidthScheduler is shared by every job, so the rate budget and throttling
+    backoff apply to the whole run.
+    """
+
+    def __init__(self, workers=DEFAULT_MAX_WORKERS, cache=None, queue=None, telemetry=None, rate_limit=None,
+                 clip_cache=None):
+        self.workers = max(1, workers)
+        self.scheduler = BandwidthScheduler(self.workers, rate_limit)
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.cache = cache if cache is not None else InfoCache()
+        self.queue = queue if queue is not None else JobQueue()
+        self.clip_cache = clip_cache
+        self._runners = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            runners = list(self._runners)
+        for runner in runners:
+            runner.cancel()
+
+    def run(self, jobs):
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            return list(pool.map(self.run_job, jobs))
+        except KeyboardInterrupt:
+            # Kill the running yt-dlp processes before waiting for the workers to wind down
+            self.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+
+    def run_job(self, job):
+        url = job['url']
+        started = time.monotonic()
+        try:
+            info = fetch_video_info(url, job['cookies'], self.cache)
+        except Exception as e:
+            log.error('%s: extraction failed: %s', url, e)
+            return url, [], len(job['segments'])
+        self.telemetry.extraction(url, time.monotonic() - started)
+        title = info.get('title', 'Untitled')
+        mode, format_id = ('custom', job['format']) if job['format'] else ('highest', None)
+        index = build_format_index(info.get('formats', []), job['type']) if not format_id else []
+        if index:
+            try:
+                entry = pick_format(index, parse_constraints(job['constraints']), job['segments'],
+                                    info.get('duration'), job['merge_gap'], self.workers)
+            except ValueError as e:
+                log.error('%s: %s', url, e)
+                return url, [], len(job['segments'])
+            if entry is None:
+                log.error('%s: no format matches "%s"', url, job['constraints'])
+                return url, [], len(job['segments'])
+            log.info('%s: picked %s', title, entry.describe())
+            mode, format_id = 'custom', entry.format_str
+        format_str = build_format_string(mode, job['type'], format_id)
+        plan = plan_download(estimate_selected_formats(info.get('formats', []), mode, job['type'], format_id),
+                             job['segments'], info.get('duration'), job['strategy'], job['merge_gap'], self.workers)
+        log.info('%s: %d segments, %s', title, len(job['segments']), plan.describe())
+        os.makedirs(job['output_dir'], exist_ok=True)
+        segments = self.queue.enqueue(url, title, job['segments'], format_str, job['output_dir'], job['cookies'],
+                                      plan.strategy, job['cut_mode'])
+        return url, *self.run_segments(segments, job, {url: info})
+
+    def run_segments(self, segments, job, infos=None):
+        def describe(idx):
+            return f'{segments[idx].title}: segment {format_timestamp(segments[idx].start)} - ' \
+                   f'{format_timestamp(segments[idx].end)}'
+
+        def done(idx):
+            log.info('%s done', describe(idx))
+
+        def failed(idx, error):
+            log.error('%s failed: %s', describe(idx), error.splitlines()[-1] if error else '')
+
+        def retry(idx, delay, error):
+            log.warning('%s will be retried in %.0fs: %s', describe(idx), delay, error.splitlines()[-1] if error else '')
+
+        runner = QueueRunner(self.queue, job['engine'], self.workers, job['merge_gap'], job['cut_mode'],
+                             scheduler=self.scheduler, cache=self.cache, on_segment_done=done, on_segment_failed=failed,
+                             on_segment_retry=retry, telemetry=self.telemetry, clip_cache=self.clip_cache)
+        with self._lock:
+            self._runners.append(runner)
+        results = runner.run(segments, infos)
+        return results, sum(1 for r in results if not r.ok)
+
+    def resume(self, options, cut_mode=None):
+        """Finish the segments a previous run left pending, one group of jobs per video and cut mode.
+
+        Segments are cut the way they were queued unless cut_mode overrides it.
+        """
+        groups = {}
+        for segment in self.queue.unfinished():
+            mode = cut_mode or segment.cut_mode or options['cut_mode']
+            groups.setdefault((segment.url, mode), []).append(segment)
+
+        def run(item):
+            (url, mode), segments = item
+            return (url, *self.run_segments(segments, dict(options, cut_mode=mode)))
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            return list(pool.map(run, groups.items()))
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='batch', description='Download YouTube sections listed in a manifest, without the GUI')
+    parser.add_argument('manifest', nargs='?', help='JSON or CSV manifest of URLs and time ranges')
+    parser.add_argument('--batch', dest='batch_manifest', metavar='MANIFEST', nargs='?',
+                        help='same as the positional manifest')
+    parser.add_argument('--resume', action='store_true',
+                        help='finish segments left unfinished by an interrupted run (GUI or batch)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help='downloads running at once across all videos')
+    parser.add_argument('--limit-rate', type=float, metavar='MBPS',
+                        help='total download rate across all videos in MB/s')
+    parser.add_argument('--clip-cache', type=float, metavar='GB', default=CLIP_CACHE_BYTES / 2**30,
+                        help='size of the cache that serves previously downloaded sections locally (0 = off)')
+    parser.add_argument('--engine', choices=ENGINES, help='override the manifest download engine')
+    parser.add_argument('--strategy', choices=STRATEGIES, help='override the manifest download strategy')
+    parser.add_argument('--cut-mode', choices=CUT_MODES, help='override the manifest cut mode')
+    args = parser.parse_args(argv)
+    manifest = args.batch_manifest or args.manifest
+    if not manifest and not args.resume:
+        parser.error('a manifest is required')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    runner = BatchRunner(args.workers, rate_limit=args.limit_rate * 1e6 if args.limit_rate else None,
+                         clip_cache=ClipCache(max_bytes=int(args.clip_cache * 2**30)) if args.clip_cache else None)
+    if args.resume:
+        options = dict(JOB_DEFAULTS)
+        if args.engine:
+            options['engine'] = args.engine
+        try:
+            outcomes = runner.resume(options, args.cut_mode)
+        except KeyboardInterrupt:
+            return 130
+        total = sum(len(results) for _, results, _ in outcomes)
+        failed = sum(n for _, _, n in outcomes)
+        log.info('resumed: %d of %d segments downloaded', total - failed, total)
+        log.info('%s (details in %s)', runner.telemetry.summary_text(), runner.telemetry.path)
+        if not manifest:
+            return 1 if failed else 0
+
+    try:
+        jobs = load_manifest(manifest)
+    except (OSError, ValueError, KeyError) as e:
+        log.error('cannot read manifest %s: %s', manifest, e)
+        return 2
+    for job in jobs:
+        for key in ('engine', 'strategy', 'cut_mode'):
+            if getattr(args, key):
+                job[key] = getattr(args, key)
+
+    try:
+        outcomes = runner.run(jobs)
+    except KeyboardInterrupt:
+        return 130
+    total = sum(len(job['segments']) for job in jobs)
+    failed = sum(n for _, _, n in outcomes)
+    log.info('finished: %d of %d segments downloaded across %d videos', total - failed, total, len(jobs))
+    log.info('%s (details in %s)', runner.telemetry.summary_text(), runner.telemetry.path)
+    if runner.clip_cache is not None:
+        log.info('%s', runner.clip_cache.stats_text())
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_engine import ENGINES, build_format_string, create_engine
+
+# Compares the yt-dlp subprocess engine with the in-process YoutubeDL engine on the
+# same video and segments:
+#   python benchmarks/bench_engines.py URL --segments 5 --length 10 --workers 3
+
+
+def cpu_time():
+    """cpu seconds of this process and its waited-for children (yt-dlp, ffmpeg)."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()  # Windows: no rusage, children aren't counted
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_engine(name, url, segments, format_str, workers, cookies):
+    engine = create_engine(name, max_workers=workers)
+    with tempfile.TemporaryDirectory() as out_dir:
+        wall_start = time.perf_counter()
+        cpu_start = cpu_time()
+        results = engine.run(url, segments, format_str, out_dir, 'bench', cookies)
+        wall = time.perf_counter() - wall_start
+        cpu = cpu_time() - cpu_start
+        size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    failed = [r for r in results if not r.ok]
+    return wall, cpu, size, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark segment download engines')
+    parser.add_argument('url')
+    parser.add_argument('--segments', type=int, default=5)
+    parser.add_argument('--length', type=float, default=10.0, help='seconds per segment')
+    parser.add_argument('--gap', type=float, default=30.0, help='seconds between segment starts')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--type', choices=['video', 'audio'], default='video')
+    parser.add_argument('--cookies')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES)
+    args = parser.parse_args()
+
+    segments = [(i * args.gap, i * args.gap + args.length) for i in range(args.segments)]
+    format_str = build_format_string('highest', args.type)
+    print(f"{args.segments} segments x {args.length:.0f}s, {args.workers} worker(s), format {format_str}")
+    # cpu includes the yt-dlp and ffmpeg child processes, so both engines pay for all their work
+    print(f"{'engine':<12}{'wall s':>10}{'cpu s':>10}{'s/segment':>12}{'MiB':>10}  failed")
+    for name in args.engines:
+        wall, cpu, size, failed = run_engine(name, args.url, segments, format_str, args.workers, args.cookies)
+        print(f"{name:<12}{wall:>10.2f}{cpu:>10.2f}{wall / len(segments):>12.2f}{size / 2**20:>10.1f}  {len(failed)}")
+        for r in failed:
+            print(f"    segment {r.index}: {(r.error or 'cancelled').splitlines()[-1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from media_server import MediaServer, make_media  # noqa: E402
+
+# Offline end-to-end benchmark of the segment pipeline (extraction, queue, engine, cuts)
+# against synthetic media served locally, so it runs without YouTube, e.g. in CI:
+#   python benchmarks/bench_pipeline.py --segments 1 5 20 --length 10 --workers 1 3 \
+#       --latency 0.05 --bandwidth 8 --out bench-results.jsonl
+# Every configuration runs in a fresh process (clean peak RSS) and prints one JSON record;
+# --out appends them with the git commit so results can be compared over time.
+
+DEFAULT_MEDIA_DIR = os.path.join(tempfile.gettempdir(), 'ytsectiondl-bench-media')
+
+
+def resource_usage():
+    """(cpu seconds of this process and its waited-for children, peak RSS in bytes of each)."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time(), None, None  # Windows: no rusage
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, own.ru_maxrss * scale, children.ru_maxrss * scale
+
+
+def run_pipeline(url, segments, length, workers, engine, strategy, cut_mode, merge_gap):
+    from bandwidth import BandwidthScheduler
+    from job_queue import JobQueue, QueueRunner
+    from metadata_cache import InfoCache, fetch_video_info
+    from telemetry import Telemetry
+
+    with tempfile.TemporaryDirectory() as work:
+        queue = JobQueue(os.path.join(work, 'jobs.sqlite3'))
+        telemetry = Telemetry(os.path.join(work, 'metrics.jsonl'))
+        out_dir = os.path.join(work, 'out')
+        os.makedirs(out_dir)
+        cpu_start, _, _ = resource_usage()
+        wall_start = time.perf_counter()
+
+        info = fetch_video_info(url, cache=InfoCache(os.path.join(work, 'info')))
+        extract = time.perf_counter() - wall_start
+        telemetry.extraction(url, extract)
+        duration = info.get('duration') or 600
+        spacing = max(duration - length, 0) / max(segments, 1)
+        ranges = [(round(i * spacing, 3), round(i * spacing + length, 3)) for i in range(segments)]
+        rows = queue.enqueue(url, 'bench', ranges, 'best', out_dir, strategy=strategy)
+        runner = QueueRunner(queue, engine, workers, merge_gap, cut_mode, cache=None, telemetry=telemetry,
+                             scheduler=BandwidthScheduler(workers))
+        results = runner.run(rows, {url: info})
+
+        wall = time.perf_counter() - wall_start
+        cpu_end, rss_self, rss_children = resource_usage()
+        output_bytes = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+        summary = telemetry.summary()
+        queue.close()
+    return {
+        'wall_s': round(wall, 3),
+        'extract_s': round(extract, 3),
+        'cpu_s': round(cpu_end - cpu_start, 3),
+        'peak_rss_bytes': rss_self,
+        'peak_child_rss_bytes': rss_children,
+        'output_bytes': output_bytes,
+        'segments_ok': sum(1 for r in results if r.ok),
+        'phases_s': summary['phases_s'],
+        'fragment_retries': summary['fragment_retries'],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the segment download pipeline')
+    parser.add_argument('--segments', type=int, nargs='+', default=[5], help='segment counts to run')
+    parser.add_argument('--length', type=float, nargs='+', default=[10.0], help='segment lengths in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[3], help='concurrency levels')
+    parser.add_argument('--engine', nargs='+', default=['subprocess'], help='subprocess and/or in-process')
+    parser.add_argument('--strategy', nargs='+', default=['sections'], help='sections and/or full')
+    parser.add_argument('--cut-mode', default='fast')
+    parser.add_argument('--merge-gap', type=float, default=0.0)
+    parser.add_argument('--duration', type=int, default=600, help='length of the synthetic video')
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every HTTP response')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='server uplink in MB/s, 0 = unlimited')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--media-dir', default=DEFAULT_MEDIA_DIR, help='where synthetic media is kept between runs')
+    parser.add_argument('--out', help='append JSON records to this file')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        config = json.loads(args.child)
+        print(json.dumps(run_pipeline(**config)))
+        return
+
+    media = make_media(args.media_dir, args.duration, args.height)
+    server = MediaServer(args.media_dir, args.latency, args.bandwidth * 1e6 or None).start()
+    commit = git_commit()
+    try:
+        for segments, length, workers, engine, strategy, _ in itertools.product(
+                args.segments, args.length, args.workers, args.engine, args.strategy, range(args.repeat)):
+            config = {'url': server.url_for(media), 'segments': segments, 'length': length, 'workers': workers,
+                      'engine': engine, 'strategy': strategy, 'cut_mode': args.cut_mode, 'merge_gap': args.merge_gap}
+            sent_before = server.bytes_sent
+            requests_before = server.requests
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                                  cwd=ROOT, capture_output=True, text=True)
+            lines = proc.stdout.strip().splitlines()
+            record = {
+                'time': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'commit': commit,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'server': {'latency_s': args.latency, 'bandwidth_MBps': args.bandwidth or None,
+                           'media_duration_s': args.duration, 'media_height': args.height},
+                'config': {k: v for k, v in config.items() if k != 'url'},
+                'bytes_transferred': server.bytes_sent - sent_before,
+                'http_requests': server.requests - requests_before,
+            }
+            if proc.returncode == 0 and lines:
+                record['result'] = json.loads(lines[-1])
+            else:
+                record['error'] = (proc.stderr.strip().splitlines() or ['failed'])[-1]
+            print(json.dumps(record), flush=True)
+            if args.out:
+                with open(args.out, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Idle CPU time and wakeups (context switches) of the GUI process and its QtWebEngine children
+# while a loaded video sits paused and while it plays. Compare the push-based player bridge
+# against the old 100 ms runJavaScript polling by pointing --app at an older copy of the GUI:
+#   git show <old commit>:something.py > /tmp/something_polling.py
+#   python benchmarks/bench_player_idle.py --app /tmp/something_polling.py --app something.py
+
+DEFAULT_URL = 'https://www.youtube.com/watch?v=aqz-KE-bpKQ'
+
+
+def tree_pids(pid):
+    pids = [pid]
+    try:
+        import psutil
+        return pids + [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except ImportError:
+        pass
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents.setdefault(int(f.read().rsplit(')', 1)[1].split()[1]), []).append(int(entry))
+            except OSError:
+                continue
+    i = 0
+    while i < len(pids):
+        pids.extend(parents.get(pids[i], []))
+        i += 1
+    return pids
+
+
+def process_stats(pid):
+    """(cpu seconds, context switches) of one process, all threads included."""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        cpu, switches = process.cpu_times(), process.num_ctx_switches()
+        return cpu.user + cpu.system, switches.voluntary + switches.involuntary
+    except ImportError:
+        pass
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    switches = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith(('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches')):
+                switches += int(line.split()[1])
+    return cpu, switches
+
+
+def tree_stats():
+    cpu = switches = 0
+    for pid in tree_pids(os.getpid()):
+        try:
+            c, s = process_stats(pid)
+        except (OSError, ValueError):
+            continue  # Exited between listing and reading
+        cpu, switches = cpu + c, switches + s
+    return cpu, switches
+
+
+def load_app(path):
+    sys.path[:0] = [os.path.dirname(os.path.abspath(path)), ROOT]
+    spec = importlib.util.spec_from_file_location('bench_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def wait(app, seconds):
+    # Blocks in Qt's own event loop: polling it from here would add wakeups of its own to the measurement
+    from PyQt5.QtCore import QTimer
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+
+
+def measure(app, seconds):
+    cpu, switches = tree_stats()
+    wait(app, seconds)
+    end_cpu, end_switches = tree_stats()
+    return {'cpu_percent': 100.0 * (end_cpu - cpu) / seconds, 'wakeups_per_s': (end_switches - switches) / seconds}
+
+
+def run(path, url, seconds, settle):
+    from PyQt5.QtWidgets import QApplication
+    module = load_app(path)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = module.YouTubeDownloader()
+    # Metadata and storyboard fetches are not what is being measured
+    window.fetch_formats = lambda: None  # GUIs from before the session prefetch
+    window.start_fetch_formats = lambda: None
+    if hasattr(window, 'prefetch'):
+        window.prefetch.fetch = lambda *args, **kwargs: False  # load_video calls it directly
+    window.show()
+    window.url_input.setText(url)
+    window.load_video()
+    deadline = time.monotonic() + 60
+    while not window.player_ready and time.monotonic() < deadline:
+        wait(app, 0.1)
+    if not window.player_ready:
+        raise SystemExit(f'{path}: player did not become ready')
+    wait(app, settle)
+    results = {'paused': measure(app, seconds)}
+    window.safe_play_video()
+    wait(app, settle)
+    results['playing'] = measure(app, seconds)
+    window.safe_pause_video()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure idle CPU and wakeups of the player')
+    parser.add_argument('--app', action='append', help='GUI script to measure (repeatable); default something.py')
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--seconds', type=float, default=20.0, help='length of each measurement window')
+    parser.add_argument('--settle', type=float, default=5.0, help='wait before measuring')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.child, args.url, args.seconds, args.settle)))
+        return
+    # Each app runs in its own process so their web engines and timers cannot disturb each other
+    import subprocess
+    results = {}
+    for path in args.app or [os.path.join(ROOT, 'something.py')]:
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', path, '--url', args.url,
+               '--seconds', str(args.seconds), '--settle', str(args.settle)]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        lines = out.stdout.strip().splitlines()
+        results[path] = json.loads(lines[-1]) if out.returncode == 0 and lines else None
+        if results[path] is None:
+            print(out.stderr.strip().splitlines()[-1:] or f'{path} failed', file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'app':<40}{'state':<10}{'cpu %':>8}{'wakeups/s':>12}")
+    for path, stats in results.items():
+        for state, values in (stats or {}).items():
+            print(f"{os.path.basename(path):<40}{state:<10}{values['cpu_percent']:>8.2f}{values['wakeups_per_s']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_player_idle import DEFAULT_URL, ROOT, load_app, tree_pids, wait  # noqa: E402
+
+# Memory and seek latency of the preview backends. Each backend runs in its own process:
+#   python benchmarks/bench_preview.py --backend web --backend mpv --seeks 20
+# Memory is the summed RSS of the GUI process and its children (QtWebEngine renderers) once
+# the video is loaded. Seek latency is the time from a seek to the first reported playhead
+# within a second after the target, measured while playing with 50 ms time updates.
+
+TIME_UPDATE_MS = 50
+SEEK_TIMEOUT = 15.0
+
+
+def process_rss(pid):
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def tree_rss():
+    total = 0
+    for pid in tree_pids(os.getpid()):
+        try:
+            total += process_rss(pid)
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def run(backend, url, seeks, settle):
+    from PyQt5.QtWidgets import QApplication
+    module = load_app(os.path.join(ROOT, 'something.py'))
+    module.QApplication.setAttribute(module.Qt.AA_ShareOpenGLContexts)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    baseline = tree_rss()
+    window = module.YouTubeDownloader()
+    window.show()
+    window.preview_mode.setCurrentText(backend)
+    window.time_update_input.setValue(TIME_UPDATE_MS)
+    window.url_input.setText(url)
+    window.load_video()
+    deadline = time.monotonic() + 90
+    while not window.player_ready and time.monotonic() < deadline:
+        wait(app, 0.1)
+    if not window.player_ready:
+        raise SystemExit(f'{backend}: player did not become ready')
+    window.safe_play_video()
+    wait(app, settle)
+    rss = tree_rss()
+
+    duration = (window.video_info or {}).get('duration') or 300
+    rng = random.Random(1)
+    latencies = []
+    reported = []
+    window.preview.time_changed.connect(reported.append)
+    for _ in range(seeks):
+        target = rng.uniform(5, max(duration - 30, 10))
+        del reported[:]
+        start = time.perf_counter()
+        window.safe_seek_to(target)
+        while time.perf_counter() - start < SEEK_TIMEOUT:
+            app.processEvents()
+            if any(target - 0.05 <= t <= target + 1.0 for t in reported):
+                latencies.append(time.perf_counter() - start)
+                break
+            time.sleep(0.001)
+        wait(app, 0.5)
+    window.safe_pause_video()
+    latencies.sort()
+    return {
+        'rss_mb': rss / 2 ** 20,
+        'rss_added_mb': (rss - baseline) / 2 ** 20,
+        'seeks': seeks,
+        'seeks_completed': len(latencies),
+        'seek_median_ms': 1000 * latencies[len(latencies) // 2] if latencies else None,
+        'seek_max_ms': 1000 * latencies[-1] if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory and seek latency of the preview backends')
+    parser.add_argument('--backend', action='append', help='web or mpv (repeatable); default both')
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--seeks', type=int, default=20)
+    parser.add_argument('--settle', type=float, default=5.0, help='playback before memory is sampled')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.child, args.url, args.seeks, args.settle)))
+        return
+    results = {}
+    for backend in args.backend or ['web', 'mpv']:
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', backend, '--url', args.url,
+               '--seeks', str(args.seeks), '--settle', str(args.settle)]
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        lines = out.stdout.strip().splitlines()
+        results[backend] = json.loads(lines[-1]) if out.returncode == 0 and lines else None
+        if results[backend] is None:
+            print(out.stderr.strip().splitlines()[-1:] or f'{backend} failed', file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':<10}{'RSS MB':>10}{'added MB':>10}{'seek med ms':>13}{'seek max ms':>13}{'done':>8}")
+    for backend, r in results.items():
+        if r is None:
+            print(f"{backend:<10}{'failed (not installed?)':>30}")
+            continue
+        med = f"{r['seek_median_ms']:.0f}" if r['seek_median_ms'] is not None else '-'
+        worst = f"{r['seek_max_ms']:.0f}" if r['seek_max_ms'] is not None else '-'
+        print(f"{backend:<10}{r['rss_mb']:>10.0f}{r['rss_added_mb']:>10.0f}{med:>13}{worst:>13}"
+              f"{r['seeks_completed']:>5}/{r['seeks']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Startup time of the headless batch CLI against the imports the GUI pays before its first window,
+# and the GUI's own time-to-first-paint and time-to-interactive (yt_dlp loaded), cold and warm:
+#   python benchmarks/bench_startup.py --runs 10
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py --json    (on a headless machine)
+# "cold" runs use an empty bytecode cache and, when allowed (root on Linux), a dropped page cache.
+
+CASES = {
+    'batch --help': [sys.executable, os.path.join(ROOT, 'batch.py'), '--help'],
+    'something.py --batch': [sys.executable, os.path.join(ROOT, 'something.py'), '--help', '--batch'],
+    'gui imports': [sys.executable, '-c', 'import PyQt5.QtWidgets, PyQt5.QtWebEngineWidgets'],
+}
+
+QT_CHECK = "import sys, batch; print(sorted({m.split('.')[0] for m in sys.modules if m.startswith(('PyQt5', 'PySide'))}))"
+
+
+def time_command(cmd, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, cwd=ROOT, capture_output=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None
+    return times
+
+
+def drop_page_cache():
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+def time_gui(cold):
+    """Seconds from launch to the window's first paint and to interactive, or None on failure."""
+    env = dict(os.environ, YTSECTIONDL_STARTUP_TRACE='1')
+    with tempfile.TemporaryDirectory() as pycache:
+        if cold:
+            env['PYTHONPYCACHEPREFIX'] = pycache
+            drop_page_cache()
+        launched = time.time()
+        try:
+            result = subprocess.run([sys.executable, os.path.join(ROOT, 'something.py')], cwd=ROOT, env=env,
+                                    capture_output=True, text=True, timeout=120)
+        except subprocess.TimeoutExpired:
+            return None
+    marks = {}
+    for line in result.stderr.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == 'startup':
+            marks[parts[1]] = float(parts[2]) - launched
+    if 'first_paint' not in marks or 'interactive' not in marks:
+        return None
+    return marks
+
+
+def summarize_gui(runs, cold):
+    marks = [time_gui(cold) for _ in range(runs)]
+    if any(m is None for m in marks):
+        return None
+    return {stage: {'median_s': statistics.median(m[stage] for m in marks), 'min_s': min(m[stage] for m in marks),
+                    'runs': len(marks)} for stage in ('first_paint', 'interactive')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CLI and GUI startup')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    qt_modules = subprocess.run([sys.executable, '-c', QT_CHECK], cwd=ROOT, capture_output=True, text=True)
+    results = {'qt_modules_after_import_batch': qt_modules.stdout.strip() or qt_modules.stderr.strip(), 'cases': {}}
+    for name, cmd in CASES.items():
+        times = time_command(cmd, args.runs)
+        results['cases'][name] = None if times is None else {
+            'median_s': statistics.median(times), 'min_s': min(times), 'runs': len(times)}
+    # Cold first so its page cache state is not the warm runs' leftovers
+    for temperature in ('cold', 'warm'):
+        stages = summarize_gui(args.runs if temperature == 'warm' else max(1, args.runs // 3), temperature == 'cold')
+        for stage in ('first_paint', 'interactive'):
+            results['cases'][f'gui {temperature} {stage}'] = stages and stages[stage]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Qt modules loaded by 'import batch': {results['qt_modules_after_import_batch']}")
+    print(f"{'case':<30}{'median ms':>12}{'min ms':>10}")
+    for name, stats in results['cases'].items():
+        if stats is None:
+            print(f"{name:<30}{'failed (not installed?)':>22}")
+        else:
+            print(f"{name:<30}{stats['median_s'] * 1000:>12.1f}{stats['min_s'] * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import os
+import re
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline stand-in for a video host: synthetic media made with ffmpeg's lavfi sources, served
+# over HTTP with range requests, a per-request latency and a bandwidth cap shared by all
+# connections (like one uplink). yt-dlp's generic extractor takes the file URL as a video.
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def make_media(directory, duration=600, height=720, fps=30, gop_seconds=2.0, video_kbps=2500):
+    """Create (once) an H.264/AAC mp4 of duration seconds in directory and return its path."""
+    name = f'synthetic-{duration}s-{height}p{fps}-g{gop_seconds:g}-{video_kbps}k.mp4'
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    width = height * 16 // 9 // 2 * 2
+    tmp = path + '.tmp.mp4'
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+           '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}',
+           '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+           '-t', str(duration), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(int(fps * gop_seconds)),
+           '-b:v', f'{video_kbps}k', '-maxrate', f'{video_kbps}k', '-bufsize', f'{video_kbps * 2}k',
+           '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', tmp]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp, path)
+    return path
+
+
+class TokenBucket:
+    """Bandwidth shared by every connection of the server; rate None means unlimited."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + nbytes / self.rate
+            delay = self._next_free - now
+        time.sleep(delay)
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, directory, latency=0.0, bandwidth=None, port=0):
+        super().__init__(('127.0.0.1', port), MediaRequestHandler)
+        self.directory = directory
+        self.latency = latency  # seconds added before every response
+        self.bucket = TokenBucket(bandwidth)  # bytes/s
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def url_for(self, path):
+        return f'http://127.0.0.1:{self.server_address[1]}/{os.path.basename(path)}'
+
+    def count(self, nbytes, request=False):
+        with self._lock:
+            self.bytes_sent += nbytes
+            self.requests += request
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        server = self.server
+        server.count(0, request=True)
+        if server.latency:
+            time.sleep(server.latency)
+        path = os.path.join(server.directory, os.path.basename(self.path.split('?')[0]))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = RANGE_RE.match(self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)  # suffix range: the last N bytes
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    server.bucket.consume(len(chunk))
+                    self.wfile.write(chunk)
+                    server.count(len(chunk))
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg closes connections as soon as it has the range it wanted
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from app_paths import cache_dir
+from cutter import cut_segment
+from keyframes import probe_keyframes
+
+# Finished clips kept by (video id, format, start, end) so a section downloaded before never
+# goes back to the network: an exact hit is hardlinked (or copied) to the new output, a
+# cached clip containing the section is cut locally, and only what no clip covers is downloaded.
+
+DEFAULT_MAX_BYTES = 5 * 2**30
+HIT_EXACT = 'exact'
+HIT_CUT = 'cut'
+
+
+def link_or_copy(source, target):
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)  # Other filesystem, or no hardlinks there
+
+
+class ClipCache:
+    """On-disk store of downloaded clips, least recently used evicted once past max_bytes.
+
+    The index is one JSON file of entries
+    {video, format, start, end, clip_start, clip_end, file, size, precise, used}.
+    format is the format string the clip was downloaded with; start and end are the range
+    that was asked for and clip_start and clip_end the range the file really holds, wider
+    when a fast cut snapped to keyframes. precise marks frame-accurate clips, the only ones
+    that can serve a precise request.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or cache_dir('clips')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.cut_hits = 0
+        self.misses = 0
+        self._index_path = os.path.join(self.directory, 'index.json')
+        self._lock = threading.Lock()
+
+    def stats_text(self):
+        return f"clip cache: {self.hits} reused, {self.cut_hits} cut locally, {self.misses} downloaded"
+
+    def _load(self):
+        try:
+            with open(self._index_path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return []
+        # Files removed behind our back drop out of the index
+        return [e for e in entries if os.path.exists(os.path.join(self.directory, e['file']))]
+
+    def _save(self, entries):
+        tmp = self._index_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp, self._index_path)
+
+    @staticmethod
+    def clip_bounds(entry):
+        # Entries written before the actual bounds were recorded hold the requested range
+        return entry.get('clip_start', entry['start']), entry.get('clip_end', entry['end'])
+
+    def _find(self, entries, video, format_str, start, end, precise):
+        candidates = [e for e in entries if e['video'] == video and e['format'] == format_str
+                      and (e['precise'] or not precise)]
+        for e in candidates:
+            if abs(e['start'] - start) < 1e-3 and abs(e['end'] - end) < 1e-3:
+                return e, HIT_EXACT
+        containing = [e for e in candidates if self.clip_bounds(e)[0] <= start and end <= self.clip_bounds(e)[1]]
+        if containing:
+            return min(containing, key=lambda e: self.clip_bounds(e)[1] - self.clip_bounds(e)[0]), HIT_CUT
+        return None, None
+
+    def uncached(self, video, format_str, ranges, precise=False):
+        """The (start, end) of ranges no cached clip serves; reads the index once, not per range.
+
+        Does not count as a use.
+        """
+        ranges = list(ranges)
+        if not self.max_bytes:
+            return ranges
+        with self._lock:
+            entries = [e for e in self._load() if e['video'] == video and e['format'] == format_str]
+        return [(start, end) for start, end in ranges
+                if self._find(entries, video, format_str, start, end, precise)[0] is None]
+
+    def serve(self, video, format_str, start, end, output_stem, cut_mode, precise=False):
+        """Write [start, end) to output_stem + the clip's extension from the cache.
+
+        Returns (output path, hit kind, (start shift, end shift)), or None when no cached clip
+        serves the range; cutting errors (OSError, RuntimeError) propagate.
+        """
+        if not self.max_bytes:
+            return None
+        with self._lock:
+            entries = self._load()
+            entry, kind = self._find(entries, video, format_str, start, end, precise)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry['used'] = time.time()
+            self._save(entries)
+        source = os.path.join(self.directory, entry['file'])
+        output = output_stem + os.path.splitext(entry['file'])[1]
+        clip_start, clip_end = self.clip_bounds(entry)
+        if kind == HIT_EXACT:
+            link_or_copy(source, output)
+            shifts = (clip_start - start, clip_end - end)  # The same file the first request got
+        else:
+            try:
+                keyframes = probe_keyframes(source)
+            except (OSError, RuntimeError):
+                keyframes = []
+            shifts = cut_segment(source, start - clip_start, end - clip_start, output, cut_mode, keyframes)
+        with self._lock:
+            if kind == HIT_EXACT:
+                self.hits += 1
+            else:
+                self.cut_hits += 1
+        return output, kind, shifts
+
+    def add(self, video, format_str, start, end, path, precise=False, shifts=(0.0, 0.0)):
+        """Keep a finished clip; the cache holds a hardlink to it where the filesystem allows.
+
+        shifts is how far keyframe snapping moved (start, end) when the clip was cut.
+        """
+        if not self.max_bytes or not path or not os.path.exists(path):
+            return
+        key = f'{video}|{format_str}|{start:.3f}|{end:.3f}|{int(precise)}'
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest() + os.path.splitext(path)[1]
+        with self._lock:
+            entries = [e for e in self._load() if e['file'] != name]
+            link_or_copy(path, os.path.join(self.directory, name))
+            entries.append({'video': video, 'format': format_str, 'start': start, 'end': end,
+                            'clip_start': start + shifts[0], 'clip_end': end + shifts[1], 'file': name,
+                            'size': os.path.getsize(path), 'precise': precise, 'used': time.time()})
+            self._save(self._evict(entries))
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._save(self._evict(self._load()))
+
+    def _evict(self, entries):
+        entries.sort(key=lambda e: e['used'], reverse=True)
+        kept, total = [], 0
+        for e in entries:
+            total += e['size']
+            if total <= self.max_bytes:
+                kept.append(e)
+            else:
+                try:
+                    os.remove(os.path.join(self.directory, e['file']))
+                except OSError:
+                    pass
+        return kept
@@ -0,0 +1,202 @@
+import copy
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+from download_engine import (format_timestamp, info_is_fresh, kill_process_tree, popen_kwargs, segment_output_stem,
+                             ydl_base_opts)
+from telemetry import FetchTimer
+
+# Compilation output: every section joined into one file in timeline order, with a chapter per section.
+# ffmpeg's concat demuxer reads each section straight from the stream URLs (an inpoint/outpoint
+# pair per entry) and stream-copies it into the output, so no section is ever written as a file
+# of its own. Sections of one stream share its codecs; only if copying fails is it re-encoded.
+
+OUTPUT_SEPARATE = 'separate'
+OUTPUT_COMPILE = 'compile'
+OUTPUT_MODES = [OUTPUT_SEPARATE, OUTPUT_COMPILE]
+
+STREAM_PROTOCOLS = ('http', 'https')
+PROTOCOL_WHITELIST = 'file,http,https,tcp,tls,crypto'
+COPY_CONTAINERS = {'mp4', 'm4a'}
+REENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-c:a', 'aac', '-b:a', '192k']
+# ffmpeg -progress output: key=value lines, out_time_us is the output position
+PROGRESS_KEY_RE = re.compile(r'^\w+=')
+OUT_TIME_RE = re.compile(r'^out_time_us=(\d+)')
+TOTAL_SIZE_RE = re.compile(r'^total_size=(\d+)')
+# ffmpeg's complaints when a stream can be read but not copied into the output container
+COPY_INCOMPATIBLE_RE = re.compile(
+    r'codec not currently supported in container|Could not find tag for codec|incompatible with output codec|'
+    r'Could not write header|Only .* supported for|Unsupported codec', re.IGNORECASE)
+
+
+def resolve_streams(url, format_str, info=None, cookies=None):
+    """Format dicts yt-dlp selects for format_str: one progressive stream, or video and audio."""
+    import yt_dlp
+    with yt_dlp.YoutubeDL(dict(ydl_base_opts(cookies), format=format_str)) as ydl:
+        if info_is_fresh(info):
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        else:
+            selected = ydl.extract_info(url, download=False)
+    streams = selected.get('requested_formats') or [selected]
+    for stream in streams:
+        if stream.get('protocol') not in STREAM_PROTOCOLS or not stream.get('url'):
+            raise RuntimeError(f"format {stream.get('format_id')} is not a direct stream "
+                               f"({stream.get('protocol')}) and can't be compiled")
+    return streams
+
+
+def is_copy_incompatible(error):
+    return bool(error) and bool(COPY_INCOMPATIBLE_RE.search(error))
+
+
+def _quote(path):
+    return "'%s'" % path.replace("'", "'\\''")
+
+
+def concat_list(source, segments):
+    """ffconcat script playing [start, end) of source for every segment in order."""
+    lines = ['ffconcat version 1.0']
+    for start, end in segments:
+        lines += [f'file {_quote(source)}', f'inpoint {start:.3f}', f'outpoint {end:.3f}']
+    return '\n'.join(lines) + '\n'
+
+
+def _escape_metadata(value):
+    return re.sub(r'([=;#\\\n])', r'\\\1', value)
+
+
+def chapter_metadata(segments, title):
+    """FFMETADATA with one chapter per segment, on the timeline of the joined output."""
+    lines = [';FFMETADATA1', f'title={_escape_metadata(title)}']
+    position = 0.0
+    for start, end in segments:
+        lines += ['[CHAPTER]', 'TIMEBASE=1/1000', f'START={round(position * 1000)}',
+                  f'END={round((position + end - start) * 1000)}',
+                  f'title={format_timestamp(start)} - {format_timestamp(end)}']
+        position += end - start
+    return '\n'.join(lines) + '\n'
+
+
+def compilation_ext(streams, download_type='video'):
+    if all(s.get('ext') in COPY_CONTAINERS for s in streams):
+        return 'mp4' if download_type == 'video' else 'm4a'
+    return 'mkv' if download_type == 'video' else 'mka'
+
+
+def build_compile_command(lists, metadata, output, reencode=False):
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-nostats', '-progress', 'pipe:1']
+    for path in lists:
+        cmd += ['-f', 'concat', '-safe', '0', '-protocol_whitelist', PROTOCOL_WHITELIST, '-i', path]
+    cmd += ['-f', 'ffmetadata', '-i', metadata]
+    if len(lists) > 1:
+        cmd += ['-map', '0:v:0', '-map', '1:a:0']  # video-only and audio-only streams
+    else:
+        cmd += ['-map', '0:v?', '-map', '0:a?']
+    cmd += ['-map_metadata', str(len(lists)), '-map_chapters', str(len(lists))]
+    cmd += REENCODE_ARGS if reencode else ['-c', 'copy']
+    if output.endswith(('.mp4', '.m4a')):
+        cmd += ['-movflags', '+faststart']
+    return cmd + ['-avoid_negative_ts', 'make_zero', output]
+
+
+class Compiler:
+    """Joins the segments of one video into a single chaptered file.
+
+    Each section is stream copied from the keyframe before its start, so there is no
+    precise (frame-accurate) mode here. One Compiler runs one job: once cancelled, even
+    before run() starts, it stays cancelled.
+    on_progress(percent) is called from the thread running run(); timer holds the
+    transfer stats of the last run for telemetry.
+    """
+
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self.timer = None
+        self._proc = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            proc = self._proc
+        if proc is not None:
+            kill_process_tree(proc)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self, url, segments, format_str, download_dir, title, cookies=None, info=None, download_type='video'):
+        """Write the compilation and return its path; None when cancelled, RuntimeError on failure."""
+        if self.cancelled:
+            return None
+        segments = sorted(segments)
+        self.timer = FetchTimer()
+        streams = resolve_streams(url, format_str, info, cookies)
+        ext = compilation_ext(streams, download_type)
+        stem = segment_output_stem(title, segments[0][0], segments[-1][1]) + '-compilation'
+        output = os.path.join(download_dir, f'{stem}.{ext}')
+        partial = os.path.join(download_dir, f'.{stem}.{ext}')  # renamed once complete
+        total = sum(end - start for start, end in segments)
+        with tempfile.TemporaryDirectory() as tmp:
+            lists = []
+            for i, stream in enumerate(streams):
+                lists.append(os.path.join(tmp, f'stream{i}.ffconcat'))
+                with open(lists[-1], 'w', encoding='utf-8') as f:
+                    f.write(concat_list(stream['url'], segments))
+            metadata = os.path.join(tmp, 'chapters.txt')
+            with open(metadata, 'w', encoding='utf-8') as f:
+                f.write(chapter_metadata(segments, title))
+            error = None
+            try:
+                error = self._ffmpeg(build_compile_command(lists, metadata, partial), total)
+                if is_copy_incompatible(error) and not self.cancelled:
+                    # Stream copy refused because codec and container don't mix: encode instead.
+                    # Anything else (network, HTTP, missing input) would only fail again, slower
+                    error = self._ffmpeg(build_compile_command(lists, metadata, partial, reencode=True), total)
+            finally:
+                self.timer.finish(partial)
+                if (error or self.cancelled) and os.path.exists(partial):
+                    os.remove(partial)
+        if self.cancelled:
+            return None
+        if error:
+            raise RuntimeError(error)
+        os.replace(partial, output)
+        return output
+
+    def _ffmpeg(self, cmd, total):
+        tail = []
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                    encoding='utf-8', errors='replace', **popen_kwargs())
+        except OSError as e:
+            return str(e)
+        with self._lock:
+            self._proc = proc
+        if self.cancelled:
+            kill_process_tree(proc)
+        try:
+            for line in proc.stdout:
+                line = line.strip()
+                match = OUT_TIME_RE.match(line)
+                if match and total > 0:
+                    if self.on_progress is not None:
+                        self.on_progress(min(int(match.group(1)) / 1e6 / total * 100.0, 100.0))
+                    continue
+                match = TOTAL_SIZE_RE.match(line)
+                if match:
+                    self.timer.on_bytes(int(match.group(1)))
+                elif line and not PROGRESS_KEY_RE.match(line):
+                    tail = (tail + [line])[-20:]
+            proc.wait()
+        finally:
+            with self._lock:
+                self._proc = None
+        if proc.returncode != 0:
+            return '\n'.join(tail) or f'ffmpeg exited with {proc.returncode}'
+        return None
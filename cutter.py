@@ -0,0 +1,156 @@
+import glob
+import json
+import os
+import subprocess
+import tempfile
+
+from keyframes import snap_outward
+
+# Local ffmpeg cutting of already downloaded media
+
+
+def find_output(directory, stem):
+    """Path of the finished file yt-dlp wrote for an output template of stem + '.%(ext)s'."""
+    for path in glob.glob(os.path.join(glob.escape(directory), glob.escape(stem) + '.*')):
+        if not path.endswith(('.part', '.ytdl', '.temp')) and '.part-Frag' not in path:
+            return path
+    return None
+
+
+def run_ffmpeg(args):
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + args
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ffmpeg exited with {result.returncode}')
+
+
+def cut_clip(source, start, end, output):
+    """Stream-copy [start, end) seconds of source into output."""
+    run_ffmpeg(['-ss', f'{start:.3f}', '-i', source, '-t', f'{end - start:.3f}',
+                '-map', '0', '-c', 'copy', '-avoid_negative_ts', 'make_zero', output])
+
+
+CUT_FAST = 'fast'  # stream copy between keyframes around the segment
+CUT_PRECISE = 'precise'  # exact boundaries; only the partial GOPs at the edges are re-encoded
+CUT_MODES = [CUT_FAST, CUT_PRECISE]
+
+# Encoders that can produce edge pieces matching the copied middle of the same codec
+SMART_CUT_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18'],
+    'hevc': ['-c:v', 'libx265', '-preset', 'veryfast', '-crf', '20'],
+    'vp9': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8', '-crf', '30', '-b:v', '0'],
+    'av1': ['-c:v', 'libsvtav1', '-preset', '10', '-crf', '30'],
+}
+
+
+# ffprobe profile names -> encoder -profile:v values, so edge pieces declare what the source does
+H264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high',
+                 'High 10': 'high10', 'High 4:2:2': 'high422', 'High 4:4:4 Predictive': 'high444'}
+HEVC_PROFILES = {'Main': 'main', 'Main 10': 'main10', 'Main Still Picture': 'mainstillpicture'}
+
+
+def probe_video_stream(source):
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=codec_name,pix_fmt,profile,level', '-of', 'json', source]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ffprobe exited with {result.returncode}')
+    streams = json.loads(result.stdout or '{}').get('streams') or []
+    return streams[0] if streams else None
+
+
+def probe_extradata(source):
+    """Hash of the video stream's codec extradata (SPS/PPS and the like); '' when it has none."""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_data_hash', 'MD5',
+           '-show_entries', 'stream=extradata_hash', '-of', 'csv=p=0', source]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ffprobe exited with {result.returncode}')
+    return result.stdout.strip()
+
+
+def edge_encoder(stream):
+    """Encoder arguments for edge pieces that match the source stream as closely as the encoder allows."""
+    codec = stream['codec_name']
+    args = SMART_CUT_ENCODERS[codec] + ['-pix_fmt', stream.get('pix_fmt') or 'yuv420p']
+    profile = (H264_PROFILES if codec == 'h264' else HEVC_PROFILES if codec == 'hevc' else {}).get(stream.get('profile'))
+    if profile:
+        args += ['-profile:v', profile]
+    level = stream.get('level')
+    if codec == 'h264' and isinstance(level, int) and level > 0:
+        args += ['-level', f'{level / 10:.1f}']
+    return args
+
+
+def reencode_clip(source, start, end, output, encoder=()):
+    """Frame-accurate [start, end) with the video re-encoded; input seeking is exact when transcoding.
+
+    encoder is the video encoder arguments (edge_encoder's), ffmpeg's default for the container without.
+    """
+    run_ffmpeg(['-ss', f'{start:.3f}', '-i', source, '-t', f'{end - start:.3f}', '-map', '0'] + list(encoder)
+               + ['-c:a', 'copy', output])
+
+
+def smart_cut(source, start, end, output, keyframes):
+    """Frame-accurate cut of [start, end) that re-encodes only the GOP fragments at both edges.
+
+    The pieces are joined by stream copy, which only decodes if the re-encoded edges carry
+    the same codec extradata as the copied middle. The head is encoded and checked first;
+    when it doesn't match, the whole range is re-encoded with the same encoder settings
+    instead, without spending time on the middle and tail.
+    """
+    inner = [k for k in keyframes if start < k < end]
+    stream = probe_video_stream(source)
+    if stream is None or len(inner) < 2 or stream.get('codec_name') not in SMART_CUT_ENCODERS:
+        # Audio only is exact with a plain copy; very short or unknown-codec video gets a full re-encode
+        if stream is None:
+            return cut_clip(source, start, end, output)
+        encoder = edge_encoder(stream) if stream.get('codec_name') in SMART_CUT_ENCODERS else ()
+        return reencode_clip(source, start, end, output, encoder)
+    encoder = edge_encoder(stream)
+    first, last = inner[0], inner[-1]
+    ext = os.path.splitext(output)[1]
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output) or None) as tmp:
+        head, middle, tail = (os.path.join(tmp, name + ext) for name in ('head', 'middle', 'tail'))
+        # Input seeking decodes from the keyframe before start only, and is frame-exact when encoding
+        run_ffmpeg(['-ss', f'{start:.3f}', '-i', source, '-t', f'{first - start:.3f}', '-map', '0:v:0', '-an']
+                   + encoder + [head])
+        # Different parameter sets in one track: the joined file would not decode past the head
+        if probe_extradata(head) != probe_extradata(source):
+            return reencode_clip(source, start, end, output, encoder)
+        run_ffmpeg(['-ss', f'{first:.3f}', '-i', source, '-t', f'{last - first:.3f}', '-map', '0:v:0', '-an',
+                    '-c', 'copy', middle])
+        run_ffmpeg(['-ss', f'{last:.3f}', '-i', source, '-t', f'{end - last:.3f}', '-map', '0:v:0', '-an']
+                   + encoder + [tail])
+        if len({probe_extradata(part) for part in (head, middle, tail)}) > 1:
+            return reencode_clip(source, start, end, output, encoder)
+        concat_list = os.path.join(tmp, 'parts.txt')
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            for part in (head, middle, tail):
+                f.write("file '%s'\n" % part.replace("'", "'\\''"))
+        # Audio frames are all sync points, so audio is copied straight from the source
+        run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', concat_list, '-ss', f'{start:.3f}', '-i', source,
+                    '-t', f'{end - start:.3f}', '-map', '0:v', '-map', '1:a?', '-c', 'copy', output])
+
+
+def cut_segment(source, start, end, output, mode=CUT_FAST, keyframes=None):
+    """Cut [start, end) of source (seconds in the file) and return how far (start, end) moved."""
+    start = max(start, 0.0)
+    if mode == CUT_PRECISE and keyframes:
+        smart_cut(source, start, end, output, keyframes)
+        return 0.0, 0.0
+    if keyframes:
+        snapped_start, snapped_end = snap_outward(keyframes, start, end)
+        snapped_start = max(snapped_start, 0.0)
+    else:
+        snapped_start, snapped_end = start, end
+    cut_clip(source, snapped_start, snapped_end, output)
+    return snapped_start - start, snapped_end - end
+
+
+def probe_duration(source):
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', source]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ffprobe exited with {result.returncode}')
+    return float(result.stdout.strip())
@@ -0,0 +1,627 @@
+import copy
+import json
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cutter import CUT_FAST, CUT_PRECISE, cut_segment, find_output, probe_duration
+from keyframes import KeyframeCache, snap_outward
+from planner import STRATEGY_FULL, STRATEGY_SECTIONS
+from segments import coalesce_segments
+from telemetry import FetchTimer
+
+# Plain-python download engine: no Qt in here so it can be driven from a QThread
+# in the GUI or from anything else that wants to download segments.
+
+DEFAULT_MAX_WORKERS = 3
+
+ENGINE_SUBPROCESS = 'subprocess'
+ENGINE_IN_PROCESS = 'in-process'
+ENGINES = [ENGINE_SUBPROCESS, ENGINE_IN_PROCESS]
+
+PROGRESS_PREFIX = '[segment-progress]'
+# yt-dlp progress line for the native downloader (e.g. non-section downloads)
+PROGRESS_TEMPLATE = f'download:{PROGRESS_PREFIX} %(progress._percent_str)s %(progress.downloaded_bytes)s'
+PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)%')
+PROGRESS_BYTES_RE = re.compile(r'%\s+(\d+)\s*$')
+# --download-sections hands the work to ffmpeg, whose stderr reports "time=HH:MM:SS.xx"
+FFMPEG_TIME_RE = re.compile(r'time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+FFMPEG_SIZE_RE = re.compile(r'size=\s*(\d+)\s*(?:kB|KiB)')
+RETRY_RE = re.compile(r'\bRetrying\b')
+# Lines yt-dlp prints once the transfer is over and its postprocessors run
+POSTPROCESS_PREFIXES = ('[Merger]', '[Fixup', '[ExtractAudio]', '[VideoRemuxer]', '[VideoConvertor]',
+                        '[ModifyChapters]', '[EmbedThumbnail]', '[Metadata]')
+# googlevideo URLs carry their expiry as a unix timestamp
+EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+# Don't start a download on an info dict whose stream URLs are about to go stale
+EXPIRY_MARGIN = 10 * 60
+# Precise cuts fetch a little extra around each range so the edge GOPs are complete locally
+PRECISE_PADDING = 5.0
+
+
+def format_timestamp(seconds):
+    """Format seconds into HH:MM:SS string."""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def filename_timestamp(seconds):
+    """Format seconds into HH-MM-SS.mmm, which unlike HH:MM:SS is a valid file name on Windows too.
+
+    Keeps the milliseconds so segments that differ by less than a second get different files.
+    """
+    millis = int(round(seconds * 1000))
+    return f"{millis // 3600000:02d}-{millis // 60000 % 60:02d}-{millis // 1000 % 60:02d}.{millis % 1000:03d}"
+
+
+def parse_timestamp(time_str):
+    """Parse time input into seconds (supports "HH:MM:SS", "HH:MM:SS.mmm" or plain seconds)."""
+    try:
+        if ':' in time_str:
+            parts = time_str.split(':')
+            # Only the seconds may have a fraction
+            parts = [int(p) for p in parts[:-1]] + [float(parts[-1]) if '.' in parts[-1] else int(parts[-1])]
+            if len(parts) == 3:
+                hours, minutes, seconds = parts
+                return hours * 3600 + minutes * 60 + seconds
+            elif len(parts) == 2:
+                minutes, seconds = parts
+                return minutes * 60 + seconds
+        else:
+            return float(time_str)
+    except ValueError:
+        return None
+
+
+def safe_filename(title):
+    """Sanitize title to avoid illegal filename characters."""
+    return ''.join(c if c.isalnum() or c in ' -_.' else '_' for c in title)
+
+
+def segment_output_stem(title, start, end):
+    return f"{safe_filename(title)}-{filename_timestamp(start)}-{filename_timestamp(end)}"
+
+
+def segment_output_template(download_dir, title, start, end):
+    return os.path.join(download_dir, segment_output_stem(title, start, end) + '.%(ext)s')
+
+
+def build_format_string(mode, download_type, custom_format_id=None):
+    # Without fetched formats to pick from; with them the GUI and batch pick through format_index
+    if mode == 'highest':
+        return 'bestvideo[height<=1080]+bestaudio/best[height<=1080]' if download_type == 'video' else 'bestaudio'
+    if custom_format_id and '+' in custom_format_id:
+        return custom_format_id  # Already a video+audio pair
+    if download_type == 'video':
+        return f'{custom_format_id}+bestaudio/best'  # Merge video + audio
+    return custom_format_id
+
+
+def build_ytdlp_command(url, start, end, format_str, output, cookies=None, info_json=None, rate_limit=None,
+                        fragments=None):
+    # With an info json yt-dlp skips extraction and downloads straight from the stored formats
+    cmd = ['yt-dlp', '--load-info-json', info_json] if info_json else ['yt-dlp', url]
+    if cookies:
+        cmd += ['--cookies', cookies]
+    if rate_limit:
+        cmd += ['--limit-rate', str(int(rate_limit))]
+    if fragments and fragments > 1:
+        cmd += ['--concurrent-fragments', str(fragments)]
+    if start is not None:
+        cmd += ['--download-sections', f'*{start}-{end}']
+    cmd += ['-f', format_str]
+    cmd += ['-o', output]
+    cmd += ['--newline', '--progress-template', PROGRESS_TEMPLATE]
+    return cmd
+
+
+def ydl_base_opts(cookies=None):
+    opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    if cookies:
+        opts['cookiefile'] = cookies
+    return opts
+
+
+def info_expires_at(info):
+    """Earliest expiry (unix time) of the signed format URLs in info, or None."""
+    expiries = []
+    for fmt in info.get('formats') or []:
+        match = EXPIRE_RE.search(fmt.get('url') or '')
+        if match:
+            expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+def info_is_fresh(info):
+    if not info:
+        return False
+    expires_at = info_expires_at(info)
+    return expires_at is None or expires_at - EXPIRY_MARGIN > time.time()
+
+
+def parse_progress_line(line, duration):
+    """Return a 0-100 percentage from a yt-dlp/ffmpeg output line, or None."""
+    if line.startswith(PROGRESS_PREFIX):
+        match = PERCENT_RE.search(line)
+        if match:
+            return min(float(match.group(1)), 100.0)
+        return None
+    match = FFMPEG_TIME_RE.search(line)
+    if match and duration > 0:
+        hours, minutes, seconds = match.groups()
+        elapsed = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        return min(elapsed / duration * 100.0, 100.0)
+    return None
+
+
+def track_transfer_line(line, timer):
+    """Feed one yt-dlp/ffmpeg output line into a FetchTimer."""
+    if line.startswith(PROGRESS_PREFIX):
+        match = PROGRESS_BYTES_RE.search(line)
+        if match:
+            timer.on_bytes(int(match.group(1)))
+    elif line.startswith(POSTPROCESS_PREFIXES):
+        timer.on_postprocess()
+    elif RETRY_RE.search(line):
+        timer.on_retry()
+    else:
+        match = FFMPEG_SIZE_RE.search(line)
+        if match:
+            timer.on_bytes(int(match.group(1)) * 1024)
+
+
+def popen_kwargs():
+    # Put each yt-dlp in its own process group so cancelling also reaches its ffmpeg child
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def kill_process_tree(proc):
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        proc.kill()
+
+
+class SegmentResult:
+    def __init__(self, index, start, end, ok, error=None, cancelled=False, output=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.ok = ok
+        self.error = error
+        self.cancelled = cancelled
+        self.output = output  # path of the finished clip, when the engine knows it
+
+
+class DownloadEngine:
+    """Downloads segments of one video on a bounded pool of yt-dlp workers.
+
+    Segments that overlap or lie within merge_gap seconds of each other are downloaded
+    as one range and split into the requested clips with a local ffmpeg cut; cut_mode
+    decides whether those cuts snap to keyframes (fast) or are frame-accurate (precise).
+    Callbacks are invoked from worker threads:
+    on_progress(index, percent), on_segment_done(index), on_segment_failed(index, error),
+    on_segment_snapped(index, start_shift, end_shift), and on_segment_metrics(index, metrics)
+    with the telemetry of a finished or failed segment just before its done/failed callback.
+    Each successful SegmentResult carries the path of the clip that was written.
+    A BandwidthScheduler shared between engines decides when each fetch may start and
+    with which rate limit and fragment concurrency; without one, slots (if given) caps them.
+    cancel_event lets a caller cancel the engine before or while it runs; once set, the
+    engine stays cancelled.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, on_progress=None, on_segment_done=None,
+                 on_segment_failed=None, merge_gap=0.0, cut_mode=CUT_FAST, on_segment_snapped=None,
+                 keyframe_cache=None, slots=None, on_segment_metrics=None, scheduler=None, cancel_event=None):
+        self.max_workers = max(1, int(max_workers))
+        self.slots = slots  # Optional semaphore shared by engines to cap downloads across videos
+        self.scheduler = scheduler
+        self._duration = None
+        self.merge_gap = merge_gap
+        self.cut_mode = cut_mode
+        self.on_segment_snapped = on_segment_snapped
+        self.keyframe_cache = keyframe_cache or KeyframeCache()
+        self.on_progress = on_progress
+        self.on_segment_done = on_segment_done
+        self.on_segment_failed = on_segment_failed
+        self.on_segment_metrics = on_segment_metrics
+        self.extract_seconds = None  # set when this engine had to extract the video itself
+        self._cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        self._lock = threading.Lock()
+        self._procs = set()
+        self._reported = {}  # output template -> file the downloader reported writing for it
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            kill_process_tree(proc)
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self, url, segments, format_str, download_dir, title, cookies=None, info=None,
+            strategy=STRATEGY_SECTIONS):
+        """Download every (start, end) in segments, blocking until all are finished.
+
+        info is an already extracted (sanitized) info dict for url; when it is given and
+        its stream URLs are still valid, no segment extracts the video again.
+        strategy STRATEGY_FULL downloads the whole video once and cuts every segment from it.
+        Returns a list of SegmentResult in segment order.
+        """
+        self.strategy = strategy
+        self._duration = (info or {}).get('duration')
+        self._keyframe_key = ((info or {}).get('id') or url, format_str)
+        self._info_json = None
+        if info_is_fresh(info):
+            fd, self._info_json = tempfile.mkstemp(suffix='.info.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+        try:
+            return self._run_pool(url, segments, format_str, download_dir, title, cookies)
+        finally:
+            if self._info_json:
+                os.remove(self._info_json)
+
+    def _run_pool(self, url, segments, format_str, download_dir, title, cookies):
+        segments = list(segments)
+        if self.strategy == STRATEGY_FULL:
+            # One group spanning the whole video: fetched once, every segment cut locally
+            groups = [(None, None, [(idx, start, end) for idx, (start, end) in enumerate(segments)])]
+        else:
+            # Overlapping or nearby segments are fetched once as one range and cut apart locally
+            groups = coalesce_segments(segments, self.merge_gap)
+        results = [None] * len(segments)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [
+                pool.submit(self._download_group, group, url, format_str, download_dir, title, cookies)
+                for group in groups
+            ]
+            for future in futures:
+                for result in future.result():
+                    results[result.index] = result
+        return results
+
+    def _download_group(self, group, url, format_str, download_dir, title, cookies):
+        start, end, members = group
+        indices = [idx for idx, _, _ in members]
+        if self.cancelled:
+            return [SegmentResult(idx, s, e, False, cancelled=True) for idx, s, e in members]
+        precise = self.cut_mode == CUT_PRECISE
+        if len(members) == 1 and members[0][1:] == (start, end) and not precise:
+            idx = members[0][0]
+            # A range that starts on a keyframe is copied from exactly there, so with a known
+            # index the section is widened up front and the shifts are exact
+            keyframes = self.keyframe_cache.cached(*self._keyframe_key, (start, end))
+            fetch_start, fetch_end = snap_outward(keyframes, start, end) if keyframes else (start, end)
+            fetch_start = max(fetch_start, 0.0)
+            template = segment_output_template(download_dir, title, start, end)
+            error, timer = self._fetch_in_slot(indices, fetch_start, fetch_end, template, url, format_str, cookies)
+            output = None if error or self.cancelled else \
+                self._written(template, download_dir, segment_output_stem(title, start, end))
+            timer.finish(output)
+            if output is not None:
+                self._emit(self.on_segment_snapped, idx, *self._section_shifts(output, start, end,
+                                                                              fetch_start, fetch_end, keyframes))
+            return [self._finish(idx, start, end, error, self._metrics(timer, 1), output)]
+
+        if start is None:
+            stem = f".{safe_filename(title)}-full"
+            fetch_start, fetch_end = None, None
+            span = (0.0, float('inf'))
+        else:
+            stem = f".{safe_filename(title)}-merged-{start:.3f}-{end:.3f}"
+            pad = PRECISE_PADDING if precise else 0.0
+            fetch_start, fetch_end = max(start - pad, 0.0), end + pad
+            span = (fetch_start, fetch_end)
+        template = os.path.join(download_dir, stem + '.%(ext)s')
+        error, timer = self._fetch_in_slot(indices, fetch_start, fetch_end, template, url, format_str, cookies)
+        source = None if error or self.cancelled else self._written(template, download_dir, stem)
+        timer.finish(source)
+        if source is None and not error:
+            error = 'download produced no file'
+        offset = fetch_start or 0.0
+        ext = os.path.splitext(source)[1][1:] if source else None
+        keyframes = []
+        probe_started = time.monotonic()
+        if source is not None:
+            try:
+                keyframes = [k - offset for k in self.keyframe_cache.keyframes_for(*self._keyframe_key, source, offset, span)]
+            except (OSError, RuntimeError):
+                keyframes = []  # No index: fast cuts fall back to ffmpeg's own seeking
+        # The keyframe probe belongs to the shared fetch's postprocessing
+        base_metrics = self._metrics(timer, len(members))
+        base_metrics['postprocess_s'] = round(base_metrics['postprocess_s'] + time.monotonic() - probe_started, 3)
+
+        def cut(member):
+            idx, seg_start, seg_end = member
+            if source is None or self.cancelled:
+                return self._finish(idx, seg_start, seg_end, error, base_metrics)
+            # Same stem as a direct download, so the queue and the clip cache find either the same way
+            output = os.path.join(download_dir, f'{segment_output_stem(title, seg_start, seg_end)}.{ext}')
+            cut_started = time.monotonic()
+            try:
+                shifts = cut_segment(source, seg_start - offset, seg_end - offset, output, self.cut_mode, keyframes)
+            except (OSError, RuntimeError) as e:
+                return self._finish(idx, seg_start, seg_end, str(e), base_metrics)
+            self._emit(self.on_segment_snapped, idx, *shifts)
+            return self._finish(idx, seg_start, seg_end, None,
+                                dict(base_metrics, cut_s=round(time.monotonic() - cut_started, 3)), output)
+
+        # Local stream-copy cuts are cheap and independent, so run them side by side
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(cut, members))
+        if source is not None:
+            os.remove(source)
+        return results
+
+    @staticmethod
+    def _section_shifts(output, start, end, fetch_start, fetch_end, keyframes):
+        """How far the bounds of a section fetched as [fetch_start, fetch_end) moved from [start, end)."""
+        if keyframes:
+            return fetch_start - start, fetch_end - end
+        # Without an index: the copy began at the keyframe before start, whatever the clip gained
+        # in length it gained there (the end of a stream copy is not snapped)
+        try:
+            gained = probe_duration(output) - (end - start)
+        except (OSError, RuntimeError, ValueError):
+            return 0.0, 0.0
+        if gained < 0.05:
+            return 0.0, 0.0  # Container durations are only good to about a frame
+        return -round(min(gained, start), 3), 0.0
+
+    def _written(self, template, download_dir, stem):
+        """File a fetch to template produced: the path the downloader reported, else the one matching stem."""
+        with self._lock:
+            reported = self._reported.pop(template, None)
+        if reported and os.path.exists(reported):
+            return reported
+        return find_output(download_dir, stem)
+
+    def _metrics(self, timer, shared_by):
+        metrics = timer.as_dict()
+        metrics.update(fetch_id=f'{id(timer):x}-{timer.started:.3f}', shared_by=shared_by, cut_s=0.0,
+                       queued_s=round(timer.queued, 3), engine=type(self).__name__, strategy=self.strategy)
+        if self.extract_seconds is not None:
+            metrics['extract_s'] = self.extract_seconds
+        return metrics
+
+    def _fetch_in_slot(self, indices, start, end, *args):
+        """Run _fetch with a fresh FetchTimer once it may start; returns (error, timer)."""
+        queued_at = time.monotonic()
+        if self.scheduler is not None:
+            lease = self.scheduler.acquire(end - start if start is not None else self._duration, self._cancel_event)
+            timer = FetchTimer(queued_at)
+            if lease is None:
+                return None, timer  # Cancelled while waiting
+            lease.timer = timer
+            error = None
+            try:
+                error = self._fetch(indices, start, end, *args, timer, lease)
+            finally:
+                self.scheduler.release(lease, error)
+            return error, timer
+        if self.slots is None:
+            timer = FetchTimer(queued_at)
+            return self._fetch(indices, start, end, *args, timer), timer
+        with self.slots:
+            timer = FetchTimer(queued_at)
+            if self.cancelled:
+                return None, timer
+            return self._fetch(indices, start, end, *args, timer), timer
+
+    def _fetch(self, indices, start, end, output, url, format_str, cookies, timer, lease=None):
+        """Download [start, end) (the whole video if start is None) to output.
+
+        Reports progress for indices and transfer stats to timer; returns an error message or None.
+        """
+        cmd = build_ytdlp_command(url, start, end, format_str, output, cookies, self._info_json,
+                                  lease.rate_limit if lease else None, lease.fragments if lease else None)
+        tail = []
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                    encoding='utf-8', errors='replace', **popen_kwargs())
+        except OSError as e:
+            return str(e)
+        with self._lock:
+            self._procs.add(proc)
+        if self.cancelled:
+            kill_process_tree(proc)  # cancel() ran before proc was registered
+        try:
+            # Text mode turns ffmpeg's carriage-return updates into separate lines
+            for line in proc.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                track_transfer_line(line, timer)
+                percent = parse_progress_line(line, end - start if start is not None else 0)
+                if percent is not None:
+                    for index in indices:
+                        self._emit(self.on_progress, index, percent)
+                else:
+                    tail = (tail + [line])[-20:]
+            proc.wait()
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        if proc.returncode != 0:
+            return '\n'.join(tail) or f'yt-dlp exited with {proc.returncode}'
+        return None
+
+    def _finish(self, index, start, end, error, metrics=None, output=None):
+        if self.cancelled:
+            return SegmentResult(index, start, end, False, cancelled=True)
+        if metrics is not None:
+            self._emit(self.on_segment_metrics, index, metrics)
+        if error:
+            return self._fail(index, start, end, error)
+        self._emit(self.on_progress, index, 100.0)
+        self._emit(self.on_segment_done, index)
+        return SegmentResult(index, start, end, True, output=output)
+
+    def _fail(self, index, start, end, error):
+        self._emit(self.on_segment_failed, index, error)
+        return SegmentResult(index, start, end, False, error=error)
+
+    @staticmethod
+    def _emit(callback, *args):
+        if callback is not None:
+            callback(*args)
+
+
+class InProcessDownloadEngine(DownloadEngine):
+    """Downloads segments through yt_dlp.YoutubeDL inside this process.
+
+    The video page is extracted at most once per job (not at all when a fresh info
+    dict from the format fetch is passed in), and each pool worker keeps one
+    YoutubeDL (and with it one HTTP connection pool) for every segment it handles,
+    so no segment pays interpreter startup, the yt-dlp import or a re-extraction.
+    Cancelling takes effect at the next progress update of a running segment.
+    """
+
+    def run(self, url, segments, format_str, download_dir, title, cookies=None, info=None,
+            strategy=STRATEGY_SECTIONS):
+        import yt_dlp
+        self.strategy = strategy
+        self._duration = (info or {}).get('duration')
+        self._keyframe_key = ((info or {}).get('id') or url, format_str)
+        self._local = threading.local()
+        self._ydls = []
+        self._opts = ydl_base_opts(cookies)
+        if info_is_fresh(info):
+            self._info = info
+        else:
+            extract_started = time.monotonic()
+            try:
+                with yt_dlp.YoutubeDL(self._opts) as ydl:
+                    # process=False: format selection happens per segment in process_ie_result
+                    self._info = ydl.extract_info(url, download=False, process=False)
+            except Exception as e:
+                return [self._fail(idx, start, end, str(e)) for idx, (start, end) in enumerate(segments)]
+            self.extract_seconds = round(time.monotonic() - extract_started, 3)
+        try:
+            return self._run_pool(url, segments, format_str, download_dir, title, cookies)
+        finally:
+            for ydl in self._ydls:
+                ydl.close()
+
+    def _worker_ydl(self, format_str):
+        """The calling worker's YoutubeDL and the _FetchState its hooks report to."""
+        import yt_dlp
+        worker = getattr(self._local, 'worker', None)
+        if worker is None:
+            # yt-dlp may call hooks from its fragment download threads, so they find the
+            # state of their fetch through the closure, never through thread-local storage
+            state = _FetchState()
+            opts = dict(self._opts, format=format_str,
+                        progress_hooks=[lambda d: self._progress_hook(d, state)],
+                        postprocessor_hooks=[lambda d: self._postprocessor_hook(d, state)],
+                        logger=_RetryLogger(state))
+            worker = self._local.worker = (yt_dlp.YoutubeDL(opts), state)
+            with self._lock:
+                self._ydls.append(worker[0])
+        return worker
+
+    def _progress_hook(self, d, state):
+        import yt_dlp
+        if self.cancelled:
+            raise yt_dlp.utils.DownloadCancelled()
+        if d.get('status') != 'downloading' or state.timer is None:
+            return
+        if d.get('downloaded_bytes') is not None:
+            state.timer.on_bytes(d['downloaded_bytes'])
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            percent = min(d.get('downloaded_bytes', 0) / total * 100.0, 100.0)
+            for index in state.indices:
+                self._emit(self.on_progress, index, percent)
+
+    def _postprocessor_hook(self, d, state):
+        if d.get('status') == 'started' and state.timer is not None:
+            state.timer.on_postprocess()
+
+    def _fetch(self, indices, start, end, output, url, format_str, cookies, timer, lease=None):
+        import yt_dlp
+        ydl, state = self._worker_ydl(format_str)
+        state.indices = indices
+        state.timer = timer
+        # The downloader reads ratelimit from these params on every chunk, so a new share applies at once
+        ydl.params['ratelimit'] = lease.rate_limit if lease else None
+        ydl.params['concurrent_fragment_downloads'] = lease.fragments if lease else 1
+        if lease is not None:
+            lease.on_rate_change = lambda rate: ydl.params.__setitem__('ratelimit', rate)
+        if start is None:
+            ydl.params.pop('download_ranges', None)
+        else:
+            ydl.params['download_ranges'] = yt_dlp.utils.download_range_func(None, [(start, end)])
+        ydl.params['outtmpl']['default'] = output
+        try:
+            result = ydl.process_ie_result(copy.deepcopy(self._info), download=True)
+            downloads = (result or {}).get('requested_downloads') or []
+            if downloads and downloads[-1].get('filepath'):
+                # Where the file really went, after yt-dlp's own file name sanitizing and moves
+                with self._lock:
+                    self._reported[output] = downloads[-1]['filepath']
+        except yt_dlp.utils.DownloadCancelled:
+            return None  # reported as cancelled by _finish
+        except Exception as e:
+            return str(e)
+        finally:
+            if lease is not None:
+                lease.on_rate_change = None
+        return None
+
+
+class _FetchState:
+    """Segment indices and FetchTimer of the fetch a worker's YoutubeDL is running."""
+
+    def __init__(self):
+        self.indices = []
+        self.timer = None
+
+
+class _RetryLogger:
+    """yt-dlp logger that stays quiet but counts retry warnings into the worker's FetchTimer."""
+
+    def __init__(self, state):
+        self._state = state
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        if RETRY_RE.search(msg) and self._state.timer is not None:
+            self._state.timer.on_retry()
+
+    def error(self, msg):
+        pass
+
+
+def create_engine(name=ENGINE_SUBPROCESS, **kwargs):
+    if name == ENGINE_IN_PROCESS:
+        return InProcessDownloadEngine(**kwargs)
+    return DownloadEngine(**kwargs)
@@ -0,0 +1,188 @@
+import threading
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QPoint, QRect, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen, QPixmap
+from PyQt5.QtWidgets import QLabel, QWidget
+
+from download_engine import format_timestamp
+from storyboard import Storyboard, pick_storyboard
+
+# Scrubbing timeline built from the storyboard sprites of the current video.
+# Hovering shows the thumbnail under the mouse; clicking sets the current time (shift: start,
+# right button or ctrl: end) without seeking the player.
+
+STRIP_HEIGHT = 54
+MAX_TILES = 2000  # sliced thumbnails kept in memory
+HOVER_SCALE = 2
+
+
+class FilmstripTimeline(QWidget):
+    current_requested = pyqtSignal(float)
+    start_requested = pyqtSignal(float)
+    end_requested = pyqtSignal(float)
+    sheet_ready = pyqtSignal(str, int, str)  # from the fetch threads: storyboard key, sheet index, file
+
+    def __init__(self, sprite_cache, parent=None):
+        super().__init__(parent)
+        self.sprite_cache = sprite_cache
+        self.storyboard = None
+        self.video_id = None
+        self.duration = 0.0
+        self.current = None
+        self.marks = (None, None)
+        self.segments = []
+        self._sheets = {}  # sheet index -> QImage, decoded once
+        self._tiles = OrderedDict()  # (sheet, tile index) -> QPixmap, least recently used first
+        self._cancel = None
+        self._key = None  # video and storyboard format the loaded sheets belong to
+        self.setMouseTracking(True)
+        self.setMinimumHeight(STRIP_HEIGHT + 12)
+        self.setToolTip('Click: current time, shift+click: start, right click or ctrl+click: end')
+        self.hover = QLabel(None, Qt.ToolTip)
+        self.sheet_ready.connect(self._sheet_loaded)
+
+    def load(self, video_id, info):
+        """Show the storyboard of info; a video without one gets a plain timeline."""
+        if video_id == self.video_id and self.storyboard is not None:
+            return
+        self.clear()
+        self.video_id = video_id
+        self.duration = float((info or {}).get('duration') or 0.0)
+        fmt = pick_storyboard((info or {}).get('formats') or [])
+        if fmt is not None and self.duration:
+            self.storyboard = Storyboard(fmt, self.duration)
+            self._cancel = threading.Event()
+            key = self._key = f'{video_id}/{self.storyboard.format_id}'
+            first = self.storyboard.tile_at(self.current)[0] if self.current else 0
+            # Sheets of an earlier video can still be queued on the GUI thread; the key tells them apart
+            self.sprite_cache.fetch(video_id, self.storyboard,
+                                    lambda sheet, path: self.sheet_ready.emit(key, sheet, path), self._cancel, first)
+        self.update()
+
+    def clear(self):
+        if self._cancel is not None:
+            self._cancel.set()  # Sheets of the previous video still queued are dropped
+        self._cancel = None
+        self._key = None
+        self.storyboard = None
+        self.video_id = None
+        self.duration = 0.0
+        self._sheets.clear()
+        self._tiles.clear()
+        self.hover.hide()
+        self.update()
+
+    def set_current(self, seconds):
+        self.current = seconds
+        self.update()
+
+    def set_marks(self, start, end):
+        self.marks = (start, end)
+        self.update()
+
+    def set_segments(self, segments):
+        self.segments = list(segments)
+        self.update()
+
+    def _sheet_loaded(self, key, sheet, path):
+        if self.storyboard is None or key != self._key or sheet in self._sheets:
+            return
+        image = QImage(path)
+        if not image.isNull():
+            self._sheets[sheet] = image
+            self.update()
+
+    def tile(self, seconds):
+        """Thumbnail at seconds, or None until its sheet has arrived."""
+        if self.storyboard is None:
+            return None
+        key = self.storyboard.tile_at(seconds)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+        image = self._sheets.get(key[0])
+        if image is None:
+            return None
+        width, height = image.width() // self.storyboard.columns, image.height() // self.storyboard.rows
+        column, row = self.storyboard.tile_position(key[1])
+        pixmap = QPixmap.fromImage(image.copy(column * width, row * height, width, height))
+        self._tiles[key] = pixmap
+        if len(self._tiles) > MAX_TILES:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def time_at(self, x):
+        return min(max(x / max(self.width(), 1), 0.0), 1.0) * self.duration
+
+    def x_at(self, seconds):
+        return int(seconds / self.duration * self.width()) if self.duration else 0
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(40, 20, 40))
+        if not self.duration:
+            painter.setPen(QColor('white'))
+            painter.drawText(self.rect(), Qt.AlignCenter, 'Timeline appears once the formats are fetched')
+            return
+        strip = QRect(0, 6, self.width(), STRIP_HEIGHT)
+        if self.storyboard is not None:
+            thumb_width = max(STRIP_HEIGHT * 16 // 9, 1)
+            for x in range(0, self.width(), thumb_width):
+                pixmap = self.tile(self.time_at(x + thumb_width / 2))
+                if pixmap is not None:
+                    painter.drawPixmap(QRect(x, strip.top(), thumb_width, STRIP_HEIGHT), pixmap)
+        for start, end in self.segments:
+            x = self.x_at(start)
+            painter.fillRect(QRect(x, 0, max(self.x_at(end) - x, 2), self.height()), QColor(200, 162, 200, 110))
+        start, end = self.marks
+        for mark, color in ((start, QColor(0, 200, 0)), (end, QColor(220, 0, 0))):
+            if mark is not None:
+                painter.setPen(QPen(color, 2))
+                painter.drawLine(self.x_at(mark), 0, self.x_at(mark), self.height())
+        if self.current is not None:
+            painter.setPen(QPen(QColor('white'), 2))
+            painter.drawLine(self.x_at(self.current), 0, self.x_at(self.current), self.height())
+
+    def mouseMoveEvent(self, event):
+        if not self.duration:
+            return
+        seconds = self.time_at(event.pos().x())
+        pixmap = self.tile(seconds)
+        label = format_timestamp(seconds)
+        if pixmap is None:
+            self.hover.setText(label)
+        else:
+            scaled = pixmap.scaled(pixmap.width() * HOVER_SCALE, pixmap.height() * HOVER_SCALE,
+                                   Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            painter = QPainter(scaled)
+            painter.fillRect(QRect(0, scaled.height() - 18, scaled.width(), 18), QColor(0, 0, 0, 160))
+            painter.setPen(QColor('white'))
+            painter.drawText(QRect(0, scaled.height() - 18, scaled.width(), 18), Qt.AlignCenter, label)
+            painter.end()
+            self.hover.setPixmap(scaled)
+        self.hover.adjustSize()
+        position = self.mapToGlobal(QPoint(event.pos().x() - self.hover.width() // 2, -self.hover.height() - 4))
+        self.hover.move(position)
+        self.hover.show()
+
+    def leaveEvent(self, event):
+        self.hover.hide()
+        super().leaveEvent(event)
+
+    def mousePressEvent(self, event):
+        if not self.duration:
+            return
+        seconds = self.time_at(event.pos().x())
+        if event.button() == Qt.RightButton or event.modifiers() & Qt.ControlModifier:
+            self.end_requested.emit(seconds)
+        elif event.modifiers() & Qt.ShiftModifier:
+            self.start_requested.emit(seconds)
+        else:
+            self.current_requested.emit(seconds)
+
+    def close(self):
+        self.clear()
+        self.hover.close()
+        return super().close()
@@ -0,0 +1,192 @@
+import re
+
+from planner import DEFAULT_THROUGHPUT, estimate_strategies, format_byte_rate
+
+# Ranked, de-duplicated view of info['formats'] and a constraint-based picker over it.
+# Video entries pair a video-only stream with the audio yt-dlp can merge into the same container.
+
+CODEC_FAMILIES = {
+    'avc1': 'h264', 'avc3': 'h264', 'h264': 'h264', 'hev1': 'hevc', 'hvc1': 'hevc', 'hevc': 'hevc',
+    'vp09': 'vp9', 'vp9': 'vp9', 'vp8': 'vp8', 'av01': 'av1', 'av1': 'av1',
+    'mp4a': 'aac', 'aac': 'aac', 'opus': 'opus', 'vorbis': 'vorbis', 'mp3': 'mp3', 'ac-3': 'ac3', 'ec-3': 'eac3',
+}
+# Same height and fps: H.264 first because every editor imports it, AV1 last because many can't.
+# A codec in the constraints (e.g. "av1") picks another one on purpose
+CODEC_RANK = {'h264': 4, 'hevc': 3, 'vp9': 2, 'av1': 1}
+AUDIO_CONTAINERS = {'mp4': ('m4a', 'mp4'), 'webm': ('webm',)}
+BITRATE_TIER = 0.1  # entries of one group within 10% of each other's bitrate are the same tier
+DEFAULT_CONSTRAINTS = '<=1080p'
+PREFERENCES = ('quality', 'smallest', 'fastest')
+
+
+def codec_family(codec):
+    if not codec or codec == 'none':
+        return None
+    return CODEC_FAMILIES.get(codec.split('.')[0].lower(), codec.split('.')[0].lower())
+
+
+def _has_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none')
+
+
+def _has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none')
+
+
+def is_usable(fmt):
+    """False for storyboards, DRM-protected streams and entries with nothing to download."""
+    if fmt.get('has_drm') or fmt.get('ext') == 'mhtml' or fmt.get('protocol') == 'mhtml':
+        return False
+    if not (fmt.get('url') or fmt.get('fragments') or fmt.get('manifest_url')):
+        return False
+    return _has_video(fmt) or _has_audio(fmt)
+
+
+class FormatEntry:
+    """One downloadable choice: a progressive format, a video+audio pair, or an audio-only format."""
+
+    def __init__(self, video=None, audio=None):
+        self.video = video
+        self.audio = audio
+        self.formats = [f for f in (video, audio) if f]
+        self.format_str = '+'.join(f['format_id'] for f in self.formats)
+        main = video or audio
+        self.codec = codec_family(main.get('vcodec') if video else main.get('acodec'))
+        self.audio_codec = codec_family((audio or main).get('acodec'))
+        self.height = (video or {}).get('height') or 0
+        self.fps = (video or {}).get('fps') or 0
+        self.tbr = sum(f.get('tbr') or 0 for f in self.formats)
+        if video and audio:
+            # Output container yt-dlp picks when merging
+            self.container = video.get('ext') if audio.get('ext') in AUDIO_CONTAINERS.get(video.get('ext'), ()) else 'mkv'
+        else:
+            self.container = main.get('ext')
+
+    @property
+    def group_key(self):
+        return self.codec, self.height, self.fps, self.container
+
+    def rank_key(self):
+        if self.video:
+            return self.height, self.fps, CODEC_RANK.get(self.codec, 0), self.tbr
+        return 0, 0, 0, self.tbr
+
+    def byte_rate(self, duration=None):
+        return sum(format_byte_rate(f, duration) for f in self.formats)
+
+    def estimate(self, segments, duration, merge_gap=0.0, max_workers=1, throughput=DEFAULT_THROUGHPUT):
+        """Fastest StrategyEstimate for downloading segments in this format, or None without size data."""
+        if not duration or not self.byte_rate(duration):
+            return None
+        estimates = estimate_strategies(self.formats, segments, duration, merge_gap, max_workers, throughput)
+        return min(estimates.values(), key=lambda e: e.seconds)
+
+    def describe(self):
+        if self.video:
+            text = f"{self.height}p{self.fps:.0f}" if self.fps else f"{self.height}p"
+            text += f" {self.codec}"
+            if self.audio_codec:
+                text += f"+{self.audio_codec}"
+        else:
+            text = f"audio {self.codec}"
+        return f"{text} {self.container} {self.tbr / 1000:.1f} Mbps [{self.format_str}]"
+
+
+def _pair_audio(video, audio_formats):
+    compatible = [a for a in audio_formats if a.get('ext') in AUDIO_CONTAINERS.get(video.get('ext'), ())]
+    return max(compatible or audio_formats, key=lambda f: f.get('abr') or f.get('tbr') or 0, default=None)
+
+
+def build_format_index(formats, download_type='video'):
+    """Usable formats for download_type as FormatEntries, best first, one per codec/resolution/fps/container/bitrate tier."""
+    usable = [f for f in formats if is_usable(f)]
+    audio_only = [f for f in usable if _has_audio(f) and not _has_video(f)]
+    if download_type == 'audio':
+        entries = [FormatEntry(audio=f) for f in audio_only]
+    else:
+        entries = []
+        for f in usable:
+            if _has_video(f) and _has_audio(f):
+                entries.append(FormatEntry(video=f))
+            elif _has_video(f):
+                entries.append(FormatEntry(video=f, audio=_pair_audio(f, audio_only)))
+    entries.sort(key=FormatEntry.rank_key, reverse=True)
+    kept = {}
+    index = []
+    for entry in entries:
+        tiers = kept.setdefault(entry.group_key, [])
+        if any(abs(entry.tbr - t) <= BITRATE_TIER * max(t, 1) for t in tiers):
+            continue  # Same stream served again (other protocol or duplicate id)
+        tiers.append(entry.tbr)
+        index.append(entry)
+    return index
+
+
+class FormatConstraints:
+    def __init__(self, max_height=None, min_height=None, max_fps=None, codecs=(), containers=(), prefer='quality'):
+        self.max_height = max_height
+        self.min_height = min_height
+        self.max_fps = max_fps
+        self.codecs = set(codecs)
+        self.containers = set(containers)
+        self.prefer = prefer
+
+    def allows(self, entry):
+        if self.max_height and entry.video and entry.height > self.max_height:
+            return False
+        if self.min_height and entry.video and entry.height < self.min_height:
+            return False
+        if self.max_fps and entry.fps > self.max_fps:
+            return False
+        if self.codecs and entry.codec not in self.codecs and entry.audio_codec not in self.codecs:
+            return False
+        return not self.containers or entry.container in self.containers
+
+
+def parse_constraints(text):
+    """Parse constraints like "<=1080p, smallest, h264" (≤ works too); raises ValueError on unknown terms."""
+    constraints = FormatConstraints()
+    known_codecs = set(CODEC_FAMILIES.values())
+    for token in re.split(r'[,\s]+', (text or '').strip().lower().replace('≤', '<=').replace('≥', '>=')):
+        if not token:
+            continue
+        match = re.fullmatch(r'(<=|>=|<|>|=)?(\d+)(p|fps)', token)
+        if match:
+            op, value, unit = match.group(1) or '<=', int(match.group(2)), match.group(3)
+            if unit == 'fps':
+                constraints.max_fps = value
+            elif op in ('<=', '<'):
+                constraints.max_height = value - (op == '<')
+            elif op in ('>=', '>'):
+                constraints.min_height = value + (op == '>')
+            else:
+                constraints.min_height = constraints.max_height = value
+        elif token in PREFERENCES or token in ('best', 'small', 'fast'):
+            constraints.prefer = {'best': 'quality', 'small': 'smallest', 'fast': 'fastest'}.get(token, token)
+        elif token in known_codecs or token in ('avc', 'x264'):
+            constraints.codecs.add('h264' if token in ('avc', 'x264') else token)
+        elif token in ('mp4', 'webm', 'mkv', 'm4a'):
+            constraints.containers.add(token)
+        else:
+            raise ValueError(f'unknown format constraint "{token}"')
+    return constraints
+
+
+def pick_format(index, constraints, segments=(), duration=None, merge_gap=0.0, max_workers=1,
+                throughput=DEFAULT_THROUGHPUT):
+    """Best entry of index allowed by constraints, or None when nothing matches."""
+    candidates = [e for e in index if constraints.allows(e)]
+    if not candidates:
+        return None
+    if constraints.prefer == 'quality':
+        return candidates[0]  # The index is already ranked best first
+    segments = list(segments) or [(0.0, duration or 1.0)]
+
+    def cost(ranked):
+        rank, entry = ranked
+        estimate = entry.estimate(segments, duration, merge_gap, max_workers, throughput)
+        if estimate is None:
+            return float('inf'), rank
+        # Among equally cheap entries keep the better ranked one
+        return (estimate.total_bytes if constraints.prefer == 'smallest' else estimate.seconds), rank
+    return min(enumerate(candidates), key=cost)[1]
@@ -0,0 +1,362 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app_paths import data_dir
+from cutter import CUT_FAST, CUT_PRECISE, find_output, probe_duration
+from download_engine import (DEFAULT_MAX_WORKERS, ENGINE_SUBPROCESS, SegmentResult, create_engine,
+                             segment_output_stem)
+from metadata_cache import fetch_video_info, video_key
+from planner import STRATEGY_FULL, STRATEGY_SECTIONS
+
+STATE_PENDING = 'pending'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_CANCELLED = 'cancelled'
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 5.0  # seconds before the first retry, doubled after every further failure
+BACKOFF_MAX = 300.0
+DONE_RETENTION = 30 * 24 * 3600
+# Keyframe snapping can only lengthen a clip, by at most about a GOP at each end
+MAX_SNAP_SECONDS = 10.0
+TRANSIENT_ERROR_RE = re.compile(
+    r'HTTP Error (403|429|5\d\d)|timed? ?out|Connection (reset|refused|aborted)|Temporary failure|'
+    r'Remote end closed|IncompleteRead|failed validation|produced no file',
+    re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    video_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    start REAL NOT NULL,
+    "end" REAL NOT NULL,
+    format_str TEXT NOT NULL,
+    download_dir TEXT NOT NULL,
+    cookies TEXT,
+    strategy TEXT NOT NULL,
+    cut_mode TEXT,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    output_path TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (video_key, start, "end", format_str, download_dir)
+)
+"""
+
+
+def is_transient_error(error):
+    return bool(error) and bool(TRANSIENT_ERROR_RE.search(error))
+
+
+def backoff_delay(attempts):
+    return min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+
+
+def output_is_valid(path, expected_duration):
+    """True if path exists, is non-empty and has about the expected duration."""
+    if not path or not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    try:
+        duration = probe_duration(path)
+    except OSError:
+        return True  # No ffprobe to check with; a non-empty file is the best we can tell
+    except (RuntimeError, ValueError):
+        return False
+    tolerance = max(1.5, expected_duration * 0.03)
+    return expected_duration - tolerance <= duration <= expected_duration + tolerance + MAX_SNAP_SECONDS
+
+
+class QueuedSegment:
+    def __init__(self, row):
+        for key in row.keys():
+            setattr(self, key, row[key])
+
+    @property
+    def group_key(self):
+        return (self.url, self.title, self.format_str, self.download_dir, self.cookies, self.strategy)
+
+    def existing_output(self):
+        return find_output(self.download_dir, segment_output_stem(self.title, self.start, self.end))
+
+
+class JobQueue:
+    """Persistent queue of segment downloads, one row per (video, segment, format, directory).
+
+    Rows left 'running' by a crash go back to 'pending' when the queue is opened.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), 'jobs.sqlite3')
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(SCHEMA)
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(segments)')}
+        if 'cut_mode' not in columns:  # Queues written before cut modes were stored
+            self._db.execute('ALTER TABLE segments ADD COLUMN cut_mode TEXT')
+        now = time.time()
+        self._db.execute('UPDATE segments SET state = ?, updated_at = ? WHERE state = ?',
+                         (STATE_PENDING, now, STATE_RUNNING))
+        self._db.execute('DELETE FROM segments WHERE state = ? AND updated_at < ?',
+                         (STATE_DONE, now - DONE_RETENTION))
+
+    def close(self):
+        self._db.close()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def enqueue(self, url, title, segments, format_str, download_dir, cookies=None, strategy=STRATEGY_SECTIONS,
+                cut_mode=CUT_FAST):
+        """Add (or re-arm) one row per segment and return them in segment order."""
+        key = video_key(url)
+        now = time.time()
+        rows = []
+        with self._lock:
+            self._db.execute('BEGIN')
+            for start, end in segments:
+                self._db.execute(
+                    'INSERT INTO segments (video_key, url, title, start, "end", format_str, download_dir, cookies,'
+                    ' strategy, cut_mode, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                    ' ON CONFLICT (video_key, start, "end", format_str, download_dir) DO UPDATE SET'
+                    ' url = excluded.url, title = excluded.title, cookies = excluded.cookies,'
+                    ' strategy = excluded.strategy, cut_mode = excluded.cut_mode, state = excluded.state, attempts = 0, next_attempt_at = 0,'
+                    ' error = NULL, updated_at = excluded.updated_at',
+                    (key, url, title, start, end, format_str, download_dir, cookies or None, strategy, cut_mode,
+                     STATE_PENDING, now))
+                rows.append(self._db.execute(
+                    'SELECT * FROM segments WHERE video_key = ? AND start = ? AND "end" = ? AND format_str = ?'
+                    ' AND download_dir = ?', (key, start, end, format_str, download_dir)).fetchone())
+            self._db.execute('COMMIT')
+        return [QueuedSegment(row) for row in rows]
+
+    def unfinished(self):
+        return [QueuedSegment(row) for row in
+                self._execute('SELECT * FROM segments WHERE state IN (?, ?) ORDER BY id', (STATE_PENDING, STATE_RUNNING))]
+
+    def discard_unfinished(self):
+        self._execute('UPDATE segments SET state = ?, updated_at = ? WHERE state = ?',
+                      (STATE_CANCELLED, time.time(), STATE_PENDING))
+
+    def set_state(self, segment, state, **fields):
+        fields.update(state=state, updated_at=time.time())
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        self._execute(f'UPDATE segments SET {assignments} WHERE id = ?', (*fields.values(), segment.id))
+        for name, value in fields.items():
+            setattr(segment, name, value)
+
+
+class QueueRunner:
+    """Works through queued segments with the download engine until each is done or has failed for good.
+
+    Outputs already on disk that validate are skipped, transient failures are retried
+    with exponential backoff (as sections when only part of a full-video group failed),
+    and a failing segment never stops the others.
+    Callbacks use the position of the segment in the list given to run():
+    on_progress(i, percent), on_segment_done(i), on_segment_failed(i, error),
+    on_segment_snapped(i, start_shift, end_shift), on_segment_retry(i, delay, error).
+    Every download attempt is recorded in telemetry when one is given. With a clip_cache,
+    segments it can serve are linked or cut from cached clips and every new clip is added to it.
+    Segments of different videos (or formats) run side by side when a shared scheduler or
+    slots caps the fetches in flight; without either they run one video at a time.
+    """
+
+    def __init__(self, queue, engine=ENGINE_SUBPROCESS, max_workers=DEFAULT_MAX_WORKERS, merge_gap=0.0,
+                 cut_mode=CUT_FAST, slots=None, cache=None, on_progress=None, on_segment_done=None,
+                 on_segment_failed=None, on_segment_snapped=None, on_segment_retry=None, telemetry=None,
+                 scheduler=None, clip_cache=None):
+        self.queue = queue
+        self.engine_name = engine
+        self.max_workers = max_workers
+        self.merge_gap = merge_gap
+        self.cut_mode = cut_mode
+        self.slots = slots
+        self.cache = cache
+        self.on_progress = on_progress
+        self.on_segment_done = on_segment_done
+        self.on_segment_failed = on_segment_failed
+        self.on_segment_snapped = on_segment_snapped
+        self.on_segment_retry = on_segment_retry
+        self.telemetry = telemetry
+        self.scheduler = scheduler
+        self.clip_cache = clip_cache
+        self._cancel_event = threading.Event()
+        self._engines = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancel_event.set()
+        with self._lock:
+            engines = list(self._engines)
+        for engine in engines:
+            engine.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self, segments, infos=None):
+        """Download every queued segment; returns SegmentResults aligned with segments."""
+        infos = infos or {}
+        results = [None] * len(segments)
+        pending = list(range(len(segments)))
+        while pending and not self.cancelled:
+            now = time.time()
+            due = [i for i in pending if segments[i].next_attempt_at <= now]
+            if not due:
+                self._cancel_event.wait(min(segments[i].next_attempt_at for i in pending) - now)
+                continue
+            groups = {}
+            for i in due:
+                segment = segments[i]
+                existing = segment.existing_output()
+                if output_is_valid(existing, segment.end - segment.start):
+                    self.queue.set_state(segment, STATE_DONE, output_path=existing)
+                    results[i] = SegmentResult(i, segment.start, segment.end, True)
+                    self._emit(self.on_progress, i, 100.0)
+                    self._emit(self.on_segment_done, i)
+                else:
+                    groups.setdefault(segment.group_key, []).append(i)
+            parallel = self.max_workers if self.scheduler is not None or self.slots is not None else 1
+            with ThreadPoolExecutor(max_workers=max(1, min(len(groups), parallel))) as pool:
+                futures = [pool.submit(self._run_group, segments, indices, results, infos)
+                           for indices in groups.values()]
+                for future in futures:
+                    future.result()
+            pending = [i for i in pending if results[i] is None]
+        for i in pending:
+            self.queue.set_state(segments[i], STATE_CANCELLED)
+            results[i] = SegmentResult(i, segments[i].start, segments[i].end, False, cancelled=True)
+        return results
+
+    def _run_group(self, segments, indices, results, infos):
+        if self.cancelled:
+            return
+        first = segments[indices[0]]
+        for i in indices:
+            self.queue.set_state(segments[i], STATE_RUNNING, attempts=segments[i].attempts + 1)
+        info = infos.get(first.url)
+        if info is None:
+            extract_started = time.monotonic()
+            try:
+                info = fetch_video_info(first.url, first.cookies, self.cache)
+            except Exception:
+                info = None  # The engine extracts on its own and reports the error per segment
+            else:
+                if self.telemetry is not None:
+                    self.telemetry.extraction(first.url, time.monotonic() - extract_started)
+        if self.cancelled:
+            return  # Rows still without a result are marked cancelled once the run loop ends
+        video = (info or {}).get('id') or video_key(first.url)
+        precise = self.cut_mode == CUT_PRECISE
+        if self.clip_cache is not None:
+            indices = [i for i in indices
+                       if self.cancelled or not self._serve_cached(segments[i], i, video, precise, results)]
+            if not indices or self.cancelled:
+                return
+        metrics = {}
+        snaps = {}  # local index -> (start shift, end shift) of fast cuts, for the clip cache
+
+        def snapped(local, *shifts):
+            snaps[local] = shifts
+            self._emit(self.on_segment_snapped, indices[local], *shifts)
+
+        # The engine shares the runner's cancel event, so a cancel at any point reaches it
+        engine = create_engine(
+            self.engine_name, max_workers=self.max_workers, merge_gap=self.merge_gap, cut_mode=self.cut_mode,
+            slots=self.slots, scheduler=self.scheduler, cancel_event=self._cancel_event,
+            on_progress=lambda local, percent: self._emit(self.on_progress, indices[local], percent),
+            on_segment_snapped=snapped,
+            on_segment_metrics=metrics.__setitem__)
+        with self._lock:
+            self._engines.add(engine)
+        try:
+            group_results = engine.run(first.url, [(segments[i].start, segments[i].end) for i in indices],
+                                       first.format_str, first.download_dir, first.title, first.cookies, info,
+                                       first.strategy)
+        finally:
+            with self._lock:
+                self._engines.discard(engine)
+        retries = []
+        for local, result in enumerate(group_results):
+            i = indices[local]
+            segment = segments[i]
+            result.index = i
+            if result.cancelled:
+                continue  # Marked cancelled once the run loop ends
+            error = result.error
+            if result.ok:
+                output = result.output or segment.existing_output()
+                if output_is_valid(output, segment.end - segment.start):
+                    if self.clip_cache is not None:
+                        self.clip_cache.add(video, segment.format_str, segment.start, segment.end, output, precise,
+                                            snaps.get(local, (0.0, 0.0)))
+                    self._record(segment, metrics.get(local), True)
+                    self.queue.set_state(segment, STATE_DONE, output_path=output, error=None)
+                    results[i] = result
+                    self._emit(self.on_segment_done, i)
+                    continue
+                error = 'output failed validation'
+            self._record(segment, metrics.get(local), False, error)
+            if is_transient_error(error) and segment.attempts < MAX_ATTEMPTS:
+                retries.append((i, error))
+            else:
+                self.queue.set_state(segment, STATE_FAILED, error=error)
+                results[i] = SegmentResult(i, segment.start, segment.end, False, error=error)
+                self._emit(self.on_segment_failed, i, error)
+        # The whole video was only worth fetching for the whole group; fewer clips go as sections
+        strategy = first.strategy
+        if strategy == STRATEGY_FULL and len(retries) < len(indices):
+            strategy = STRATEGY_SECTIONS
+        for i, error in retries:
+            delay = backoff_delay(segments[i].attempts)
+            self.queue.set_state(segments[i], STATE_PENDING, error=error, next_attempt_at=time.time() + delay,
+                                 strategy=strategy)
+            self._emit(self.on_segment_retry, i, delay, error)
+
+    def _serve_cached(self, segment, i, video, precise, results):
+        """Produce segment from the clip cache; False when it has to be downloaded."""
+        started = time.monotonic()
+        stem = os.path.join(segment.download_dir, segment_output_stem(segment.title, segment.start, segment.end))
+        try:
+            served = self.clip_cache.serve(video, segment.format_str, segment.start, segment.end, stem,
+                                           self.cut_mode, precise)
+        except (OSError, RuntimeError):
+            served = ()  # The cut failed, possibly half way
+        if served is None:
+            return False
+        if not served or not output_is_valid(served[0], segment.end - segment.start):
+            # Don't leave a broken file for yt-dlp to mistake for a finished download
+            output = segment.existing_output()
+            if output is not None:
+                os.remove(output)
+            return False
+        output, kind, shifts = served
+        self._emit(self.on_segment_snapped, i, *shifts)
+        self._record(segment, {'clip_cache': kind, 'bytes': 0, 'cut_s': round(time.monotonic() - started, 3)}, True)
+        self.queue.set_state(segment, STATE_DONE, output_path=output, error=None)
+        results[i] = SegmentResult(i, segment.start, segment.end, True)
+        self._emit(self.on_progress, i, 100.0)
+        self._emit(self.on_segment_done, i)
+        return True
+
+    def _record(self, segment, metrics, ok, error=None):
+        if self.telemetry is not None:
+            self.telemetry.record(segment.url, segment.title, segment.start, segment.end, metrics, ok, error,
+                                  segment.attempts)
+
+    @staticmethod
+    def _emit(callback, *args):
+        if callback is not None:
+            callback(*args)
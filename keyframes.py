@@ -0,0 +1,100 @@
+import json
+import os
+import re
+import subprocess
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from app_paths import cache_dir
+
+
+def probe_keyframes(source):
+    """Video keyframe times (seconds) of a local file, read from packet flags without decoding."""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+           '-of', 'csv=p=0', source]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'ffprobe exited with {result.returncode}')
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    return sorted(times)
+
+
+def snap_outward(keyframes, start, end):
+    """Widen [start, end) to keyframes so a stream copy contains the whole requested range."""
+    i = bisect_right(keyframes, start)
+    snapped_start = keyframes[i - 1] if i else start
+    j = bisect_left(keyframes, end)
+    snapped_end = keyframes[j] if j < len(keyframes) else end
+    return snapped_start, snapped_end
+
+
+class KeyframeIndex:
+    """Keyframe times of one video/format on the video's own timeline, plus the spans probed so far."""
+
+    def __init__(self, times=(), spans=()):
+        self.times = sorted(times)
+        self.spans = sorted(tuple(span) for span in spans)
+
+    def covers(self, start, end):
+        return any(s <= start and end <= e for s, e in self.spans)
+
+    def add(self, times, span):
+        for t in times:
+            i = bisect_left(self.times, t)
+            # Different downloads of the same stream report the same keyframe within rounding
+            if not (i < len(self.times) and abs(self.times[i] - t) < 1e-3) and \
+                    not (i and abs(self.times[i - 1] - t) < 1e-3):
+                insort(self.times, t)
+        self.spans.append(tuple(span))
+        self.spans.sort()
+
+    def between(self, start, end):
+        return self.times[bisect_left(self.times, start):bisect_right(self.times, end)]
+
+
+class KeyframeCache:
+    """Keyframe indexes cached on disk per video id and format id."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or cache_dir('keyframes')
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, video_id, format_id):
+        name = re.sub(r'[^\w.-]', '_', f'{video_id}-{format_id}')
+        return os.path.join(self.directory, name + '.json')
+
+    def load(self, video_id, format_id):
+        try:
+            with open(self._path(video_id, format_id), encoding='utf-8') as f:
+                data = json.load(f)
+            return KeyframeIndex(data['times'], data['spans'])
+        except (OSError, ValueError, KeyError):
+            return KeyframeIndex()
+
+    def cached(self, video_id, format_id, span):
+        """Keyframes around span from the index on disk, or None when span was never probed."""
+        with self._lock:
+            index = self.load(video_id, format_id)
+        return index.between(span[0] - 60, span[1] + 60) if index.covers(*span) else None
+
+    def keyframes_for(self, video_id, format_id, source, offset, span):
+        """Keyframes of source (a file holding the video from offset on) on the video timeline.
+
+        span is the (start, end) of the video that source was downloaded for; an index
+        already covering it is served from the cache instead of probing source.
+        """
+        cached = self.cached(video_id, format_id, span)
+        if cached is not None:
+            return cached
+        times = [offset + t for t in probe_keyframes(source)]
+        with self._lock:
+            index = self.load(video_id, format_id)
+            index.add(times, span)
+            with open(self._path(video_id, format_id), 'w', encoding='utf-8') as f:
+                json.dump({'times': index.times, 'spans': index.spans}, f)
+        return times
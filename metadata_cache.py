@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from app_paths import cache_dir
+from download_engine import EXPIRY_MARGIN, info_expires_at
+from video_urls import KIND_VIDEO, parse_youtube_url
+
+# YouTube signs stream URLs for about six hours; entries without an expire= stamp get the same lifetime
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_BYTES = 100 * 2**20
+FALLBACK_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36'
+
+
+def video_key(url):
+    """Video id for any YouTube video URL shape, the URL itself for anything else."""
+    parsed = parse_youtube_url(url)
+    return parsed[1] if parsed and parsed[0] == KIND_VIDEO else url
+
+
+def cookie_identity(cookies_file):
+    # Formats differ between anonymous and logged-in extraction, so the cookie jar is part of the key
+    if not cookies_file or not os.path.exists(cookies_file):
+        return 'anonymous'
+    with open(cookies_file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def info_cache_key(url, cookies_file):
+    return f"{video_key(url)}:{cookie_identity(cookies_file)}"
+
+
+class InfoCache:
+    """On-disk cache of extracted info dicts keyed by video id and cookie identity.
+
+    Entries expire with their signed stream URLs and the least recently used ones
+    are evicted once the directory grows past max_bytes. get_or_fetch merges
+    concurrent fetches of the same key into a single extraction.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.directory = directory or cache_dir('info')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def stats_text(self):
+        return f"cache: {self.hits} hits, {self.misses} misses, {self.evictions} evicted"
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            if entry.get('expires_at', 0) <= time.time():
+                self._remove(path)
+                self.misses += 1
+                return None
+            os.utime(path)  # mtime doubles as last-used time for LRU
+            self.hits += 1
+            return entry['info']
+
+    def put(self, key, info):
+        expires_at = info_expires_at(info)
+        expires_at = expires_at - EXPIRY_MARGIN if expires_at else time.time() + self.ttl
+        entry = {'key': key, 'expires_at': expires_at, 'info': info}
+        path = self._path(key)
+        with self._lock:
+            tmp = path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+            self._evict()
+
+    def get_or_fetch(self, key, fetch, force=False):
+        """Return the cached info for key, or call fetch() once for all concurrent callers.
+
+        force skips the cached entry and replaces it with a fresh fetch.
+        """
+        info = None if force else self.get(key)
+        if info is not None:
+            return info
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            info = fetch()
+            self.put(key, info)
+            future.set_result(info)
+            return info
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+
+def fetch_video_info(url, cookies=None, cache=None, force=False):
+    """Extract the sanitized info dict for url, going through cache when one is given (unless force)."""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extractor_args': {'youtube': {'skip': ['dash', 'hls']}}  # Skip problematic manifests to avoid nsig issues
+    }
+    # Use the cookies the download will use, else check for cookies.txt in current directory
+    cookies_file = cookies or 'cookies.txt'
+    if os.path.exists(cookies_file):
+        ydl_opts['cookiefile'] = cookies_file
+    else:
+        ydl_opts['user_agent'] = FALLBACK_USER_AGENT
+
+    def extract():
+        import yt_dlp
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Keep the whole info dict: downloads reuse it instead of extracting again
+            return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+    if cache is None:
+        return extract()
+    return cache.get_or_fetch(info_cache_key(url, ydl_opts.get('cookiefile')), extract, force)
@@ -0,0 +1,132 @@
+import logging
+import math
+
+from segments import coalesce_segments
+
+log = logging.getLogger(__name__)
+
+STRATEGY_AUTO = 'auto'
+STRATEGY_SECTIONS = 'sections'  # one remote --download-sections fetch per (merged) range
+STRATEGY_FULL = 'full'  # fetch the whole stream once, cut every segment locally
+STRATEGIES = [STRATEGY_AUTO, STRATEGY_SECTIONS, STRATEGY_FULL]
+
+# Rough costs of the two strategies; only their ratio to each other really matters
+DEFAULT_THROUGHPUT = 4 * 2**20  # bytes/s when nothing has been measured
+SECTION_SETUP_SECONDS = 3.0  # yt-dlp/ffmpeg startup, connection setup and the seek itself
+SECTION_PREROLL_SECONDS = 2.5  # ffmpeg starts reading at the keyframe before the cut
+FULL_SETUP_SECONDS = 1.0
+LOCAL_CUT_SECONDS = 0.5  # one stream-copy cut of a local file
+CHUNK_BYTES = 10 * 2**20  # yt-dlp fetches YouTube https streams in ~10 MB range requests
+
+
+def format_byte_rate(fmt, duration=None):
+    """Bytes per second of a format from its filesize or, failing that, its total bitrate."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size and duration:
+        return size / duration
+    if fmt.get('tbr'):
+        return fmt['tbr'] * 1000 / 8
+    return 0.0
+
+
+def _has_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none')
+
+
+def _has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none')
+
+
+def _best(formats, key):
+    formats = list(formats)
+    return max(formats, key=key) if formats else None
+
+
+def estimate_selected_formats(formats, mode, download_type, custom_format_id=None):
+    """Approximate which formats build_format_string() makes yt-dlp pick, for cost estimates."""
+    by_id = {f.get('format_id'): f for f in formats}
+    best_audio = _best((f for f in formats if _has_audio(f) and not _has_video(f)),
+                       key=lambda f: f.get('abr') or f.get('tbr') or 0)
+    if mode == 'custom' and custom_format_id and '+' in custom_format_id:
+        return [by_id[i] for i in custom_format_id.split('+') if i in by_id]
+    if mode == 'custom' and custom_format_id in by_id:
+        chosen = by_id[custom_format_id]
+        if download_type == 'video' and not _has_audio(chosen) and best_audio:
+            return [chosen, best_audio]
+        return [chosen]
+    if download_type == 'audio':
+        return [best_audio] if best_audio else []
+    video = _best((f for f in formats if _has_video(f) and not _has_audio(f) and (f.get('height') or 0) <= 1080),
+                  key=lambda f: ((f.get('height') or 0), f.get('tbr') or 0))
+    if video and best_audio:
+        return [video, best_audio]
+    progressive = _best((f for f in formats if _has_video(f) and _has_audio(f) and (f.get('height') or 0) <= 1080),
+                        key=lambda f: ((f.get('height') or 0), f.get('tbr') or 0))
+    return [progressive] if progressive else []
+
+
+class StrategyEstimate:
+    def __init__(self, strategy, total_bytes, requests, seconds):
+        self.strategy = strategy
+        self.total_bytes = total_bytes
+        self.requests = requests
+        self.seconds = seconds
+
+    def describe(self):
+        return f"{self.strategy}: ~{self.total_bytes / 2**20:.1f} MiB, {self.requests} requests, ~{self.seconds:.0f}s"
+
+
+class DownloadPlan:
+    def __init__(self, strategy, estimates, reason):
+        self.strategy = strategy
+        self.estimates = estimates  # strategy -> StrategyEstimate
+        self.reason = reason
+
+    @property
+    def estimate(self):
+        return self.estimates.get(self.strategy)
+
+    def describe(self):
+        chosen = self.estimate.describe() if self.estimate else self.strategy
+        others = [e.describe() for s, e in self.estimates.items() if s != self.strategy]
+        text = f"plan {chosen} ({self.reason})"
+        if others:
+            text += f"; vs {', '.join(others)}"
+        return text
+
+
+def estimate_strategies(selected_formats, segments, duration, merge_gap=0.0, max_workers=1,
+                        throughput=DEFAULT_THROUGHPUT):
+    byte_rate = sum(format_byte_rate(f, duration) for f in selected_formats)
+    n_formats = max(1, len(selected_formats))
+    workers = max(1, max_workers)
+    ranges = coalesce_segments(list(segments), merge_gap)
+    covered = sum(end - start for start, end, _ in ranges)
+
+    section_bytes = byte_rate * (covered + len(ranges) * SECTION_PREROLL_SECONDS)
+    sections = StrategyEstimate(
+        STRATEGY_SECTIONS, section_bytes, len(ranges) * n_formats,
+        section_bytes / throughput + math.ceil(len(ranges) / workers) * SECTION_SETUP_SECONDS)
+
+    full_bytes = byte_rate * duration
+    full = StrategyEstimate(
+        STRATEGY_FULL, full_bytes, n_formats * max(1, math.ceil(full_bytes / n_formats / CHUNK_BYTES)),
+        full_bytes / throughput + FULL_SETUP_SECONDS + math.ceil(len(segments) / workers) * LOCAL_CUT_SECONDS)
+    return {STRATEGY_SECTIONS: sections, STRATEGY_FULL: full}
+
+
+def plan_download(selected_formats, segments, duration, strategy=STRATEGY_AUTO, merge_gap=0.0,
+                  max_workers=1, throughput=DEFAULT_THROUGHPUT):
+    """Choose between per-section remote downloads and one full download cut locally."""
+    if not duration or not selected_formats or not any(format_byte_rate(f, duration) for f in selected_formats):
+        plan = DownloadPlan(STRATEGY_SECTIONS if strategy == STRATEGY_AUTO else strategy, {},
+                            'no size information to estimate from')
+    else:
+        estimates = estimate_strategies(selected_formats, segments, duration, merge_gap, max_workers, throughput)
+        if strategy != STRATEGY_AUTO:
+            plan = DownloadPlan(strategy, estimates, 'chosen manually')
+        else:
+            best = min(estimates.values(), key=lambda e: e.seconds)
+            plan = DownloadPlan(best.strategy, estimates, 'lowest estimated time')
+    log.info('%s', plan.describe())
+    return plan
@@ -0,0 +1,303 @@
+import locale
+import time
+from abc import ABCMeta, abstractmethod
+
+from PyQt5.QtCore import Qt, QObject, QUrl, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QWidget
+
+# Preview players for the GUI. Both report the playhead through time_changed as it changes,
+# so the start/end/preview controls work the same on either.
+
+PREVIEW_WEB = 'web'  # YouTube IFrame player in QtWebEngine
+PREVIEW_MPV = 'mpv'  # the extracted stream (or a local file) in an embedded libmpv
+PREVIEW_BACKENDS = [PREVIEW_WEB, PREVIEW_MPV]
+
+DEFAULT_TIME_UPDATE_MS = 250
+MAX_PREVIEW_HEIGHT = 1080
+
+
+def preview_streams(info):
+    """(video url, audio url or None, http headers) of the best stream in info to preview, up to 1080p."""
+    formats = [f for f in info.get('formats') or [] if f.get('url') and (f.get('height') or 0) <= MAX_PREVIEW_HEIGHT]
+    combined = [f for f in formats if f.get('vcodec', 'none') != 'none' and f.get('acodec', 'none') != 'none']
+    video = [f for f in formats if f.get('vcodec', 'none') != 'none' and f.get('acodec', 'none') == 'none']
+    audio = [f for f in formats if f.get('vcodec', 'none') == 'none' and f.get('acodec', 'none') != 'none']
+    best_video = max(video, key=lambda f: (f.get('height') or 0, f.get('tbr') or 0), default=None)
+    best_combined = max(combined, key=lambda f: (f.get('height') or 0, f.get('tbr') or 0), default=None)
+    if best_video and audio and (best_combined is None or (best_video.get('height') or 0) > (best_combined.get('height') or 0)):
+        best_audio = max(audio, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+        return best_video['url'], best_audio['url'], best_video.get('http_headers') or {}
+    if best_combined:
+        return best_combined['url'], None, best_combined.get('http_headers') or {}
+    if best_video:
+        return best_video['url'], None, best_video.get('http_headers') or {}
+    return None
+
+
+class _BackendMeta(type(QObject), ABCMeta):
+    """QObject's metaclass with abstract method checks, so a backend missing one can't be created."""
+
+
+class PreviewBackend(QObject, metaclass=_BackendMeta):
+    """Player shown in the preview pane; times are seconds on the video timeline."""
+    ready = pyqtSignal()
+    time_changed = pyqtSignal(float)
+    error = pyqtSignal(str)
+    needs_info = False  # load() needs the extracted info dict (stream URLs), not just the video id
+    plays_files = False
+
+    def __init__(self, interval_ms=DEFAULT_TIME_UPDATE_MS, parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms
+
+    @abstractmethod
+    def widget(self):
+        pass
+
+    @abstractmethod
+    def load(self, video_id, info=None):
+        pass
+
+    def load_file(self, path):
+        # Only backends with plays_files get asked to
+        self.error.emit(f'{type(self).__name__} cannot play local files')
+
+    @abstractmethod
+    def seek(self, seconds):
+        pass
+
+    @abstractmethod
+    def play(self):
+        pass
+
+    @abstractmethod
+    def pause(self):
+        pass
+
+    def set_time_update_interval(self, ms):
+        self.interval_ms = ms
+
+    def close(self):
+        pass
+
+
+class PlayerBridge(QObject):
+    """Receives player events pushed from the page over QWebChannel."""
+    ready = pyqtSignal()
+    state_changed = pyqtSignal(int, float)  # YT.PlayerState, current time
+    time_changed = pyqtSignal(float)
+
+    @pyqtSlot()
+    def playerReady(self):
+        self.ready.emit()
+
+    @pyqtSlot(int, float)
+    def stateChanged(self, state, time):
+        self.state_changed.emit(state, time)
+
+    @pyqtSlot(float)
+    def timeUpdate(self, time):
+        self.time_changed.emit(time)
+
+# Page side of the bridge: time is pushed on every state change and, only while playing, every interval ms
+PLAYER_BRIDGE_JS = """
+var bridge = null;
+var timeUpdateInterval = %(interval)d;
+var timeUpdateTimer = null;
+new QWebChannel(qt.webChannelTransport, function(channel) {
+    bridge = channel.objects.bridge;
+    if (window.playerReady) { bridge.playerReady(); }
+});
+function pushTime() {
+    if (bridge && player && typeof player.getCurrentTime === 'function') {
+        bridge.timeUpdate(player.getCurrentTime());
+    }
+}
+function stopTimeUpdates() {
+    if (timeUpdateTimer !== null) { clearInterval(timeUpdateTimer); timeUpdateTimer = null; }
+}
+function startTimeUpdates() {
+    stopTimeUpdates();
+    timeUpdateTimer = setInterval(pushTime, timeUpdateInterval);
+}
+function setTimeUpdateInterval(ms) {
+    timeUpdateInterval = ms;
+    if (timeUpdateTimer !== null) { startTimeUpdates(); }
+}
+function onPlayerStateChange(event) {
+    if (event.data === YT.PlayerState.PLAYING) { startTimeUpdates(); } else { stopTimeUpdates(); }
+    if (bridge) { bridge.stateChanged(event.data, player.getCurrentTime()); }
+}
+"""
+
+PLAYER_HTML = """
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta http-equiv="Content-Security-Policy" content="default-src 'self' https://www.youtube.com https://youtube.com https://*.youtube.com; script-src 'self' 'unsafe-inline' 'unsafe-eval' qrc: https://www.youtube.com https://youtube.com https://*.youtube.com https://www.google.com; frame-src https://www.youtube.com https://youtube.com https://*.youtube.com; connect-src 'self' https://www.youtube.com https://youtube.com https://*.youtube.com">
+    <style>body {{ margin: 0; padding: 0; background-color: purple; }} #player {{ width: 100%; height: 100%; }}</style>
+    <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+    <script src="https://www.youtube.com/iframe_api"></script>
+</head>
+<body>
+    <div id="player"></div>
+    <script>
+        var player;
+        {bridge_js}
+        function onYouTubeIframeAPIReady() {{
+            player = new YT.Player('player', {{
+                height: '100%',
+                width: '100%',
+                videoId: '{video_id}',
+                playerVars: {{ 'enablejsapi': 1, 'origin': '*' }},
+                events: {{ 'onReady': onPlayerReady, 'onStateChange': onPlayerStateChange }}
+            }});
+        }}
+        function onPlayerReady(event) {{
+            window.playerReady = true;
+            if (bridge) {{ bridge.playerReady(); }}
+        }}
+    </script>
+</body>
+</html>
+"""
+
+
+class WebPreview(PreviewBackend):
+    """The YouTube IFrame player in a QWebEngineView, driven through runJavaScript."""
+
+    def __init__(self, interval_ms=DEFAULT_TIME_UPDATE_MS, parent=None):
+        super().__init__(interval_ms, parent)
+        # Imported here so the web engine only starts when this backend is first used
+        from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
+        from PyQt5.QtWebChannel import QWebChannel
+        self.view = QWebEngineView()
+        self.page = QWebEnginePage(self.view)
+        self.view.setPage(self.page)
+        self.page.settings().setAttribute(self.page.settings().JavascriptEnabled, True)
+        self.bridge = PlayerBridge(self)
+        self.bridge.ready.connect(self.ready)
+        self.bridge.state_changed.connect(lambda state, time: self.time_changed.emit(time))
+        self.bridge.time_changed.connect(self.time_changed)
+        self.channel = QWebChannel(self.page)
+        self.channel.registerObject('bridge', self.bridge)
+        self.page.setWebChannel(self.channel)
+
+    def widget(self):
+        return self.view
+
+    def run_js(self, js):
+        self.page.runJavaScript(js)
+
+    def load(self, video_id, info=None):
+        html = PLAYER_HTML.format(video_id=video_id, bridge_js=PLAYER_BRIDGE_JS % {'interval': self.interval_ms})
+        self.view.setHtml(html, QUrl("https://localhost"))  # Use https scheme to satisfy secure context
+
+    def seek(self, seconds):
+        self.run_js(f"""
+        if (typeof player !== 'undefined' && typeof player.seekTo === 'function') {{
+            player.seekTo({seconds}, true);
+        }}
+        """)
+
+    def play(self):
+        self.run_js("if (typeof player !== 'undefined' && typeof player.playVideo === 'function') { player.playVideo(); }")
+
+    def pause(self):
+        self.run_js("if (typeof player !== 'undefined' && typeof player.pauseVideo === 'function') { player.pauseVideo(); }")
+
+    def set_time_update_interval(self, ms):
+        super().set_time_update_interval(ms)
+        self.run_js(f"if (typeof setTimeUpdateInterval === 'function') {{ setTimeUpdateInterval({ms}); }}")
+
+    def close(self):
+        self.view.setHtml('')
+
+
+class MpvPreview(PreviewBackend):
+    """libmpv rendering into a native child widget; seeks are exact (hr-seek) and time is observed, not polled."""
+    needs_info = True
+    plays_files = True
+
+    def __init__(self, interval_ms=DEFAULT_TIME_UPDATE_MS, parent=None):
+        super().__init__(interval_ms, parent)
+        import mpv
+        self.view = QWidget()
+        self.view.setAttribute(Qt.WA_DontCreateNativeAncestors)
+        self.view.setAttribute(Qt.WA_NativeWindow)
+        self.view.setStyleSheet('background-color: black;')
+        # libmpv refuses to start under a locale with a decimal comma
+        locale.setlocale(locale.LC_NUMERIC, 'C')
+        self.player = mpv.MPV(wid=str(int(self.view.winId())), hr_seek='yes', keep_open='yes', pause=True,
+                              osc='no', input_default_bindings='no', input_vo_keyboard='no')
+        self._loaded = False
+        self._paused = True
+        self._last_emit = 0.0
+        # Observers run on mpv's event thread; the signals hand the values to the GUI thread
+        self.player.observe_property('time-pos', self._on_time)
+        self.player.observe_property('pause', self._on_pause)
+        self.player.observe_property('duration', self._on_duration)
+
+    def widget(self):
+        return self.view
+
+    def _on_time(self, name, value):
+        if value is None:
+            return
+        now = time.monotonic()
+        # While playing, time-pos changes every frame; paused changes are seeks and always reported
+        if self._paused or (now - self._last_emit) * 1000 >= self.interval_ms:
+            self._last_emit = now
+            self.time_changed.emit(float(value))
+
+    def _on_pause(self, name, value):
+        self._paused = bool(value)
+        position = self.player.time_pos
+        if position is not None:
+            self.time_changed.emit(float(position))
+
+    def _on_duration(self, name, value):
+        if value is not None and not self._loaded:
+            self._loaded = True
+            self.ready.emit()
+
+    def load(self, video_id, info=None):
+        streams = preview_streams(info or {})
+        if streams is None:
+            self.error.emit('No playable stream in the fetched formats')
+            return
+        video_url, audio_url, headers = streams
+        if headers.get('User-Agent'):
+            self.player['user-agent'] = headers['User-Agent']
+        self._start(video_url, audio_url)
+
+    def load_file(self, path):
+        self._start(path)
+
+    def _start(self, source, audio=None):
+        self._loaded = False
+        if audio:
+            self.player.loadfile(source, audio_file=audio)
+        else:
+            self.player.loadfile(source)
+        self.player.pause = True
+
+    def seek(self, seconds):
+        if self._loaded:
+            self.player.seek(seconds, reference='absolute', precision='exact')
+
+    def play(self):
+        self.player.pause = False
+
+    def pause(self):
+        self.player.pause = True
+
+    def close(self):
+        self.player.terminate()
+
+
+PREVIEW_CLASSES = {PREVIEW_WEB: WebPreview, PREVIEW_MPV: MpvPreview}
+
+
+def create_preview(name, interval_ms=DEFAULT_TIME_UPDATE_MS, parent=None):
+    return PREVIEW_CLASSES[name](interval_ms, parent)
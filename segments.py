@@ -0,0 +1,84 @@
+from bisect import bisect_left, insort
+
+
+class SegmentList:
+    """Time segments kept sorted by (start, end); the single source of truth for the segment list.
+
+    Lookups are binary searches. Inserting and removing shift the underlying list, which is
+    O(n) but a memmove that stays negligible at the few hundred segments a video gets; a
+    sorted container or interval tree would not pay for itself at that size. Overlap
+    queries only scan the starts that can reach the query window, so one very long
+    segment widens every later query towards a linear scan.
+    """
+
+    def __init__(self, segments=()):
+        self._segments = []
+        self._max_length = 0.0
+        for start, end in segments:
+            self.add(start, end)
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __iter__(self):
+        return iter(self._segments)
+
+    def __getitem__(self, index):
+        return self._segments[index]
+
+    def __contains__(self, segment):
+        i = bisect_left(self._segments, tuple(segment))
+        return i < len(self._segments) and self._segments[i] == tuple(segment)
+
+    def add(self, start, end):
+        """Insert (start, end); returns False if that exact segment is already present."""
+        segment = (float(start), float(end))
+        if segment[0] >= segment[1]:
+            raise ValueError('segment start must be before its end')
+        if segment in self:
+            return False
+        insort(self._segments, segment)
+        self._max_length = max(self._max_length, segment[1] - segment[0])
+        return True
+
+    def remove(self, start, end):
+        segment = (float(start), float(end))
+        i = bisect_left(self._segments, segment)
+        if i == len(self._segments) or self._segments[i] != segment:
+            raise ValueError(f'segment {segment} not in list')
+        del self._segments[i]
+        if segment[1] - segment[0] >= self._max_length:
+            self._max_length = max((e - s for s, e in self._segments), default=0.0)
+
+    def clear(self):
+        self._segments.clear()
+        self._max_length = 0.0
+
+    def overlapping(self, start, end):
+        """Segments that share any time with [start, end)."""
+        lo = bisect_left(self._segments, (start - self._max_length,))
+        hi = bisect_left(self._segments, (end,))
+        return [(s, e) for s, e in self._segments[lo:hi] if e > start]
+
+    def coalesced(self, gap=0.0):
+        return coalesce_segments(self._segments, gap)
+
+
+def coalesce_segments(segments, gap=0.0):
+    """Merge segments that overlap or are at most gap seconds apart.
+
+    Returns a list of (start, end, members) in time order, where members is a list of
+    (index, start, end) for the input segments covered by that merged range.
+    """
+    order = sorted(range(len(segments)), key=lambda i: tuple(segments[i]))
+    groups = []
+    for i in order:
+        start, end = segments[i]
+        if groups and start <= groups[-1][1] + gap:
+            group = groups[-1]
+            group[1] = max(group[1], end)
+            group[2].append((i, start, end))
+        else:
+            groups.append([start, end, [(i, start, end)]])
+    return [tuple(group) for group in groups]
+
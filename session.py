@@ -0,0 +1,161 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from download_engine import ydl_base_opts
+from metadata_cache import fetch_video_info
+from segments import SegmentList
+from video_urls import KIND_PLAYLIST, parse_youtube_url, playlist_url, split_urls, watch_url
+
+# The videos of one editing session, each with its own segment list and metadata, and a
+# bounded pool that fetches the metadata of pasted videos in the background.
+
+DEFAULT_PREFETCH_WORKERS = 4
+
+STATE_PENDING = 'pending'
+STATE_FETCHING = 'fetching'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+
+
+class SessionVideo:
+    def __init__(self, video_id, title=None):
+        self.video_id = video_id
+        self.url = watch_url(video_id)
+        self.title = title
+        self.segments = SegmentList()
+        self.info = None  # Sanitized info dict once fetched
+        self.extract_seconds = 0.0
+        self.state = STATE_PENDING
+        self.error = None
+
+    def set_info(self, info, extract_seconds=0.0):
+        self.info = info
+        self.title = info.get('title') or self.title
+        self.extract_seconds = extract_seconds
+        self.state = STATE_READY
+        self.error = None
+
+    def describe(self):
+        text = self.title or self.video_id
+        if self.segments:
+            text += f'  ({len(self.segments)} segments)'
+        if self.state != STATE_READY:
+            text += f'  [{self.state}]'
+        return text
+
+
+class Session:
+    """Videos in the order they were added, keyed by video id."""
+
+    def __init__(self):
+        self.videos = {}
+
+    def __len__(self):
+        return len(self.videos)
+
+    def __iter__(self):
+        return iter(list(self.videos.values()))
+
+    def get(self, video_id):
+        return self.videos.get(video_id)
+
+    def add(self, video_id, title=None):
+        """The session's video for video_id, added if it is new."""
+        video = self.videos.get(video_id)
+        if video is None:
+            video = self.videos[video_id] = SessionVideo(video_id, title)
+        elif title and not video.title:
+            video.title = title
+        return video
+
+    def remove(self, video_id):
+        self.videos.pop(video_id, None)
+
+    def add_text(self, text):
+        """Add every video URL in pasted text.
+
+        Returns (videos named in text, playlist URLs to expand, parts that are not YouTube URLs).
+        """
+        videos, playlists, rejected = [], [], []
+        for part in split_urls(text):
+            parsed = parse_youtube_url(part)
+            if parsed is None:
+                rejected.append(part)
+            elif parsed[0] == KIND_PLAYLIST:
+                playlists.append(playlist_url(parsed[1]))
+            else:
+                videos.append(self.add(parsed[1]))
+        return videos, playlists, rejected
+
+    def with_segments(self):
+        return [video for video in self if video.segments]
+
+
+def expand_playlist(url, cookies=None):
+    """(video id, title) of every entry of a playlist, from a flat extraction (no per-video requests)."""
+    import yt_dlp
+    opts = dict(ydl_base_opts(cookies), extract_flat='in_playlist')
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    return [(entry['id'], entry.get('title')) for entry in info.get('entries') or [] if entry and entry.get('id')]
+
+
+class PrefetchPool:
+    """Fetches video metadata and expands playlists on a bounded pool of threads.
+
+    Callbacks are invoked from pool threads: on_info(video_id, info, seconds),
+    on_error(video_id, error) and on_playlist(url, entries, error) with the
+    (video id, title) entries of an expanded playlist.
+    """
+
+    def __init__(self, workers=DEFAULT_PREFETCH_WORKERS, cache=None, on_info=None, on_error=None, on_playlist=None):
+        self.cache = cache
+        self.on_info = on_info
+        self.on_error = on_error
+        self.on_playlist = on_playlist
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def fetch(self, video, cookies=None, force=False):
+        """Queue a metadata fetch for video unless it has its info already (and not force) or one is queued."""
+        with self._lock:
+            if video.video_id in self._inflight or (video.state == STATE_READY and not force):
+                return False
+            self._inflight.add(video.video_id)
+        video.state = STATE_FETCHING
+        self._pool.submit(self._fetch, video.video_id, video.url, cookies, force)
+        return True
+
+    def _fetch(self, video_id, url, cookies, force=False):
+        started = time.monotonic()
+        try:
+            # force is the user asking for fresh formats, so the cached info is skipped too
+            info = fetch_video_info(url, cookies, self.cache, force)
+        except Exception as e:
+            self._emit(self.on_error, video_id, str(e))
+        else:
+            self._emit(self.on_info, video_id, info, time.monotonic() - started)
+        finally:
+            with self._lock:
+                self._inflight.discard(video_id)
+
+    def expand(self, url, cookies=None):
+        self._pool.submit(self._expand, url, cookies)
+
+    def _expand(self, url, cookies):
+        try:
+            entries = expand_playlist(url, cookies)
+        except Exception as e:
+            self._emit(self.on_playlist, url, [], str(e))
+        else:
+            self._emit(self.on_playlist, url, entries, '')
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _emit(callback, *args):
+        if callback is not None:
+            callback(*args)
@@ -1,81 +1,207 @@
 import sys
+
+if __name__ == '__main__' and '--batch' in sys.argv[1:]:
+    # Headless batch mode: hand over before any Qt module is imported
+    from batch import main as batch_main
+    sys.exit(batch_main(sys.argv[1:]))
+
 import os
-import subprocess
-from urllib.parse import urlparse, parse_qs
+import time
+import logging
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QLineEdit, QPushButton, QComboBox, QLabel, QMessageBox, QProgressBar, QListWidget, QFileDialog)
-from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QUrl
+                             QLineEdit, QPushButton, QComboBox, QLabel, QMessageBox, QProgressBar, QListWidget, QListWidgetItem, QFileDialog, QSpinBox,
+                             QDoubleSpinBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QColor, QPalette
-import yt_dlp  # Still used for fetching formats
+from download_engine import (DEFAULT_MAX_WORKERS, ENGINES, ENGINE_SUBPROCESS, build_format_string,
+                             format_timestamp, parse_timestamp)
+from metadata_cache import InfoCache, video_key
+from audio_analysis import LOUD_DB, SILENCE_DB, SNAP_DISTANCE, AudioAnalyzer, AudioCache, local_key
+from bandwidth import BandwidthScheduler
+from clip_cache import DEFAULT_MAX_BYTES as CLIP_CACHE_BYTES, ClipCache
+from compilation import OUTPUT_COMPILE, OUTPUT_MODES, Compiler
+from cutter import CUT_MODES, CUT_FAST, CUT_PRECISE, probe_duration
+from filmstrip import FilmstripTimeline
+from job_queue import JobQueue, QueueRunner
+from format_index import DEFAULT_CONSTRAINTS, build_format_index, parse_constraints, pick_format
+from planner import DEFAULT_THROUGHPUT, STRATEGIES, STRATEGY_SECTIONS, estimate_selected_formats, plan_download
+from preview import DEFAULT_TIME_UPDATE_MS, PREVIEW_BACKENDS, create_preview
+from segments import SegmentList
+from session import STATE_FAILED, STATE_FETCHING, PrefetchPool, Session
+from storyboard import SpriteCache
+from telemetry import Telemetry
+
+class PreloadThread(QThread):
+    """Imports yt_dlp off the GUI thread so the first fetch does not stall on it."""
+
+    def run(self):
+        import yt_dlp  # noqa: F401
+
+class DownloadThread(QThread):
+    segment_progress = pyqtSignal(int, float)
+    segment_done = pyqtSignal(int)
+    segment_failed = pyqtSignal(int, str)
+    segment_snapped = pyqtSignal(int, float, float)
+    segment_retry = pyqtSignal(int, float, str)
+    completed = pyqtSignal(list)
+
+    def __init__(self, queue, segments, max_workers=DEFAULT_MAX_WORKERS, engine=ENGINE_SUBPROCESS, infos=None,
+                 merge_gap=0.0, cut_mode=CUT_FAST, cache=None, telemetry=None, scheduler=None, clip_cache=None):
+        super().__init__()
+        self.segments = list(segments)  # QueuedSegment rows
+        self.infos = infos or {}
+        # Runner callbacks fire on pool threads; the signals queue them onto the GUI thread
+        self.runner = QueueRunner(queue, engine, max_workers, merge_gap, cut_mode, cache=cache,
+                                  on_progress=self.segment_progress.emit,
+                                  on_segment_done=self.segment_done.emit,
+                                  on_segment_failed=self.segment_failed.emit,
+                                  on_segment_snapped=self.segment_snapped.emit,
+                                  on_segment_retry=self.segment_retry.emit, telemetry=telemetry,
+                                  scheduler=scheduler, clip_cache=clip_cache)
+        self.telemetry = telemetry
+
+    def run(self):
+        results = self.runner.run(self.segments, self.infos)
+        self.completed.emit(results)
+
+    def cancel(self):
+        self.runner.cancel()
 
-class FetchFormatsThread(QThread):
-    completed = pyqtSignal(list, str)
+class CompileThread(QThread):
+    progress = pyqtSignal(float)
+    completed = pyqtSignal(str)  # output path, empty when cancelled
     error = pyqtSignal(str)
 
-    def __init__(self, url):
+    def __init__(self, url, segments, format_str, download_dir, title, cookies=None, info=None,
+                 download_type='video'):
         super().__init__()
-        self.url = url
+        self.args = (url, list(segments), format_str, download_dir, title, cookies, info, download_type)
+        self.compiler = Compiler(on_progress=self.progress.emit)
 
     def run(self):
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extractor_args': {'youtube': {'skip': ['dash', 'hls']}}  # Skip problematic manifests to avoid nsig issues
-            }
-            # Check for cookies.txt in current directory
-            cookies_file = 'cookies.txt'
-            if os.path.exists(cookies_file):
-                ydl_opts['cookiefile'] = cookies_file
-            else:
-                ydl_opts['user_agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36'
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=False)
-                self.title = info.get('title', 'Untitled')
-                formats = info.get('formats', [])
-            self.completed.emit(formats, self.title)
+            self.completed.emit(self.compiler.run(*self.args) or '')
         except Exception as e:
             self.error.emit(str(e))
 
+    def cancel(self):
+        self.compiler.cancel()
+
+class AnalyzeAudioThread(QThread):
+    progress = pyqtSignal(float)
+    completed = pyqtSignal(str, object)  # cache key, AudioAnalysis (None when cancelled)
+    error = pyqtSignal(str, str)  # cache key, error
+
+    def __init__(self, key, cache, url=None, info=None, cookies=None, local_file=None):
+        super().__init__()
+        self.key = key
+        self.cache = cache
+        self.args = (url, info, cookies, local_file)
+        self.analyzer = AudioAnalyzer(on_progress=self.progress.emit)
+
+    def run(self):
+        url, info, cookies, local_file = self.args
+        try:
+            if local_file:
+                try:
+                    duration = probe_duration(local_file)
+                except (OSError, RuntimeError, ValueError):
+                    duration = None  # No progress, the analysis still works
+                analysis = self.analyzer.analyze(local_file, duration=duration)
+            else:
+                analysis = self.analyzer.run(url, info, cookies)
+            if analysis is not None:
+                self.cache.save(self.key, analysis)
+            self.completed.emit(self.key, analysis)
+        except Exception as e:
+            self.error.emit(self.key, str(e))
+
+    def cancel(self):
+        self.analyzer.cancel()
+
+CONSTRAINTS_HELP = ('Max/min resolution (<=1080p, >=720p), fps (<=30fps), codec (h264, vp9, av1), '
+                    'container (mp4, webm) and quality, smallest or fastest')
+
 class YouTubeDownloader(QMainWindow):
+    # Emitted from the prefetch pool's threads; delivered on the GUI thread
+    prefetch_done = pyqtSignal(str, dict, float)  # video id, info, seconds spent extracting
+    prefetch_failed = pyqtSignal(str, str)  # video id, error
+    playlist_expanded = pyqtSignal(str, list, str)  # playlist url, [(video id, title)], error
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle('YouTube Downloader')
         self.setGeometry(100, 100, 1800, 600)
         self.start_time = None  # float seconds
         self.end_time = None  # float seconds
-        self.time_segments = []  # List of (start, end) tuples
+        self.time_segments = SegmentList()  # Sorted (start, end) tuples of the current video
         self.video_id = None
+        self.local_video = None  # Local file shown in the preview instead of a YouTube video
+        self.local_segments = {}  # Absolute path of a local file -> its own SegmentList
         self.current_time = 0.0
         self.previewing = False
         self.player_ready = False
         self.download_dir = os.getcwd()  # Default to current directory
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_current_time)
         self.formats = []  # List of available formats
-        self.is_fetching = False  # Flag to track fetching status
         self.title = 'Untitled'  # Default title
+        self.session = Session()  # Every loaded video with its own segments and info
+        self.current = None  # SessionVideo shown in the preview and edited
+        self.video_info = None  # Full info dict of the current video, once fetched
+        self.format_index = []  # Ranked FormatEntries of video_info for the chosen download type
+        self.throughput = DEFAULT_THROUGHPUT  # bytes/s, updated from finished downloads
+        self.download_started_at = 0.0
+        self.extract_seconds = {}  # url -> seconds the last format fetch took, for telemetry
+        self.info_cache = InfoCache()
+        self.clip_cache = ClipCache()
+        self.sprite_cache = SpriteCache()
+        self.audio_cache = AudioCache()
+        self.audio_analyses = {}  # video id (or local_key of a file) -> AudioAnalysis
+        self.analyze_thread = None
+        self.job_queue = JobQueue()
+        self.clear_on_success = []  # Videos whose segments are cleared once the running download succeeds
+        self.prefetch = PrefetchPool(cache=self.info_cache, on_info=self.prefetch_done.emit,
+                                     on_error=self.prefetch_failed.emit, on_playlist=self.playlist_expanded.emit)
+        self.prefetch_done.connect(self.update_formats)
+        self.prefetch_failed.connect(self.fetch_error)
+        self.playlist_expanded.connect(self.add_playlist)
+        self.download_thread = None
+        self.compile_thread = None
+        self.segment_percents = []  # Per-segment progress of the running download
+        self.segment_snaps = {}  # Segment index -> how far keyframe snapping moved (start, end)
+        self.painted = False
         self.initUI()
 
     def initUI(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
-        main_layout = QHBoxLayout(central_widget)
+        main_layout = self.main_layout = QHBoxLayout(central_widget)
 
         # Left panel: Time controls
         left_panel = QVBoxLayout()
         left_panel.setSpacing(10)
 
-        # URL input
+        # URL input: one or more video or playlist URLs
         left_panel.addWidget(QLabel('YouTube URL:'))
         self.url_input = QLineEdit()
+        self.url_input.setPlaceholderText('Video or playlist URLs, separated by spaces')
         self.url_input.returnPressed.connect(self.load_video)
         left_panel.addWidget(self.url_input)
         load_btn = QPushButton('Load Video')
         load_btn.clicked.connect(self.load_video)
         left_panel.addWidget(load_btn)
 
+        # Videos of the session; each keeps its own segments
+        videos_layout = QHBoxLayout()
+        self.videos_list = QListWidget()
+        self.videos_list.setMaximumHeight(100)
+        self.videos_list.currentItemChanged.connect(self.video_selected)
+        videos_layout.addWidget(self.videos_list)
+        remove_video_btn = QPushButton('Remove Video')
+        remove_video_btn.clicked.connect(self.remove_selected_video)
+        videos_layout.addWidget(remove_video_btn)
+        left_panel.addWidget(QLabel('Videos:'))
+        left_panel.addLayout(videos_layout)
+
         # Fetch formats button
         self.fetch_formats_btn = QPushButton('Fetch Formats')
         self.fetch_formats_btn.clicked.connect(self.start_fetch_formats)
@@ -88,14 +214,32 @@ class YouTubeDownloader(QMainWindow):
         dec_btn.clicked.connect(lambda: self.adjust_time(-10.0))  # Jump back 10 seconds
         current_time_layout.addWidget(dec_btn)
         self.current_time_input = QLineEdit('00:00:00')
-        self.current_time_input.setFixedWidth(60)  # Slightly wider for time input
+        self.current_time_input.setFixedWidth(90)  # Wide enough for milliseconds
         self.current_time_input.returnPressed.connect(self.set_current_from_input)
         current_time_layout.addWidget(self.current_time_input)
         inc_btn = QPushButton('>')
         inc_btn.clicked.connect(lambda: self.adjust_time(10.0))  # Jump forward 10 seconds
         current_time_layout.addWidget(inc_btn)
+        current_time_layout.addWidget(QLabel('update (ms):'))
+        self.time_update_input = QSpinBox()
+        self.time_update_input.setRange(50, 2000)
+        self.time_update_input.setSingleStep(50)
+        self.time_update_input.setValue(DEFAULT_TIME_UPDATE_MS)
+        self.time_update_input.setToolTip('How often the player reports its time while playing')
+        self.time_update_input.valueChanged.connect(self.set_time_update_interval)
+        current_time_layout.addWidget(self.time_update_input)
         left_panel.addLayout(current_time_layout)
 
+        # Preview player
+        preview_layout = QHBoxLayout()
+        preview_layout.addWidget(QLabel('Preview player:'))
+        self.preview_mode = QComboBox()
+        self.preview_mode.addItems(PREVIEW_BACKENDS)
+        self.preview_mode.setToolTip('web: YouTube embed player; mpv: plays the fetched stream or a local file')
+        self.preview_mode.currentTextChanged.connect(self.switch_preview)
+        preview_layout.addWidget(self.preview_mode)
+        left_panel.addLayout(preview_layout)
+
         # Start and End controls
         start_end_layout = QHBoxLayout()
         left_panel.addWidget(QLabel('start time:'))
@@ -125,6 +269,38 @@ class YouTubeDownloader(QMainWindow):
         self.add_segment_btn.clicked.connect(self.add_segment)
         left_panel.addWidget(self.add_segment_btn)
 
+        # Audio analysis: snap start/end into pauses, suggest segments where there is sound
+        audio_layout = QHBoxLayout()
+        self.analyze_audio_btn = QPushButton('Analyze Audio')
+        self.analyze_audio_btn.setToolTip('Measure the loudness of the whole audio track (cached per video)')
+        self.analyze_audio_btn.clicked.connect(self.analyze_audio)
+        audio_layout.addWidget(self.analyze_audio_btn)
+        snap_start_btn = QPushButton('Snap Start')
+        snap_start_btn.setToolTip(f'Move the start into the nearest pause (within {SNAP_DISTANCE:.0f}s)')
+        snap_start_btn.clicked.connect(lambda: self.snap_to_silence('start'))
+        audio_layout.addWidget(snap_start_btn)
+        snap_end_btn = QPushButton('Snap End')
+        snap_end_btn.setToolTip(f'Move the end into the nearest pause (within {SNAP_DISTANCE:.0f}s)')
+        snap_end_btn.clicked.connect(lambda: self.snap_to_silence('end'))
+        audio_layout.addWidget(snap_end_btn)
+        suggest_btn = QPushButton('Suggest Segments')
+        suggest_btn.setToolTip('Add a segment for every stretch louder than the loudness threshold')
+        suggest_btn.clicked.connect(self.suggest_segments)
+        audio_layout.addWidget(suggest_btn)
+        left_panel.addLayout(audio_layout)
+        levels_layout = QHBoxLayout()
+        levels_layout.addWidget(QLabel('Silence below (dBFS):'))
+        self.silence_db_input = QSpinBox()
+        self.silence_db_input.setRange(-90, -10)
+        self.silence_db_input.setValue(int(SILENCE_DB))
+        levels_layout.addWidget(self.silence_db_input)
+        levels_layout.addWidget(QLabel('Loud above (dBFS):'))
+        self.loud_db_input = QSpinBox()
+        self.loud_db_input.setRange(-90, 0)
+        self.loud_db_input.setValue(int(LOUD_DB))
+        levels_layout.addWidget(self.loud_db_input)
+        left_panel.addLayout(levels_layout)
+
         # Segments list and delete button
         segments_layout = QHBoxLayout()
         self.segments_list = QListWidget()
@@ -146,6 +322,7 @@ class YouTubeDownloader(QMainWindow):
         left_panel.addWidget(QLabel('Download Type:'))
         self.download_type = QComboBox()
         self.download_type.addItems(['video', 'audio'])
+        self.download_type.currentTextChanged.connect(self.refresh_format_index)
         left_panel.addWidget(self.download_type)
 
         # Resolution mode
@@ -155,7 +332,13 @@ class YouTubeDownloader(QMainWindow):
         self.resolution_mode.currentTextChanged.connect(self.toggle_custom_format)
         left_panel.addWidget(self.resolution_mode)
 
-        # Custom format (ComboBox)
+        # Constraints for the automatic pick, e.g. "<=1080p, smallest, h264"
+        self.format_constraints = QLineEdit(DEFAULT_CONSTRAINTS)
+        self.format_constraints.setToolTip(CONSTRAINTS_HELP)
+        self.format_constraints.editingFinished.connect(self.refresh_format_estimates)
+        left_panel.addWidget(self.format_constraints)
+
+        # Custom format (ComboBox), ranked best first with estimates for the current segments
         self.custom_format_label = QLabel('Custom Format:')
         self.custom_format = QComboBox()
         self.custom_format.setEnabled(False)
@@ -175,10 +358,86 @@ class YouTubeDownloader(QMainWindow):
         choose_dir_btn.clicked.connect(self.choose_download_dir)
         left_panel.addWidget(choose_dir_btn)
 
-        # Download button
+        # Download engine
+        left_panel.addWidget(QLabel('Download Engine:'))
+        self.engine_mode = QComboBox()
+        self.engine_mode.addItems(ENGINES)
+        left_panel.addWidget(self.engine_mode)
+
+        # Download strategy: per-section downloads or one full download cut locally
+        left_panel.addWidget(QLabel('Download Strategy:'))
+        self.strategy_mode = QComboBox()
+        self.strategy_mode.addItems(STRATEGIES)
+        left_panel.addWidget(self.strategy_mode)
+
+        # Cut mode: keyframe-snapped stream copy or frame-accurate edges
+        left_panel.addWidget(QLabel('Cut Mode:'))
+        self.cut_mode = QComboBox()
+        self.cut_mode.addItems(CUT_MODES)
+        self.cut_mode.setToolTip('fast: snap to keyframes and stream copy; precise: re-encode only the edge GOPs')
+        left_panel.addWidget(self.cut_mode)
+
+        # Output: one file per segment, or every segment joined into one chaptered file
+        left_panel.addWidget(QLabel('Output:'))
+        self.output_mode = QComboBox()
+        self.output_mode.addItems(OUTPUT_MODES)
+        self.output_mode.setToolTip('separate: one file per segment; compile: all segments in timeline order '
+                                    'in one file with a chapter per segment')
+        self.output_mode.currentTextChanged.connect(self.output_mode_changed)
+        left_panel.addWidget(self.output_mode)
+
+        # Parallel downloads and merging of nearby segments
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel('Parallel downloads:'))
+        self.max_workers_input = QSpinBox()
+        self.max_workers_input.setRange(1, 8)
+        self.max_workers_input.setValue(DEFAULT_MAX_WORKERS)
+        workers_layout.addWidget(self.max_workers_input)
+        workers_layout.addWidget(QLabel('Merge gap (s):'))
+        self.merge_gap_input = QDoubleSpinBox()
+        self.merge_gap_input.setRange(0.0, 600.0)
+        self.merge_gap_input.setToolTip('Segments closer than this are downloaded together and cut apart locally')
+        workers_layout.addWidget(self.merge_gap_input)
+        left_panel.addLayout(workers_layout)
+
+        # Bandwidth budget shared by all running downloads
+        rate_layout = QHBoxLayout()
+        rate_layout.addWidget(QLabel('Max rate (MB/s, 0 = unlimited):'))
+        self.rate_limit_input = QDoubleSpinBox()
+        self.rate_limit_input.setRange(0.0, 1000.0)
+        self.rate_limit_input.setSingleStep(0.5)
+        self.rate_limit_input.setToolTip('Total download rate across all segments; parallel downloads are also '
+                                         'reduced automatically when YouTube throttles')
+        rate_layout.addWidget(self.rate_limit_input)
+        rate_layout.addWidget(QLabel('Clip cache (GB, 0 = off):'))
+        self.clip_cache_input = QSpinBox()
+        self.clip_cache_input.setRange(0, 500)
+        self.clip_cache_input.setValue(CLIP_CACHE_BYTES // 2**30)
+        self.clip_cache_input.setToolTip('Downloaded clips are kept so the same or a contained section is '
+                                         'served locally next time; least recently used clips go first')
+        self.clip_cache_input.valueChanged.connect(lambda gb: self.clip_cache.set_max_bytes(gb * 2**30))
+        rate_layout.addWidget(self.clip_cache_input)
+        left_panel.addLayout(rate_layout)
+
+        # Download and cancel buttons
+        download_layout = QHBoxLayout()
         self.download_btn = QPushButton('download')
         self.download_btn.clicked.connect(self.start_download)
-        left_panel.addWidget(self.download_btn)
+        download_layout.addWidget(self.download_btn)
+        self.download_all_btn = QPushButton('download all')
+        self.download_all_btn.setToolTip('Download the segments of every video in the list together')
+        self.download_all_btn.clicked.connect(self.start_download_all)
+        download_layout.addWidget(self.download_all_btn)
+        self.cancel_btn = QPushButton('cancel')
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_download)
+        download_layout.addWidget(self.cancel_btn)
+        left_panel.addLayout(download_layout)
+
+        # Per-segment progress rows
+        self.segment_progress_list = QListWidget()
+        self.segment_progress_list.setMaximumHeight(120)
+        left_panel.addWidget(self.segment_progress_list)
 
         # Progress bar
         self.progress_bar = QProgressBar()
@@ -190,130 +449,269 @@ class YouTubeDownloader(QMainWindow):
 
         main_layout.addLayout(left_panel, 1)
 
-        # Middle: Video preview
-        self.video_view = QWebEngineView()
-        # Set up page to enable JavaScript
-        self.video_page = QWebEnginePage(self.video_view)
-        self.video_view.setPage(self.video_page)
-        self.video_page.settings().setAttribute(self.video_page.settings().JavascriptEnabled, True)
-        self.video_view.setHtml('<html><body style="background-color: purple;"><h1 style="color: white;">Now Loading...</h1></body></html>')
-        main_layout.addWidget(self.video_view, 3)
+        # Middle: Video preview; the player is only created by the first load_video
+        self.preview = None
+        self.video_placeholder = QLabel('Enter a YouTube URL and press Load Video')
+        self.video_placeholder.setAlignment(Qt.AlignCenter)
+        self.video_placeholder.setStyleSheet('background-color: purple; color: white; font-size: 20px;')
+        video_column = QVBoxLayout()
+        video_column.addWidget(self.video_placeholder, 1)
+
+        # Storyboard timeline under the player: scrubbing without seeking
+        self.filmstrip = FilmstripTimeline(self.sprite_cache)
+        self.filmstrip.current_requested.connect(self.scrub_to)
+        self.filmstrip.start_requested.connect(self.set_start_time)
+        self.filmstrip.end_requested.connect(self.set_end_time)
+        video_column.addWidget(self.filmstrip)
+        main_layout.addLayout(video_column, 3)
+
+        # Cache statistics
+        self.cache_stats_label = QLabel(self.cache_stats_text())
+        self.statusBar().addPermanentWidget(self.cache_stats_label)
 
         # Apply purple theme
         palette = QPalette()
         palette.setColor(QPalette.Window, QColor(200, 162, 200))
         self.setPalette(palette)
 
+    def cache_stats_text(self):
+        return f'{self.info_cache.stats_text()}; {self.clip_cache.stats_text()}'
+
     def toggle_custom_format(self, mode):
         enabled = mode == 'custom'
         self.custom_format.setEnabled(enabled)
         self.custom_format_label.setEnabled(enabled)
-        if enabled and not self.formats and not self.is_fetching:
+        self.format_constraints.setEnabled(not enabled)
+        if enabled and not self.formats and not (self.current and self.current.state == STATE_FETCHING):
             QMessageBox.information(self, 'Info', 'Please fetch formats first.')
 
     def start_fetch_formats(self):
-        url = self.url_input.text()
-        if not url:
+        if self.current is None:
             QMessageBox.warning(self, 'Error', 'Enter URL first')
             return
-        self.is_fetching = True
-        self.fetch_thread = FetchFormatsThread(url)
-        self.fetch_thread.completed.connect(self.update_formats)
-        self.fetch_thread.error.connect(self.fetch_error)
-        self.status_label.setText('Fetching formats...')
-        self.fetch_thread.start()
-
-    def update_formats(self, formats, title):
-        self.formats = formats
-        self.title = title  # Update title from thread
-        self.custom_format.clear()
-        for fmt in self.formats:
-            format_id = fmt.get('format_id', 'unknown')
-            note = fmt.get('format_note', 'unknown')
-            ext = fmt.get('ext', 'unknown')
-            display = f"{format_id} - {note} ({ext})"
-            self.custom_format.addItem(display, format_id)
-        self.is_fetching = False
+        # Already fetched or being fetched: the pool skips it unless asked again explicitly
+        if self.prefetch.fetch(self.current, self.cookies_input.text(), force=True):
+            self.status_label.setText('Fetching formats...')
+            self.refresh_videos_list()
+
+    def update_formats(self, video_id, info, extract_seconds=0.0):
+        video = self.session.get(video_id)
+        if video is None:
+            return  # Removed while its fetch ran
+        video.set_info(info, extract_seconds)
+        self.extract_seconds[video.url] = extract_seconds
+        self.refresh_videos_list()
+        self.cache_stats_label.setText(self.cache_stats_text())
+        if video is not self.current:
+            return
+        self.show_video_info()
         self.status_label.setText(f"Fetched {len(self.formats)} formats")
+        if self.preview is not None and self.preview.needs_info and not self.player_ready:
+            self.preview.load(self.video_id, info)
 
-    def fetch_error(self, error):
-        self.is_fetching = False
-        self.status_label.setText('Fetch failed')
-        QMessageBox.critical(self, 'Error', f"{error}\nTry updating yt-dlp: pip install yt-dlp --upgrade")
+    def show_video_info(self):
+        self.video_info = self.current.info
+        self.formats = (self.video_info or {}).get('formats', [])
+        self.title = self.current.title or 'Untitled'
+        self.refresh_format_index()
+        if self.video_info is not None:
+            self.filmstrip.load(self.video_id, self.video_info)
+        else:
+            self.filmstrip.clear()
 
-    def load_video(self):
-        url = self.url_input.text()
+    def refresh_format_index(self):
+        self.format_index = build_format_index(self.formats, self.download_type.currentText())
+        self.refresh_format_estimates()
+
+    def refresh_format_estimates(self):
+        # Relabel the ranked formats with what the current segments would cost in each
+        selected = self.custom_format.currentData()
+        duration = (self.video_info or {}).get('duration')
+        self.custom_format.clear()
+        for entry in self.format_index:
+            text = entry.describe()
+            estimate = entry.estimate(self.time_segments, duration, self.merge_gap_input.value(),
+                                      self.max_workers_input.value(), self.throughput) if self.time_segments else None
+            if estimate is not None:
+                text += f"  ~{estimate.total_bytes / 2**20:.1f} MiB, ~{estimate.seconds:.0f}s"
+            self.custom_format.addItem(text, entry.format_str)
+        if selected is not None and self.custom_format.findData(selected) >= 0:
+            self.custom_format.setCurrentIndex(self.custom_format.findData(selected))
+        if self.resolution_mode.currentText() == 'highest' and self.format_index:
+            try:
+                entry = self.pick_constrained_format()
+            except ValueError as e:
+                self.status_label.setText(str(e))
+                return
+            self.format_constraints.setToolTip(
+                f"{CONSTRAINTS_HELP}\nPicks: {entry.describe() if entry else 'nothing matches'}")
+
+    def pick_constrained_format(self):
+        """Entry of the format index that the constraints pick for the current segments, or None."""
+        return pick_format(self.format_index, parse_constraints(self.format_constraints.text()), self.time_segments,
+                           (self.video_info or {}).get('duration'), self.merge_gap_input.value(),
+                           self.max_workers_input.value(), self.throughput)
+
+    def fetch_error(self, video_id, error):
+        video = self.session.get(video_id)
+        if video is None:
+            return
+        video.state, video.error = STATE_FAILED, error
+        self.refresh_videos_list()
+        self.cache_stats_label.setText(self.cache_stats_text())
+        if video is self.current:
+            self.status_label.setText('Fetch failed')
+            QMessageBox.critical(self, 'Error', f"{error}\nTry updating yt-dlp: pip install yt-dlp --upgrade")
+
+    def create_preview(self):
         try:
-            parsed = urlparse(url)
-            self.video_id = parse_qs(parsed.query)['v'][0]
-            # Use direct iframe embed with explicit IFrame API script
-            embed_url = f"https://www.youtube.com/embed/{self.video_id}?enablejsapi=1&origin=*&referrerPolicy=no-referrer-when-downgrade&playsinline=1"
-            html = f"""
-            <html>
-            <head>
-                <meta charset="utf-8">
-                <meta http-equiv="Content-Security-Policy" content="default-src 'self' https://www.youtube.com https://youtube.com https://*.youtube.com; script-src 'self' 'unsafe-inline' 'unsafe-eval' https://www.youtube.com https://youtube.com https://*.youtube.com https://www.google.com; frame-src https://www.youtube.com https://youtube.com https://*.youtube.com; connect-src 'self' https://www.youtube.com https://youtube.com https://*.youtube.com">
-                <style>body {{ margin: 0; padding: 0; background-color: purple; }} #player {{ width: 100%; height: 100%; }}</style>
-                <script src="https://www.youtube.com/iframe_api"></script>
-            </head>
-            <body>
-                <div id="player"></div>
-                <script>
-                    var player;
-                    function onYouTubeIframeAPIReady() {{
-                        player = new YT.Player('player', {{
-                            height: '100%',
-                            width: '100%',
-                            videoId: '{self.video_id}',
-                            playerVars: {{ 'enablejsapi': 1, 'origin': '*' }},
-                            events: {{ 'onReady': onPlayerReady }}
-                        }});
-                    }}
-                    function onPlayerReady(event) {{
-                        window.playerReady = true;
-                        console.log('Player ready');
-                    }}
-                </script>
-            </body>
-            </html>
-            """
-            self.video_view.setHtml(html, QUrl("https://localhost"))  # Use https scheme to satisfy secure context
-            self.player_ready = False
-            self.check_player_ready()
-            self.status_label.setText('Loading video...')
-            self.start_fetch_formats()
-        except Exception as e:
-            self.status_label.setText('Load failed')
-            QMessageBox.warning(self, 'Error', f'Invalid YouTube URL: {str(e)}')
-
-    def check_player_ready(self):
-        if self.video_id:
-            js = "typeof window.playerReady !== 'undefined' && window.playerReady;"
-            self.video_view.page().runJavaScript(js, self.set_player_ready)
-
-    def set_player_ready(self, ready):
-        if ready:
-            self.player_ready = True
-            self.timer.start(100)
-            self.status_label.setText('Video loaded and ready')
-        else:
-            QTimer.singleShot(500, self.check_player_ready)
-
-    def update_current_time(self):
-        if self.video_id and self.player_ready:
-            js = """
-            if (typeof player !== 'undefined' && typeof player.getCurrentTime === 'function') {
-                player.getCurrentTime();
-            } else {
-                -1;
-            }
-            """
-            self.video_view.page().runJavaScript(js, self.set_current_time)
+            preview = create_preview(self.preview_mode.currentText(), self.time_update_input.value(), self)
+        except (ImportError, OSError) as e:
+            QMessageBox.warning(self, 'Error', f'{self.preview_mode.currentText()} preview is unavailable: {e}')
+            return False
+        preview.ready.connect(self.set_player_ready)
+        preview.time_changed.connect(self.set_current_time)
+        preview.error.connect(self.preview_error)
+        old = self.preview.widget() if self.preview is not None else self.video_placeholder
+        self.main_layout.replaceWidget(old, preview.widget())
+        if self.preview is not None:
+            self.preview.close()
+            self.preview.deleteLater()
+        old.deleteLater()
+        self.video_placeholder = None
+        self.preview = preview
+        return True
+
+    def switch_preview(self, name):
+        if self.preview is None:
+            return  # Created with the chosen backend on the next load_video
+        self.player_ready = False
+        if not self.create_preview():
+            return
+        if self.video_id or self.local_video:
+            self.start_preview()
+
+    def load_video(self):
+        text = self.url_input.text().strip()
+        if os.path.isfile(text):
+            self.current, self.video_id, self.local_video = None, None, text
+            # Segments marked on a local file (or suggested from its audio) must not land on the last video
+            self.time_segments = self.local_segments.setdefault(os.path.abspath(text), SegmentList())
+            self.video_info, self.formats, self.title = None, [], 'Untitled'
+            self.refresh_format_index()
+            self.videos_list.setCurrentItem(None)
+            self.filmstrip.clear()
+            self.refresh_segments_list()
+            self.show_in_preview()
+            return
+        videos, playlists, rejected = self.session.add_text(text)
+        if rejected:
+            QMessageBox.warning(self, 'Error', 'Invalid YouTube URL: ' + ', '.join(rejected))
+        cookies = self.cookies_input.text()
+        # Metadata of every pasted video is fetched in the background right away
+        for video in videos:
+            self.prefetch.fetch(video, cookies)
+        for url in playlists:
+            self.prefetch.expand(url, cookies)
+            self.status_label.setText('Reading playlist...')
+        self.refresh_videos_list()
+        if videos:
+            self.select_video(videos[0].video_id)
+
+    def add_playlist(self, url, entries, error):
+        if error:
+            QMessageBox.warning(self, 'Error', f'Could not read playlist {url}:\n{error}')
+            return
+        cookies = self.cookies_input.text()
+        for video_id, title in entries:
+            self.prefetch.fetch(self.session.add(video_id, title), cookies)
+        self.status_label.setText(f'Added {len(entries)} videos from the playlist')
+        self.refresh_videos_list()
+        if self.current is None and entries:
+            self.select_video(entries[0][0])
+
+    def refresh_videos_list(self):
+        self.videos_list.blockSignals(True)
+        self.videos_list.clear()
+        for video in self.session:
+            item = QListWidgetItem(video.describe())
+            item.setData(Qt.UserRole, video.video_id)
+            if video.error:
+                item.setToolTip(video.error)
+            self.videos_list.addItem(item)
+            if video is self.current:
+                self.videos_list.setCurrentItem(item)
+        self.videos_list.blockSignals(False)
+
+    def video_selected(self, item, previous=None):
+        if item is not None:
+            self.select_video(item.data(Qt.UserRole))
+
+    def select_video(self, video_id):
+        """Make video_id the current video: its segments, formats and preview, all already in memory."""
+        video = self.session.get(video_id)
+        if video is None or (video is self.current and self.player_ready):
+            return
+        self.current, self.video_id, self.local_video = video, video.video_id, None
+        self.time_segments = video.segments
+        self.url_input.setText(video.url)
+        self.show_video_info()
+        self.refresh_segments_list()
+        self.show_in_preview()
+
+    def remove_selected_video(self):
+        item = self.videos_list.currentItem()
+        if item is None:
+            return
+        self.session.remove(item.data(Qt.UserRole))
+        if self.current is not None and self.current.video_id == item.data(Qt.UserRole):
+            self.current, self.video_id = None, None
+            self.time_segments = SegmentList()
+            self.video_info, self.formats, self.title = None, [], 'Untitled'
+            self.refresh_format_index()
+            self.filmstrip.clear()
+            self.refresh_segments_list()
+            remaining = list(self.session)
+            if remaining:
+                self.select_video(remaining[0].video_id)
+        self.refresh_videos_list()
+
+    def show_in_preview(self):
+        if self.preview is None and not self.create_preview():
+            return
+        self.player_ready = False
+        self.status_label.setText('Loading video...')
+        self.start_preview()
+
+    def start_preview(self):
+        if self.local_video:
+            if self.preview.plays_files:
+                self.preview.load_file(self.local_video)
+            else:
+                self.status_label.setText('The web player cannot play local files; choose the mpv preview')
+        elif not self.preview.needs_info:
+            self.preview.load(self.video_id)
+        elif self.video_info is not None:
+            self.preview.load(self.video_id, self.video_info)
+        # Otherwise update_formats starts the preview once the stream URLs arrive
+
+    def preview_error(self, error):
+        self.status_label.setText('Preview failed')
+        QMessageBox.warning(self, 'Error', error)
+
+    def set_player_ready(self):
+        self.player_ready = True
+        self.status_label.setText('Video loaded and ready')
+
+    def set_time_update_interval(self, ms):
+        if self.preview is not None:
+            self.preview.set_time_update_interval(ms)
 
     def set_current_time(self, time):
         if time is not None and time != -1:
             self.current_time = float(time)
             self.current_time_input.setText(self.format_time_input(self.current_time))
+            self.filmstrip.set_current(self.current_time)
             if self.previewing and self.end_time is not None and self.current_time >= self.end_time:
                 self.safe_pause_video()
                 self.previewing = False
@@ -324,14 +722,8 @@ class YouTubeDownloader(QMainWindow):
             # Ensure new_time stays within video bounds (e.g., 0 to video duration)
             if new_time < 0:
                 new_time = 0
-            js = f"""
-            if (typeof player !== 'undefined' && typeof player.seekTo === 'function') {{
-                player.seekTo({new_time}, true);
-            }}
-            """
-            self.video_view.page().runJavaScript(js)
-            self.current_time = new_time
-            self.current_time_input.setText(self.format_time_input(self.current_time))
+            self.safe_seek_to(new_time)
+            self.scrub_to(new_time)
 
     def set_current_from_input(self):
         if self.player_ready:
@@ -340,62 +732,58 @@ class YouTubeDownloader(QMainWindow):
                 new_time = self.parse_time_input(time_str)
                 if new_time is not None:
                     self.safe_seek_to(new_time)
-                    self.current_time = new_time
-                    self.current_time_input.setText(self.format_time_input(self.current_time))
+                    self.scrub_to(new_time)
             except Exception as e:
                 QMessageBox.warning(self, 'Error', f'Invalid time format. Use "HH:MM:SS" or seconds (e.g., "123" or "01:23").')
 
     def parse_time_input(self, time_str):
         """Parse time input into seconds (supports "HH:MM:SS" or plain seconds)."""
-        try:
-            if ':' in time_str:
-                parts = [int(p) for p in time_str.split(':')]
-                if len(parts) == 3:
-                    hours, minutes, seconds = parts
-                    return hours * 3600 + minutes * 60 + seconds
-                elif len(parts) == 2:
-                    minutes, seconds = parts
-                    return minutes * 60 + seconds
-            else:
-                return float(time_str)
-        except ValueError:
-            return None
+        return parse_timestamp(time_str)
 
     def format_time_input(self, seconds):
-        """Format seconds into HH:MM:SS string."""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        """Format seconds into HH:MM:SS string, with milliseconds when there are any."""
+        millis = round(seconds * 1000)
+        text = format_timestamp(millis // 1000)
+        return f'{text}.{millis % 1000:03d}' if millis % 1000 else text
 
     def safe_seek_to(self, time):
-        js = f"""
-        if (typeof player !== 'undefined' && typeof player.seekTo === 'function') {{
-            player.seekTo({time}, true);
-        }}
-        """
-        self.video_view.page().runJavaScript(js)
+        if self.preview is not None:
+            self.preview.seek(time)
+
+    def scrub_to(self, seconds):
+        # Moves the current time only; the player is left where it is
+        self.current_time = seconds
+        self.current_time_input.setText(self.format_time_input(self.current_time))
+        self.filmstrip.set_current(self.current_time)
+
+    def set_start_time(self, seconds):
+        self.start_time = seconds
+        text = self.format_time_input(seconds) if seconds is not None else 'not set'
+        self.start_label.setText(f"start: {text}")
+        self.start_input.setText(text)
+        self.filmstrip.set_marks(self.start_time, self.end_time)
+
+    def set_end_time(self, seconds):
+        self.end_time = seconds
+        text = self.format_time_input(seconds) if seconds is not None else 'not set'
+        self.end_label.setText(f"end: {text}")
+        self.end_input.setText(text)
+        self.filmstrip.set_marks(self.start_time, self.end_time)
 
     def set_start(self):
         if self.player_ready:
-            self.start_time = self.current_time
-            self.start_label.setText(f"start: {self.format_time_input(self.start_time)}")
-            self.start_input.setText(self.format_time_input(self.start_time))
+            self.set_start_time(self.current_time)
 
     def set_end(self):
         if self.player_ready:
-            self.end_time = self.current_time
-            self.end_label.setText(f"end: {self.format_time_input(self.end_time)}")
-            self.end_input.setText(self.format_time_input(self.end_time))
+            self.set_end_time(self.current_time)
 
     def set_start_from_input(self):
         if self.player_ready:
             time_str = self.start_input.text().strip()
             new_time = self.parse_time_input(time_str)
             if new_time is not None:
-                self.start_time = new_time
-                self.start_label.setText(f"start: {self.format_time_input(self.start_time)}")
-                self.start_input.setText(self.format_time_input(self.start_time))
+                self.set_start_time(new_time)
             else:
                 QMessageBox.warning(self, 'Error', f'Invalid start time format. Use "HH:MM:SS" or seconds (e.g., "123" or "01:23").')
 
@@ -404,9 +792,7 @@ class YouTubeDownloader(QMainWindow):
             time_str = self.end_input.text().strip()
             new_time = self.parse_time_input(time_str)
             if new_time is not None:
-                self.end_time = new_time
-                self.end_label.setText(f"end: {self.format_time_input(self.end_time)}")
-                self.end_input.setText(self.format_time_input(self.end_time))
+                self.set_end_time(new_time)
             else:
                 QMessageBox.warning(self, 'Error', f'Invalid end time format. Use "HH:MM:SS" or seconds (e.g., "123" or "01:23").')
 
@@ -414,14 +800,26 @@ class YouTubeDownloader(QMainWindow):
         if self.start_time is None or self.end_time is None or self.start_time >= self.end_time:
             QMessageBox.warning(self, 'Error', 'Invalid start/end times')
             return
-        self.time_segments.append((self.start_time, self.end_time))
-        self.segments_list.addItem(f"Segment: {self.format_time_input(self.start_time)} - {self.format_time_input(self.end_time)}")
-        self.start_time = None
-        self.end_time = None
-        self.start_label.setText('start: not set')
-        self.end_label.setText('end: not set')
-        self.start_input.setText('not set')
-        self.end_input.setText('not set')
+        if not self.time_segments.add(self.start_time, self.end_time):
+            QMessageBox.warning(self, 'Error', 'That segment is already in the list')
+            return
+        self.refresh_segments_list()
+        self.set_start_time(None)
+        self.set_end_time(None)
+
+    def refresh_segments_list(self):
+        # The list widget mirrors time_segments; each item carries its exact (start, end)
+        self.segments_list.clear()
+        for start, end in self.time_segments:
+            text = f"Segment: {self.format_time_input(start)} - {self.format_time_input(end)}"
+            if self.time_segments.overlapping(start, end) != [(start, end)]:
+                text += '  (overlaps)'
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, (start, end))
+            self.segments_list.addItem(item)
+        self.filmstrip.set_segments(self.time_segments)
+        self.refresh_format_estimates()
+        self.refresh_videos_list()  # Segment counts
 
     def delete_selected_segment(self):
         selected_items = self.segments_list.selectedItems()
@@ -429,14 +827,89 @@ class YouTubeDownloader(QMainWindow):
             QMessageBox.warning(self, 'Error', 'Please select at least one segment to delete')
             return
         for item in selected_items:
-            segment_text = item.text()
-            start_end = segment_text.replace('Segment: ', '').split(' - ')
-            start = self.parse_time_input(start_end[0])
-            end = self.parse_time_input(start_end[1])
-            segment_to_remove = (start, end)
-            if segment_to_remove in self.time_segments:
-                self.time_segments.remove(segment_to_remove)
-            self.segments_list.takeItem(self.segments_list.row(item))
+            start, end = item.data(Qt.UserRole)
+            self.time_segments.remove(start, end)
+        self.refresh_segments_list()
+
+    def audio_key(self):
+        if self.local_video:
+            return local_key(self.local_video)
+        return self.video_id
+
+    def current_analysis(self):
+        """AudioAnalysis of the current video from memory or the disk cache, or None."""
+        key = self.audio_key()
+        if key is None:
+            return None
+        if key not in self.audio_analyses:
+            analysis = self.audio_cache.load(key)
+            if analysis is None:
+                return None
+            self.audio_analyses[key] = analysis
+        return self.audio_analyses[key]
+
+    def analyze_audio(self):
+        if self.audio_key() is None:
+            QMessageBox.warning(self, 'Error', 'Load a video first')
+            return
+        if self.analyze_thread is not None and self.analyze_thread.isRunning():
+            return
+        if self.current_analysis() is not None:
+            self.status_label.setText('Audio already analysed')
+            return
+        if self.local_video:
+            self.analyze_thread = AnalyzeAudioThread(self.audio_key(), self.audio_cache, local_file=self.local_video)
+        else:
+            self.analyze_thread = AnalyzeAudioThread(self.video_id, self.audio_cache, self.current.url,
+                                                     self.current.info, self.cookies_input.text())
+        self.analyze_audio_btn.setEnabled(False)
+        self.status_label.setText('Analysing audio...')
+        self.analyze_thread.progress.connect(
+            lambda percent: self.status_label.setText(f'Analysing audio... {percent:.0f}%'))
+        self.analyze_thread.completed.connect(self.audio_analyzed)
+        self.analyze_thread.error.connect(self.audio_analysis_failed)
+        self.analyze_thread.start()
+
+    def audio_analyzed(self, key, analysis):
+        self.analyze_audio_btn.setEnabled(True)
+        if analysis is None:
+            self.status_label.setText('Audio analysis cancelled')
+            return
+        self.audio_analyses[key] = analysis
+        pauses = len(analysis.silences(self.silence_db_input.value()))
+        self.status_label.setText(f'Audio analysed: {pauses} pauses in {self.format_time_input(analysis.duration)}')
+
+    def audio_analysis_failed(self, key, error):
+        self.analyze_audio_btn.setEnabled(True)
+        self.status_label.setText('Audio analysis failed')
+        QMessageBox.warning(self, 'Error', f'Audio analysis failed: {error}')
+
+    def snap_to_silence(self, edge):
+        analysis = self.current_analysis()
+        if analysis is None:
+            QMessageBox.information(self, 'Info', 'Analyze the audio first.')
+            return
+        seconds = self.start_time if edge == 'start' else self.end_time
+        if seconds is None:
+            QMessageBox.warning(self, 'Error', f'Set the {edge} time first')
+            return
+        snapped = analysis.snap(seconds, self.silence_db_input.value())
+        if snapped is None:
+            self.status_label.setText(f'No pause within {SNAP_DISTANCE:.0f}s of the {edge}')
+        elif edge == 'start':
+            self.set_start_time(snapped)
+        else:
+            self.set_end_time(snapped)
+
+    def suggest_segments(self):
+        analysis = self.current_analysis()
+        if analysis is None:
+            QMessageBox.information(self, 'Info', 'Analyze the audio first.')
+            return
+        suggested = analysis.suggest_segments(self.loud_db_input.value())
+        added = sum(1 for start, end in suggested if self.time_segments.add(start, end))
+        self.refresh_segments_list()
+        self.status_label.setText(f'Added {added} suggested segments')
 
     def preview_segment(self):
         if not self.player_ready:
@@ -450,20 +923,12 @@ class YouTubeDownloader(QMainWindow):
         self.safe_play_video()
 
     def safe_play_video(self):
-        js = """
-        if (typeof player !== 'undefined' && typeof player.playVideo === 'function') {
-            player.playVideo();
-        }
-        """
-        self.video_view.page().runJavaScript(js)
+        if self.preview is not None:
+            self.preview.play()
 
     def safe_pause_video(self):
-        js = """
-        if (typeof player !== 'undefined' && typeof player.pauseVideo === 'function') {
-            player.pauseVideo();
-        }
-        """
-        self.video_view.page().runJavaScript(js)
+        if self.preview is not None:
+            self.preview.pause()
 
     def choose_download_dir(self):
         dir = QFileDialog.getExistingDirectory(self, "Select Download Directory", self.download_dir)
@@ -472,76 +937,314 @@ class YouTubeDownloader(QMainWindow):
             self.download_dir_label.setText(self.download_dir)
 
     def start_download(self):
-        if not self.url_input.text() or not self.time_segments:
+        if self.current is None or not self.time_segments:
             QMessageBox.warning(self, 'Error', 'Missing URL or segments')
             return
-        mode = self.resolution_mode.currentText()
-        if mode == 'custom' and self.custom_format.currentIndex() == -1:
+        if self.resolution_mode.currentText() == 'custom' and self.custom_format.currentIndex() == -1:
             QMessageBox.warning(self, 'Error', 'Select a custom format')
             return
+        video = self.current
+        try:
+            if self.output_mode.currentText() == OUTPUT_COMPILE:
+                self.start_compile(video, self.video_format(video)[2])
+                return
+            segments, status = self.enqueue_video(video)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Error', str(e))
+            return
+        self.status_label.setText(status)
+        self.run_queued(segments, {video.url: video.info} if video.info else {}, clear_on_success=[video])
 
-        self.download_btn.setEnabled(False)
-        self.status_label.setText('Downloading...')
-        self.progress_bar.setValue(0)
+    def start_download_all(self):
+        """Queue the segments of every video and run them as one download sharing workers and bandwidth."""
+        videos = self.session.with_segments()
+        if not videos:
+            QMessageBox.warning(self, 'Error', 'No video has segments')
+            return
+        segments, queued, skipped = [], [], []
+        for video in videos:
+            try:
+                segments += self.enqueue_video(video)[0]
+                queued.append(video)
+            except ValueError as e:
+                skipped.append(f'{video.title or video.video_id}: {e}')
+        if skipped:
+            QMessageBox.warning(self, 'Error', 'Skipped:\n' + '\n'.join(skipped))
+        if not segments:
+            return
+        self.status_label.setText(f'Downloading {len(segments)} segments of {len(queued)} videos...')
+        self.run_queued(segments, {video.url: video.info for video in queued if video.info}, clear_on_success=queued)
 
-        url = self.url_input.text()
-        cookies = self.cookies_input.text()
+    def video_format(self, video):
+        """(mode, custom format id, format string) for video from the format settings; ValueError if none fits."""
+        mode = self.resolution_mode.currentText()
         download_type = self.download_type.currentText()
         custom_format_id = self.custom_format.currentData() if mode == 'custom' else None
-
-        # Determine format string
-        if mode == 'highest':
-            format_str = 'best[height<=1080]' if download_type == 'video' else 'bestaudio'
-        else:  # custom
-            if download_type == 'video':
-                format_str = f'{custom_format_id}+bestaudio/best'  # Merge video + audio
+        if mode == 'highest' and video.info:
+            if video is self.current:
+                index = self.format_index
             else:
-                format_str = custom_format_id
+                index = build_format_index(video.info.get('formats', []), download_type)
+            if index:
+                entry = pick_format(index, parse_constraints(self.format_constraints.text()), video.segments,
+                                    video.info.get('duration'), self.merge_gap_input.value(),
+                                    self.max_workers_input.value(), self.throughput)
+                if entry is None:
+                    raise ValueError('No format matches the constraints')
+                mode, custom_format_id = 'custom', entry.format_str
+        return mode, custom_format_id, build_format_string(mode, download_type, custom_format_id)
 
-        try:
-            for idx, (start, end) in enumerate(self.time_segments, 1):
-                # Format start time as HH:MM:SS
-                hours = int(start // 3600)
-                minutes = int((start % 3600) // 60)
-                seconds = int(start % 60)
-                start_time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                hours = int(end // 3600)
-                minutes = int((end % 3600) // 60)
-                seconds = int(end % 60)
-                end_time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                # Sanitize title to avoid illegal filename characters
-                safe_title = ''.join(c if c.isalnum() or c in ' -_.' else '_' for c in self.title)
-                filename = f"{safe_title}-{start_time_str}-{end_time_str}.%(ext)s"
-                cmd = ['yt-dlp', url]
-                if cookies:
-                    cmd += ['--cookies', cookies]
-                cmd += ['--download-sections', f'*{start}-{end}']
-                cmd += ['-f', format_str]
-                cmd += ['-o', os.path.join(self.download_dir, filename)]
-                self.status_label.setText(f'Downloading segment {idx}...')
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                if result.returncode != 0:
-                    raise Exception(result.stderr)
-                self.progress_bar.setValue(int((idx / len(self.time_segments)) * 100))
+    def enqueue_video(self, video):
+        """Queue video's segments with the current settings; returns (queued segments, status text)."""
+        mode, custom_format_id, format_str = self.video_format(video)
+        info = video.info
+        # Sections the clip cache holds are linked or cut locally; only the rest is planned as downloads
+        video_id = (info or {}).get('id') or video_key(video.url)
+        precise = self.cut_mode.currentText() == CUT_PRECISE
+        to_fetch = self.clip_cache.uncached(video_id, format_str, video.segments, precise)
+        cached = len(video.segments) - len(to_fetch)
+        status = 'Downloading...'
+        if to_fetch:
+            formats = info.get('formats', []) if info else []
+            plan = plan_download(estimate_selected_formats(formats, mode, self.download_type.currentText(),
+                                                           custom_format_id),
+                                 to_fetch, info.get('duration') if info else None,
+                                 self.strategy_mode.currentText(), self.merge_gap_input.value(),
+                                 self.max_workers_input.value(), self.throughput)
+            status += f' ({plan.estimate.describe() if plan.estimate else plan.strategy})'
+            strategy = plan.strategy
+        else:
+            strategy = STRATEGY_SECTIONS  # Nothing left to fetch
+        if cached:
+            status += f', {cached} of {len(video.segments)} segments from the clip cache'
+        segments = self.job_queue.enqueue(video.url, video.title or 'Untitled', video.segments, format_str,
+                                          self.download_dir, self.cookies_input.text(), strategy,
+                                          self.cut_mode.currentText())
+        return segments, status
+
+    def run_queued(self, segments, infos=None, clear_on_success=()):
+        self.download_btn.setEnabled(False)
+        self.download_all_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.clear_on_success = list(clear_on_success)
+        self.segment_percents = [0.0] * len(segments)
+        self.segment_snaps = {}
+        self.download_started_at = time.monotonic()
+        self.segment_progress_list.clear()
+        for segment in segments:
+            self.segment_progress_list.addItem(self.segment_progress_text(segment, 'queued'))
+
+        telemetry = Telemetry()
+        for url in {segment.url for segment in segments} & set(self.extract_seconds):
+            telemetry.extraction(url, self.extract_seconds[url])
+        self.download_thread = DownloadThread(self.job_queue, segments, self.max_workers_input.value(),
+                                              self.engine_mode.currentText(), infos, self.merge_gap_input.value(),
+                                              self.cut_mode.currentText(), self.info_cache, telemetry,
+                                              BandwidthScheduler(self.max_workers_input.value(),
+                                                                 self.rate_limit_input.value() * 1e6),
+                                              self.clip_cache)
+        self.download_thread.segment_progress.connect(self.update_segment_progress)
+        self.download_thread.segment_done.connect(lambda idx: self.set_segment_status(idx, 'done'))
+        self.download_thread.segment_snapped.connect(self.segment_snapped)
+        self.download_thread.segment_failed.connect(lambda idx, error: self.set_segment_status(idx, 'failed'))
+        self.download_thread.segment_retry.connect(
+            lambda idx, delay, error: self.set_segment_status(idx, f'retrying in {delay:.0f}s'))
+        self.download_thread.completed.connect(self.download_finished)
+        self.download_thread.start()
+
+    def output_mode_changed(self, mode):
+        # Compilations stream copy every section from its keyframe, so precise cuts don't apply
+        compile_mode = mode == OUTPUT_COMPILE
+        if compile_mode:
+            self.cut_mode.setCurrentText(CUT_FAST)
+        self.cut_mode.setEnabled(not compile_mode)
+
+    def start_compile(self, video, format_str):
+        self.download_btn.setEnabled(False)
+        self.download_all_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.segment_progress_list.clear()
+        self.clear_on_success = [video]
+        self.status_label.setText(f'Compiling {len(video.segments)} segments...')
+        self.compile_thread = CompileThread(video.url, video.segments, format_str, self.download_dir,
+                                            video.title or 'Untitled', self.cookies_input.text(), video.info,
+                                            self.download_type.currentText())
+        self.compile_thread.progress.connect(lambda percent: self.progress_bar.setValue(int(percent)))
+        self.compile_thread.completed.connect(self.compile_finished)
+        self.compile_thread.error.connect(self.compile_finished_with_error)
+        self.compile_thread.start()
+
+    def record_compile(self, error=None):
+        # One fetch shared by every segment, like a merged download
+        thread = self.compile_thread
+        url, segments = thread.args[0], thread.args[1]
+        telemetry = Telemetry()
+        telemetry.extraction(url, self.extract_seconds.get(url, 0.0))
+        if thread.compiler.timer is not None:
+            timer = thread.compiler.timer
+            metrics = dict(timer.as_dict(), fetch_id=f'{id(timer):x}-{timer.started:.3f}', shared_by=len(segments),
+                           engine='Compiler', strategy=OUTPUT_COMPILE)
+            for start, end in segments:
+                telemetry.record(url, thread.args[4], start, end, metrics, error is None, error)
+        summary = telemetry.summary_text()
+        logging.getLogger('telemetry').info('%s (details in %s)', summary, telemetry.path)
+        self.statusBar().showMessage(summary)
+
+    def compile_finished(self, output):
+        self.download_btn.setEnabled(True)
+        self.download_all_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        if not output:
+            self.status_label.setText('Compilation cancelled')
+            return
+        self.record_compile()
+        self.progress_bar.setValue(100)
+        self.status_label.setText(f'Compiled into {os.path.basename(output)}')
+        self.segment_progress_list.addItem(output)
+        self.clear_finished_segments()
+
+    def compile_finished_with_error(self, error):
+        self.download_btn.setEnabled(True)
+        self.download_all_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.record_compile(error)
+        self.status_label.setText('Error: compilation failed')
+        QMessageBox.critical(self, 'Compilation Error', error)
+
+    def offer_resume(self):
+        segments = self.job_queue.unfinished()
+        if not segments:
+            return
+        answer = QMessageBox.question(self, 'Resume downloads',
+                                      f'{len(segments)} segment downloads were left unfinished last time. Resume them?')
+        if answer == QMessageBox.Yes:
+            self.status_label.setText('Resuming unfinished downloads...')
+            self.run_queued(segments)
+        else:
+            self.job_queue.discard_unfinished()
+
+    def cancel_download(self):
+        if self.compile_thread is not None and self.compile_thread.isRunning():
+            self.status_label.setText('Cancelling...')
+            self.cancel_btn.setEnabled(False)
+            self.compile_thread.cancel()
+        if self.download_thread is not None and self.download_thread.isRunning():
+            self.status_label.setText('Cancelling...')
+            self.cancel_btn.setEnabled(False)
+            self.download_thread.cancel()
+
+    def segment_progress_text(self, segment, status):
+        text = f"{format_timestamp(segment.start)} - {format_timestamp(segment.end)}: {status}"
+        if len(self.session) > 1:
+            text = f"{segment.title}  {text}"  # Rows of several videos share the list
+        return text
+
+    def set_segment_status(self, idx, status):
+        segment = self.download_thread.segments[idx]
+        if idx in self.segment_snaps:
+            start_shift, end_shift = self.segment_snaps[idx]
+            status += f" (snapped start {start_shift:+.2f}s, end {end_shift:+.2f}s)"
+        self.segment_progress_list.item(idx).setText(self.segment_progress_text(segment, status))
+
+    def segment_snapped(self, idx, start_shift, end_shift):
+        if start_shift or end_shift:
+            self.segment_snaps[idx] = (start_shift, end_shift)
+
+    def update_segment_progress(self, idx, percent):
+        self.segment_percents[idx] = percent
+        self.set_segment_status(idx, f"{percent:.1f}%")
+        self.progress_bar.setValue(int(sum(self.segment_percents) / len(self.segment_percents)))
+
+    def download_finished(self, results):
+        self.download_btn.setEnabled(True)
+        self.download_all_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        failed = [r for r in results if not r.ok and not r.cancelled]
+        cancelled = [r for r in results if r.cancelled]
+        for r in cancelled:
+            self.set_segment_status(r.index, 'cancelled')
+        self.measure_throughput(results)
+        self.cache_stats_label.setText(self.cache_stats_text())
+        summary = self.download_thread.telemetry.summary_text()
+        logging.getLogger('telemetry').info('%s (details in %s)', summary, self.download_thread.telemetry.path)
+        self.statusBar().showMessage(summary)
+        if failed:
+            self.status_label.setText(f'Error: {len(failed)} of {len(results)} segments failed')
+            QMessageBox.critical(self, 'Download Error', '\n\n'.join(
+                f"{format_timestamp(r.start)} - {format_timestamp(r.end)}:\n{r.error}" for r in failed))
+        elif cancelled:
+            self.status_label.setText('Download cancelled')
+        else:
+            self.progress_bar.setValue(100)
             self.status_label.setText('Download completed')
-            # Clear segments after successful download
-            self.time_segments.clear()
-            self.segments_list.clear()
-        except Exception as e:
-            self.status_label.setText(f'Error: {str(e)}')
-            QMessageBox.critical(self, 'Download Error', str(e))
-        finally:
-            self.download_btn.setEnabled(True)
+            self.clear_finished_segments()
+
+    def clear_finished_segments(self):
+        # Clear segments after successful download
+        for video in self.clear_on_success:
+            video.segments.clear()
+        self.refresh_segments_list()
+
+    def measure_throughput(self, results):
+        # Bytes fetched over wall time; feeds the size/time estimates of the next download.
+        # Telemetry counts network bytes only, so clips served from the clip cache don't inflate it.
+        total = self.download_thread.telemetry.summary()['total_bytes']
+        elapsed = time.monotonic() - self.download_started_at
+        if total and elapsed > 1:
+            self.throughput = total / elapsed
+            self.refresh_format_estimates()
 
     def format_time(self, seconds):
         if seconds is None:
             return 'not set'
         return f"{seconds:.1f}s"  # Simple seconds display for segments
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            startup_mark('first_paint')
+
+    def closeEvent(self, event):
+        # Don't leave yt-dlp children running after the window goes away
+        if self.download_thread is not None and self.download_thread.isRunning():
+            self.download_thread.cancel()
+            self.download_thread.wait()
+        if self.compile_thread is not None and self.compile_thread.isRunning():
+            self.compile_thread.cancel()
+            self.compile_thread.wait()
+        if self.analyze_thread is not None and self.analyze_thread.isRunning():
+            self.analyze_thread.cancel()
+            self.analyze_thread.wait()
+        self.prefetch.shutdown()
+        self.sprite_cache.shutdown()
+        self.filmstrip.close()
+        if self.preview is not None:
+            self.preview.close()
+        super().closeEvent(event)
+
+def startup_mark(stage):
+    # Read by benchmarks/bench_startup.py; absolute times so the parent can measure from its own launch
+    if os.environ.get('YTSECTIONDL_STARTUP_TRACE'):
+        print(f'startup {stage} {time.time():.6f}', file=sys.stderr, flush=True)
+
 def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s')
+    # Lets QtWebEngineWidgets be imported after the application exists, on the first load_video
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
     window = YouTubeDownloader()
     window.show()
+    # Staged startup: everything below runs once the window is on screen
+    preload = PreloadThread(window)
+    preload.finished.connect(lambda: startup_mark('interactive'))
+    if os.environ.get('YTSECTIONDL_STARTUP_TRACE'):
+        preload.finished.connect(app.quit)
+    else:
+        QTimer.singleShot(0, window.offer_resume)
+    QTimer.singleShot(0, preload.start)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
@@ -0,0 +1,142 @@
+import os
+import re
+import threading
+import urllib.request
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+from app_paths import cache_dir
+
+# YouTube storyboards: the sb* formats are sprite sheets (JPEG grids of thumbnails taken at a
+# fixed interval), one fragment per sheet. They make a scrubbing timeline that never touches
+# the player. Sheets are fetched side by side and kept on disk; decoding is up to the GUI.
+
+DEFAULT_MAX_BYTES = 200 * 2**20
+FETCH_WORKERS = 6
+FETCH_TIMEOUT = 20
+MAX_SHEETS = 200  # finer storyboard levels of long videos take too many requests
+
+
+def storyboard_formats(formats):
+    return [f for f in formats if str(f.get('format_id', '')).startswith('sb') and f.get('fragments')
+            and f.get('columns') and f.get('rows')]
+
+
+def pick_storyboard(formats):
+    """The sharpest storyboard format with at most MAX_SHEETS sheets (else the one with the fewest), or None."""
+    candidates = storyboard_formats(formats)
+    if not candidates:
+        return None
+    few = [f for f in candidates if len(f['fragments']) <= MAX_SHEETS]
+    if few:
+        return max(few, key=lambda f: (f.get('width') or 0) * (f.get('height') or 0))
+    return min(candidates, key=lambda f: len(f['fragments']))
+
+
+class Storyboard:
+    """Sheet URLs, tile layout and timing of one storyboard format."""
+
+    def __init__(self, fmt, duration=None):
+        self.format_id = fmt['format_id']
+        self.columns = int(fmt['columns'])
+        self.rows = int(fmt['rows'])
+        self.headers = fmt.get('http_headers') or {}
+        self.urls = []
+        self.starts = []
+        position = 0.0
+        for fragment in fmt['fragments']:
+            self.urls.append(fragment.get('url') or (fmt.get('fragment_base_url') or '') + fragment.get('path', ''))
+            self.starts.append(position)
+            position += fragment.get('duration') or 0.0
+        self.duration = duration or position
+        per_sheet = self.columns * self.rows
+        if fmt.get('fps'):
+            self.tile_seconds = 1.0 / fmt['fps']
+        else:
+            self.tile_seconds = (self.duration / len(self.urls) if self.urls else 1.0) / per_sheet
+
+    @property
+    def sheet_count(self):
+        return len(self.urls)
+
+    def tile_at(self, seconds):
+        """(sheet, tile index within the sheet) of the thumbnail shown at seconds."""
+        sheet = min(max(bisect_right(self.starts, seconds) - 1, 0), len(self.starts) - 1)
+        index = int((seconds - self.starts[sheet]) / self.tile_seconds)
+        return sheet, min(max(index, 0), self.columns * self.rows - 1)
+
+    def tile_position(self, index):
+        """(column, row) of a tile in its sheet."""
+        return index % self.columns, index // self.columns
+
+    def tile_time(self, sheet, index):
+        return self.starts[sheet] + index * self.tile_seconds
+
+
+class SpriteCache:
+    """Storyboard sheets on disk by video and format; the least recently used go once past max_bytes."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, workers=FETCH_WORKERS):
+        self.directory = directory or cache_dir('storyboards')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='storyboard')
+        self._lock = threading.Lock()
+
+    def path(self, video_id, storyboard, sheet):
+        name = re.sub(r'[^\w.-]', '_', f'{video_id}-{storyboard.format_id}-{sheet}')
+        return os.path.join(self.directory, name + '.jpg')
+
+    def fetch(self, video_id, storyboard, on_sheet, cancel_event=None, first_sheet=0):
+        """Call on_sheet(sheet, path) for every sheet, from pool threads, as each is on disk.
+
+        Sheets already cached are reported without a request; the rest are fetched side by
+        side starting from first_sheet. Failed sheets are skipped.
+        """
+        self._evict()
+        order = list(range(first_sheet, storyboard.sheet_count)) + list(range(first_sheet))
+        for sheet in order:
+            self._pool.submit(self._fetch_sheet, video_id, storyboard, sheet, on_sheet, cancel_event)
+
+    def _fetch_sheet(self, video_id, storyboard, sheet, on_sheet, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        path = self.path(video_id, storyboard, sheet)
+        if os.path.exists(path):
+            os.utime(path)  # mtime doubles as last-used time for LRU
+        else:
+            request = urllib.request.Request(storyboard.urls[sheet], headers=storyboard.headers)
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            try:
+                with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response, open(tmp, 'wb') as f:
+                    f.write(response.read())
+                os.replace(tmp, path)
+            except OSError:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return
+        if cancel_event is None or not cancel_event.is_set():
+            on_sheet(sheet, path)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
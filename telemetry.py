@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from app_paths import data_dir
+
+# Per-segment performance records, appended as JSON lines, plus an end-of-run summary.
+# Everything here is a few monotonic() reads and additions per progress update, so it stays on.
+
+PEAK_WINDOW = 0.5  # seconds of transfer a peak throughput sample spans
+PHASES = ('extract', 'first_byte', 'transfer', 'postprocess')
+
+
+class FetchTimer:
+    """Timing and transfer counters of one yt-dlp fetch, fed from its progress output."""
+
+    def __init__(self, queued_at=None):
+        self.started = time.monotonic()
+        self.queued = self.started - queued_at if queued_at is not None else 0.0  # waiting for a download slot
+        self.first_byte_at = None
+        self.postprocess_at = None
+        self.ended = None
+        self.bytes = 0
+        self.peak_bps = 0.0
+        self.retries = 0
+        self._finished_streams = 0  # bytes of the earlier streams of a video+audio fetch
+        self._stream_bytes = 0
+        self._sample = (self.started, 0)
+
+    def on_bytes(self, downloaded):
+        """downloaded is the running byte count of the stream being fetched."""
+        now = time.monotonic()
+        if downloaded < self._stream_bytes:
+            self._finished_streams += self._stream_bytes  # The next stream (e.g. audio after video) started
+        self._stream_bytes = downloaded
+        self.bytes = self._finished_streams + downloaded
+        if self.first_byte_at is None and downloaded > 0:
+            self.first_byte_at = now
+            self._sample = (now, self.bytes)
+        sample_at, sample_bytes = self._sample
+        if now - sample_at >= PEAK_WINDOW:
+            self.peak_bps = max(self.peak_bps, (self.bytes - sample_bytes) / (now - sample_at))
+            self._sample = (now, self.bytes)
+
+    def on_retry(self):
+        self.retries += 1
+
+    def on_postprocess(self):
+        if self.postprocess_at is None:
+            self.postprocess_at = time.monotonic()
+
+    def finish(self, path=None):
+        self.ended = time.monotonic()
+        if path and os.path.exists(path):
+            # Progress lines can miss the last chunk or a second stream; the file does not
+            self.bytes = max(self.bytes, os.path.getsize(path))
+
+    def as_dict(self):
+        ended = self.ended or time.monotonic()
+        first_byte = (self.first_byte_at or ended) - self.started
+        transfer_end = self.postprocess_at or ended
+        transfer = max(transfer_end - (self.first_byte_at or self.started), 0.0)
+        return {
+            'first_byte_s': round(first_byte, 3),
+            'transfer_s': round(transfer, 3),
+            'bytes': self.bytes,
+            'avg_bps': round(self.bytes / transfer, 1) if transfer > 0 else None,
+            'peak_bps': round(self.peak_bps, 1) or None,
+            'fragment_retries': self.retries,
+            'postprocess_s': round(ended - self.postprocess_at, 3) if self.postprocess_at else 0.0,
+        }
+
+
+class Telemetry:
+    """Collects the segment records of one download run and appends them to a JSONL file.
+
+    Segments cut from a shared (merged or full) fetch carry that fetch's numbers with
+    shared_by > 1; the summary counts each fetch once.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), 'metrics.jsonl')
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.monotonic()
+        self._extract = {}  # url -> seconds spent extracting (0 for cache hits)
+        self._records = []
+        self._lock = threading.Lock()
+
+    def extraction(self, url, seconds):
+        with self._lock:
+            self._extract[url] = seconds
+
+    def record(self, url, title, start, end, metrics, ok, error=None, attempt=1):
+        metrics = dict(metrics or {})
+        record = {
+            'run': self.run_id,
+            'time': round(time.time(), 3),
+            'url': url,
+            'title': title,
+            'start': start,
+            'end': end,
+            'attempt': attempt,
+            'ok': ok,
+            'error': error.splitlines()[-1] if error else None,
+            'extract_s': round(metrics.pop('extract_s', None) or self._extract.get(url, 0.0), 3),
+        }
+        record.update(metrics)
+        line = json.dumps(record)
+        with self._lock:
+            self._records.append(record)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError:
+                pass  # Metrics must never break a download
+
+    def summary(self):
+        with self._lock:
+            records = list(self._records)
+            extract = dict(self._extract)
+        wall = time.monotonic() - self.started
+        phases = dict.fromkeys(PHASES, 0.0)
+        phases['extract'] = sum(extract.values()) or sum({r['url']: r['extract_s'] for r in records}.values())
+        total_bytes = retries = 0
+        seen_fetches = set()
+        for r in records:
+            fetch = r.get('fetch_id') or id(r)
+            if fetch not in seen_fetches:
+                seen_fetches.add(fetch)
+                total_bytes += r.get('bytes') or 0
+                phases['first_byte'] += r.get('first_byte_s') or 0.0
+                phases['transfer'] += r.get('transfer_s') or 0.0
+                phases['postprocess'] += r.get('postprocess_s') or 0.0
+                retries += r.get('fragment_retries') or 0
+            phases['postprocess'] += r.get('cut_s') or 0.0
+        return {
+            'run': self.run_id,
+            'segments': len(records),
+            'failed': sum(1 for r in records if not r['ok']),
+            'total_bytes': total_bytes,
+            'wall_s': round(wall, 3),
+            'effective_MBps': round(total_bytes / wall / 1e6, 3) if wall > 0 else None,
+            'phases_s': {name: round(seconds, 3) for name, seconds in phases.items()},
+            'slowest_phase': max(phases, key=phases.get) if records else None,
+            'fragment_retries': retries,
+        }
+
+    def summary_text(self):
+        s = self.summary()
+        if not s['segments']:
+            return 'No segments downloaded'
+        phase = s['slowest_phase']
+        return (f"{s['total_bytes'] / 1e6:.1f} MB in {s['wall_s']:.1f}s ({s['effective_MBps']:.2f} MB/s), "
+                f"slowest phase: {phase} ({s['phases_s'][phase]:.1f}s), {s['fragment_retries']} retries")
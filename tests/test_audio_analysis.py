@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+import audio_analysis
+from audio_analysis import AudioAnalysis, AudioAnalyzer
+
+
+def levels(*runs):
+    """Window levels from (dBFS, window count) runs."""
+    return [db for db, count in runs for _ in range(count)]
+
+
+class SilencesTest(unittest.TestCase):
+    def test_finds_quiet_stretches_long_enough(self):
+        # 0.05 s windows: 1 s loud, 0.5 s quiet, 1 s loud, 0.1 s quiet, 1 s loud
+        analysis = AudioAnalysis(levels((-20, 20), (-60, 10), (-20, 20), (-60, 2), (-20, 20)))
+        self.assertEqual(analysis.silences(-40, 0.3), [(1.0, 1.5)])
+        self.assertEqual(len(analysis.silences(-40, 0.1)), 2)
+
+    def test_silence_at_both_ends(self):
+        analysis = AudioAnalysis(levels((-80, 10), (-20, 20), (-80, 10)))
+        self.assertEqual(analysis.silences(), [(0.0, 0.5), (1.5, 2.0)])
+
+    def test_all_loud(self):
+        self.assertEqual(AudioAnalysis(levels((-10, 100))).silences(), [])
+
+
+class SnapTest(unittest.TestCase):
+    def setUp(self):
+        # Pauses at 2.0-2.5 s and 10.0-11.0 s
+        self.analysis = AudioAnalysis(levels((-20, 40), (-60, 10), (-20, 150), (-60, 20), (-20, 40)))
+
+    def test_snaps_to_the_middle_of_the_nearest_pause(self):
+        self.assertAlmostEqual(self.analysis.snap(3.0), 2.25)
+        self.assertAlmostEqual(self.analysis.snap(9.0), 10.5)
+        self.assertAlmostEqual(self.analysis.snap(10.2), 10.5)
+
+    def test_nothing_within_reach(self):
+        self.assertIsNone(self.analysis.snap(6.0, max_distance=2.0))
+        self.assertIsNone(AudioAnalysis(levels((-20, 100))).snap(1.0))
+
+
+class SuggestSegmentsTest(unittest.TestCase):
+    def test_bridges_short_dips_and_pads(self):
+        # 3 s loud, 0.5 s dip, 2 s loud, 3 s quiet, 4 s loud
+        analysis = AudioAnalysis(levels((-20, 60), (-50, 10), (-20, 40), (-50, 60), (-20, 80)))
+        self.assertEqual(analysis.suggest_segments(-30, min_duration=2.0, gap=1.5, padding=0.25),
+                         [(0.0, 5.75), (8.25, 12.5)])
+
+    def test_drops_short_bursts(self):
+        analysis = AudioAnalysis(levels((-50, 40), (-20, 10), (-50, 40), (-20, 60), (-50, 20)))
+        self.assertEqual(analysis.suggest_segments(-30, min_duration=2.0, padding=0.0), [(4.5, 7.5)])
+
+    def test_silent_track(self):
+        self.assertEqual(AudioAnalysis(levels((-90, 50))).suggest_segments(), [])
+
+
+class AnalyzerCancelTest(unittest.TestCase):
+    def test_cancel_before_start_is_kept(self):
+        analyzer = AudioAnalyzer()
+        analyzer.cancel()
+        with mock.patch.object(audio_analysis, 'resolve_streams') as resolve_streams, \
+                mock.patch.object(audio_analysis.subprocess, 'Popen') as popen:
+            self.assertIsNone(analyzer.run('https://www.youtube.com/watch?v=aaaaaaaaaaa'))
+            resolve_streams.assert_not_called()
+            popen.return_value.stdout.read.return_value = b''
+            popen.return_value.poll.return_value = 0
+            self.assertIsNone(analyzer.analyze('file.mp4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import time
+import unittest
+
+from bandwidth import BandwidthScheduler, is_throttle_error
+
+
+class FakeTimer:
+    def __init__(self, rate, size):
+        self.rate = rate
+        self.size = size
+        self.first_byte_at = None
+        self.bytes = size
+
+    def as_dict(self):
+        return {'avg_bps': self.rate, 'bytes': self.size}
+
+
+class BandwidthSchedulerTest(unittest.TestCase):
+    def fetch(self, scheduler, rate=1e6, size=1024, error=None):
+        lease = scheduler.acquire(10.0)
+        lease.timer = FakeTimer(rate, size)
+        scheduler.release(lease, error)
+
+    def test_starts_at_the_configured_concurrency(self):
+        scheduler = BandwidthScheduler(4)
+        leases = [scheduler.acquire(10.0) for _ in range(4)]
+        self.assertEqual(len(leases), 4)
+        self.assertEqual(scheduler.window, 4)
+
+    def test_throttling_halves_the_window_and_pauses(self):
+        scheduler = BandwidthScheduler(4)
+        self.fetch(scheduler, error='HTTP Error 429: Too Many Requests')
+        self.assertEqual(scheduler.window, 2)
+        self.assertGreater(scheduler.backoff_until, time.monotonic())
+
+    def test_small_fetches_grow_the_window_back(self):
+        scheduler = BandwidthScheduler(4)
+        self.fetch(scheduler, error='HTTP Error 403: Forbidden')
+        scheduler.backoff_until = 0.0
+        for _ in range(2):
+            self.fetch(scheduler, size=1024)  # short clips, no rate sample
+        self.assertEqual(scheduler.window, 3)
+        for _ in range(3):
+            self.fetch(scheduler, size=1024)
+        self.assertEqual(scheduler.window, 4)
+        self.fetch(scheduler, size=1024)
+        self.assertEqual(scheduler.window, 4)
+
+    def test_contention_gives_a_slot_back(self):
+        scheduler = BandwidthScheduler(3)
+        self.fetch(scheduler, rate=3e6, size=10 * 2**20)
+        a, b = scheduler.acquire(10.0), scheduler.acquire(10.0)
+        # Two fetches side by side got 1 MB/s each: less in total than one alone
+        for lease in (a, b):
+            lease.timer = FakeTimer(1e6, 10 * 2**20)
+            scheduler.release(lease)
+        self.assertLess(scheduler.window, 3)
+
+    def test_failed_fetch_is_not_a_success(self):
+        scheduler = BandwidthScheduler(2)
+        scheduler.window = 1
+        self.fetch(scheduler, error='ERROR: fragment 1 not found')
+        self.assertEqual(scheduler.window, 1)
+
+    def test_budget_split_between_running_fetches(self):
+        scheduler = BandwidthScheduler(4, rate_limit=4e6)
+        first = scheduler.acquire(10.0)
+        self.assertEqual(first.rate_limit, 4000000)
+        second = scheduler.acquire(10.0)
+        self.assertEqual((first.rate_limit, second.rate_limit), (2000000, 2000000))
+        scheduler.release(second)
+        self.assertEqual(first.rate_limit, 4000000)
+
+
+class ThrottleErrorTest(unittest.TestCase):
+    def test_throttle_errors(self):
+        self.assertTrue(is_throttle_error('HTTP Error 429: Too Many Requests'))
+        self.assertTrue(is_throttle_error('HTTP Error 403: Forbidden'))
+        self.assertFalse(is_throttle_error('HTTP Error 404: Not Found'))
+        self.assertFalse(is_throttle_error(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
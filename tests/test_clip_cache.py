@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import clip_cache
+from clip_cache import HIT_CUT, HIT_EXACT, ClipCache
+from cutter import CUT_FAST, CUT_PRECISE
+
+
+class ClipCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache = ClipCache(os.path.join(self.tmp, 'cache'))
+        self.clip = os.path.join(self.tmp, 'clip.mp4')
+        with open(self.clip, 'wb') as f:
+            f.write(b'x' * 100)
+
+    def serve(self, start, end, cut_mode=CUT_FAST, precise=False):
+        stem = os.path.join(self.tmp, f'out-{start}-{end}')
+        with mock.patch.object(clip_cache, 'probe_keyframes', return_value=[]), \
+                mock.patch.object(clip_cache, 'cut_segment', return_value=(0.0, 0.0)) as cut:
+            served = self.cache.serve('vid', 'best', start, end, stem, cut_mode, precise)
+        return served, cut
+
+    def test_containing_hit_cuts_at_the_clip_real_bounds(self):
+        # A fast cut of 10-20 snapped out to keyframes at 8.5 and 22
+        self.cache.add('vid', 'best', 10.0, 20.0, self.clip, shifts=(-1.5, 2.0))
+        served, cut = self.serve(12.0, 21.0)
+        self.assertEqual(served[1], HIT_CUT)
+        source, start, end = cut.call_args[0][:3]
+        self.assertAlmostEqual(start, 3.5)
+        self.assertAlmostEqual(end, 12.5)
+
+    def test_exact_hit_reports_the_original_snap(self):
+        self.cache.add('vid', 'best', 10.0, 20.0, self.clip, shifts=(-1.5, 2.0))
+        served, cut = self.serve(10.0, 20.0)
+        cut.assert_not_called()
+        self.assertEqual(served[1:], (HIT_EXACT, (-1.5, 2.0)))
+
+    def test_precise_requests_skip_fast_clips(self):
+        self.cache.add('vid', 'best', 10.0, 20.0, self.clip)
+        self.assertIsNone(self.serve(10.0, 20.0, CUT_PRECISE, precise=True)[0])
+        self.assertIsNone(self.serve(12.0, 18.0, CUT_PRECISE, precise=True)[0])
+        self.cache.add('vid', 'best', 10.0, 20.0, self.clip, precise=True)
+        self.assertEqual(self.serve(12.0, 18.0, CUT_PRECISE, precise=True)[0][1], HIT_CUT)
+
+    def test_entries_without_clip_bounds_use_the_requested_range(self):
+        entry = {'video': 'vid', 'format': 'best', 'start': 10.0, 'end': 20.0, 'file': 'a.mp4', 'size': 1,
+                 'precise': False, 'used': 0}
+        self.assertEqual(ClipCache.clip_bounds(entry), (10.0, 20.0))
+
+    def test_uncached_reads_the_index_once(self):
+        self.cache.add('vid', 'best', 10.0, 20.0, self.clip, shifts=(-1.0, 1.0))
+        self.cache.add('other', 'best', 100.0, 200.0, self.clip)
+        ranges = [(10.0, 20.0), (9.5, 20.5), (12.0, 22.0), (100.0, 110.0)] * 50
+        with mock.patch.object(self.cache, '_load', wraps=self.cache._load) as load:
+            uncached = self.cache.uncached('vid', 'best', ranges)
+        load.assert_called_once_with()
+        self.assertEqual(uncached, [(12.0, 22.0), (100.0, 110.0)] * 50)
+        self.assertEqual(self.cache.uncached('vid', 'best', [(10.0, 20.0)], precise=True), [(10.0, 20.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+
+import compilation
+from compilation import Compiler, is_copy_incompatible
+
+
+class CopyIncompatibleTest(unittest.TestCase):
+    def test_codec_and_container_mismatch(self):
+        for error in ('[ipod @ 0x1] Could not find tag for codec vorbis in stream #0, codec not currently supported '
+                      'in container\n[out#0/ipod @ 0x2] Could not write header (incorrect codec parameters ?)',
+                      '[webm @ 0x1] Only VP8 or VP9 or AV1 video and Vorbis or Opus audio and WebVTT subtitles '
+                      'are supported for WebM.'):
+            self.assertTrue(is_copy_incompatible(error), error)
+
+    def test_other_failures_are_not_retried_with_encoding(self):
+        for error in ('[https @ 0x1] HTTP error 403 Forbidden\nError opening input files: Server returned 403 Forbidden',
+                      '[tcp @ 0x1] Connection to tcp://127.0.0.1:9 failed: Connection refused',
+                      'stream0.ffconcat: No such file or directory', None, ''):
+            self.assertFalse(is_copy_incompatible(error), error)
+
+
+class CompilerCancelTest(unittest.TestCase):
+    def test_cancel_before_run_is_kept(self):
+        compiler = Compiler()
+        compiler.cancel()
+        with mock.patch.object(compilation, 'resolve_streams') as resolve_streams:
+            self.assertIsNone(compiler.run('https://www.youtube.com/watch?v=aaaaaaaaaaa', [(0.0, 5.0)], 'best', '.',
+                                           'title'))
+        resolve_streams.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import cutter
+from cutter import CUT_PRECISE, cut_segment, edge_encoder, probe_duration
+from keyframes import probe_keyframes
+
+HAVE_FFMPEG = bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+
+def has_encoder(name):
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True)
+    return f' {name} ' in result.stdout
+
+
+def decoded_frames(path):
+    """Video frames ffmpeg decodes from path; fails the test on any decoding error."""
+    result = subprocess.run(['ffmpeg', '-v', 'warning', '-i', path, '-map', '0:v', '-f', 'framecrc', '-'],
+                            capture_output=True, text=True)
+    if result.returncode != 0 or result.stderr.strip():
+        raise AssertionError(f'{path} does not decode: {result.stderr.strip()}')
+    return sum(1 for line in result.stdout.splitlines() if line and not line.startswith('#'))
+
+
+class EdgeEncoderTest(unittest.TestCase):
+    def test_matches_source_profile_and_level(self):
+        args = edge_encoder({'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'profile': 'High', 'level': 40})
+        self.assertEqual(args[args.index('-profile:v') + 1], 'high')
+        self.assertEqual(args[args.index('-level') + 1], '4.0')
+        self.assertEqual(args[args.index('-pix_fmt') + 1], 'yuv420p')
+
+    def test_unknown_profile_left_to_encoder(self):
+        self.assertNotIn('-profile:v', edge_encoder({'codec_name': 'vp9', 'pix_fmt': 'yuv420p', 'profile': 'Profile 0'}))
+
+
+class SmartCutFallbackTest(unittest.TestCase):
+    STREAM = {'codec_name': 'h264', 'pix_fmt': 'yuv420p', 'profile': 'Main', 'level': 31}
+
+    def test_mismatched_head_skips_the_middle_and_keeps_the_encoder(self):
+        with mock.patch.object(cutter, 'probe_video_stream', return_value=self.STREAM), \
+                mock.patch.object(cutter, 'probe_extradata', side_effect=lambda path: path), \
+                mock.patch.object(cutter, 'run_ffmpeg') as run_ffmpeg:
+            cutter.smart_cut('source.mp4', 1.3, 7.7, 'clip.mp4', [0.0, 2.0, 4.0, 6.0, 8.0])
+        # The head, then straight to the full re-encode
+        self.assertEqual(run_ffmpeg.call_count, 2)
+        args = run_ffmpeg.call_args[0][0]
+        self.assertEqual(args[-1], 'clip.mp4')
+        self.assertEqual(args[args.index('-profile:v') + 1], 'main')
+        self.assertEqual(args[args.index('-c:v') + 1], 'libx264')
+
+
+@unittest.skipUnless(HAVE_FFMPEG, 'needs ffmpeg and ffprobe')
+class SmartCutTest(unittest.TestCase):
+    FPS = 25
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def make_source(self, encoder_args, ext):
+        source = os.path.join(self.tmp, 'source.' + ext)
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+                        f'testsrc=duration=10:size=320x240:rate={self.FPS}', '-pix_fmt', 'yuv420p', '-g', str(self.FPS)]
+                       + encoder_args + [source], check=True)
+        return source
+
+    def check_precise_cut(self, source, ext):
+        output = os.path.join(self.tmp, 'clip.' + ext)
+        shifts = cut_segment(source, 1.32, 7.72, output, CUT_PRECISE, probe_keyframes(source))
+        self.assertEqual(shifts, (0.0, 0.0))
+        # Every frame of the joined clip decodes, and exactly the requested frames are there
+        self.assertEqual(decoded_frames(output), round((7.72 - 1.32) * self.FPS))
+        self.assertAlmostEqual(probe_duration(output), 6.4, delta=0.1)
+
+    def test_h264(self):
+        if not has_encoder('libx264'):
+            self.skipTest('needs libx264')
+        # CAVLC in the source, CABAC in the edge encoder: parameter sets that can't share one track
+        source = self.make_source(['-c:v', 'libx264', '-profile:v', 'main', '-x264-params', 'cabac=0'], 'mp4')
+        self.check_precise_cut(source, 'mp4')
+        # The full re-encode this falls back to keeps the source's codec and profile
+        stream = cutter.probe_video_stream(os.path.join(self.tmp, 'clip.mp4'))
+        self.assertEqual((stream['codec_name'], stream['profile']), ('h264', 'Main'))
+
+    def test_vp9(self):
+        if not has_encoder('libvpx-vp9'):
+            self.skipTest('needs libvpx-vp9')
+        self.check_precise_cut(self.make_source(['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8'],
+                                                'webm'), 'webm')
+
+
+if __name__ == '__main__':
+    unittest.main()
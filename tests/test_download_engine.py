@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import download_engine
+from download_engine import DownloadEngine, segment_output_stem
+from keyframes import KeyframeCache
+
+
+class OutputNameTest(unittest.TestCase):
+    def test_stem_is_a_valid_windows_file_name(self):
+        stem = segment_output_stem('a: b?', 3725.0, 3730.25)
+        self.assertEqual(stem, 'a_ b_-01-02-05.000-01-02-10.250')
+        self.assertFalse(set(stem) & set('<>:"/\\|?*'))
+
+    def test_sub_second_bounds_get_their_own_file(self):
+        self.assertNotEqual(segment_output_stem('t', 10.2, 20.7), segment_output_stem('t', 10.9, 20.1))
+        self.assertEqual(segment_output_stem('t', 10.0004, 20.9996), 't-00-00-10.000-00-00-21.000')
+
+
+class EngineOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.keyframes = KeyframeCache(os.path.join(self.tmp, 'keyframes'))
+
+    def test_result_carries_the_written_file(self):
+        engine = DownloadEngine(keyframe_cache=self.keyframes)
+
+        def fetch(indices, start, end, output, *args):
+            with open(output.replace('%(ext)s', 'mp4'), 'wb') as f:
+                f.write(b'x')
+
+        with mock.patch.object(engine, '_fetch', side_effect=fetch):
+            result, = engine.run('https://www.youtube.com/watch?v=aaaaaaaaaaa', [(10.0, 20.0)], 'best',
+                                 self.tmp, 'title')
+        self.assertTrue(result.ok)
+        self.assertEqual(result.output, os.path.join(self.tmp, segment_output_stem('title', 10.0, 20.0) + '.mp4'))
+
+    def test_reported_path_wins_over_the_template(self):
+        engine = DownloadEngine(keyframe_cache=self.keyframes)
+        moved = os.path.join(self.tmp, 'renamed by yt-dlp.mkv')
+
+        def fetch(indices, start, end, output, *args):
+            with open(moved, 'wb') as f:
+                f.write(b'x')
+            engine._reported[output] = moved
+
+        with mock.patch.object(engine, '_fetch', side_effect=fetch):
+            result, = engine.run('https://www.youtube.com/watch?v=aaaaaaaaaaa', [(10.0, 20.0)], 'best',
+                                 self.tmp, 'title')
+        self.assertEqual(result.output, moved)
+
+    def test_local_cuts_use_the_safe_stem(self):
+        engine = DownloadEngine(keyframe_cache=self.keyframes)
+
+        def fetch(indices, start, end, output, *args):
+            with open(output.replace('%(ext)s', 'mp4'), 'wb') as f:
+                f.write(b'x')
+
+        with mock.patch.object(engine, '_fetch', side_effect=fetch), \
+                mock.patch('download_engine.cut_segment', return_value=(0.0, 0.0)) as cut, \
+                mock.patch.object(engine.keyframe_cache, 'keyframes_for', return_value=[]):
+            results = engine.run('https://www.youtube.com/watch?v=aaaaaaaaaaa', [(10.0, 20.0), (15.0, 30.0)],
+                                 'best', self.tmp, 'title')
+        outputs = sorted(call.args[3] for call in cut.call_args_list)
+        self.assertEqual(outputs, [os.path.join(self.tmp, 'title-00-00-10.000-00-00-20.000.mp4'),
+                                   os.path.join(self.tmp, 'title-00-00-15.000-00-00-30.000.mp4')])
+        self.assertEqual(sorted(result.output for result in results), outputs)
+
+
+class SingleSectionSnapTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.keyframes = KeyframeCache(os.path.join(self.tmp, 'keyframes'))
+        self.fetched = []
+        self.snaps = []
+        self.engine = DownloadEngine(keyframe_cache=self.keyframes,
+                                     on_segment_snapped=lambda *args: self.snaps.append(args))
+
+    def run_engine(self, duration=10.0):
+        def fetch(indices, start, end, output, *args):
+            self.fetched.append((start, end))
+            with open(output.replace('%(ext)s', 'mp4'), 'wb') as f:
+                f.write(b'x')
+
+        with mock.patch.object(self.engine, '_fetch', side_effect=fetch), \
+                mock.patch.object(download_engine, 'probe_duration', return_value=duration):
+            result, = self.engine.run('https://www.youtube.com/watch?v=aaaaaaaaaaa', [(10.0, 20.0)], 'best',
+                                      self.tmp, 'title', info={'id': 'aaaaaaaaaaa'})
+        return result
+
+    def test_known_keyframes_widen_the_section(self):
+        with mock.patch('keyframes.probe_keyframes', return_value=[0.0, 8.0, 16.0, 24.0]):
+            self.keyframes.keyframes_for('aaaaaaaaaaa', 'best', 'full.mp4', 0.0, (0.0, 60.0))
+        self.assertTrue(self.run_engine().ok)
+        self.assertEqual(self.fetched, [(8.0, 24.0)])
+        self.assertEqual(self.snaps, [(0, -2.0, 4.0)])
+
+    def test_unknown_keyframes_measure_the_clip(self):
+        self.assertTrue(self.run_engine(duration=11.5).ok)
+        self.assertEqual(self.fetched, [(10.0, 20.0)])
+        self.assertEqual(self.snaps, [(0, -1.5, 0.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from format_index import build_format_index, parse_constraints, pick_format
+
+
+def video(format_id, height, vcodec, ext='mp4', fps=30, tbr=1000, acodec='none', **extra):
+    return dict(format_id=format_id, height=height, vcodec=vcodec, acodec=acodec, ext=ext, fps=fps, tbr=tbr,
+                url=f'https://example.invalid/{format_id}', **extra)
+
+
+def audio(format_id, acodec, ext, abr, **extra):
+    return dict(format_id=format_id, vcodec='none', acodec=acodec, ext=ext, abr=abr, tbr=abr,
+                url=f'https://example.invalid/{format_id}', **extra)
+
+
+FORMATS = [
+    audio('140', 'mp4a.40.2', 'm4a', 128),
+    audio('251', 'opus', 'webm', 160),
+    video('137', 1080, 'avc1.640028', tbr=4000),
+    video('248', 1080, 'vp9', ext='webm', tbr=3000),
+    video('399', 1080, 'av01.0.08M.08', tbr=2500),
+    video('136', 720, 'avc1.4d401f', tbr=2000),
+    video('299', 1080, 'avc1.64002a', fps=60, tbr=6000),
+    video('18', 360, 'avc1.42001E', tbr=500, acodec='mp4a.40.2'),
+    dict(format_id='sb0', ext='mhtml', vcodec='none', acodec='none', protocol='mhtml', url='https://example.invalid/sb'),
+]
+
+
+class BuildFormatIndexTest(unittest.TestCase):
+    def test_ranks_height_then_fps_then_h264(self):
+        index = build_format_index(FORMATS)
+        self.assertEqual([e.format_str.split('+')[0] for e in index], ['299', '137', '248', '399', '136', '18'])
+
+    def test_pairs_audio_in_the_same_container(self):
+        entries = {e.video['format_id']: e for e in build_format_index(FORMATS)}
+        self.assertEqual((entries['137'].format_str, entries['137'].container), ('137+140', 'mp4'))
+        self.assertEqual((entries['248'].format_str, entries['248'].container), ('248+251', 'webm'))
+        # A progressive format keeps its own audio
+        self.assertEqual(entries['18'].format_str, '18')
+
+    def test_falls_back_to_best_audio_in_mkv(self):
+        entry, = build_format_index([video('399', 1080, 'av01.0.08M.08'), audio('251', 'opus', 'webm', 160)])
+        self.assertEqual((entry.format_str, entry.container), ('399+251', 'mkv'))
+
+    def test_drops_duplicates_and_unusable(self):
+        formats = FORMATS + [video('137-dash', 1080, 'avc1.640028', tbr=4100),
+                             video('137-drm', 1080, 'avc1.640028', tbr=8000, has_drm=True),
+                             dict(video('nourl', 480, 'avc1'), url=None)]
+        ids = [e.video['format_id'] for e in build_format_index(formats)]
+        self.assertEqual(ids.count('137') + ids.count('137-dash'), 1)
+        self.assertNotIn('137-drm', ids)
+        self.assertNotIn('nourl', ids)
+        self.assertNotIn('sb0', ids)
+
+    def test_audio_only(self):
+        self.assertEqual([e.format_str for e in build_format_index(FORMATS, 'audio')], ['251', '140'])
+
+
+class ParseConstraintsTest(unittest.TestCase):
+    def test_terms(self):
+        c = parse_constraints('<=1080p, >=720p 30fps,vp9 webm smallest')
+        self.assertEqual((c.max_height, c.min_height, c.max_fps), (1080, 720, 30))
+        self.assertEqual((c.codecs, c.containers, c.prefer), ({'vp9'}, {'webm'}, 'smallest'))
+
+    def test_operators(self):
+        self.assertEqual(parse_constraints('<1080p').max_height, 1079)
+        self.assertEqual(parse_constraints('>720p').min_height, 721)
+        self.assertEqual(parse_constraints('1080p').max_height, 1080)
+        c = parse_constraints('=720p')
+        self.assertEqual((c.min_height, c.max_height), (720, 720))
+        self.assertEqual(parse_constraints('≤480p').max_height, 480)
+
+    def test_aliases(self):
+        c = parse_constraints('AVC fast')
+        self.assertEqual((c.codecs, c.prefer), ({'h264'}, 'fastest'))
+        self.assertEqual(parse_constraints('').prefer, 'quality')
+
+    def test_unknown_term(self):
+        with self.assertRaises(ValueError):
+            parse_constraints('<=1080p, 4k')
+
+
+class PickFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.index = build_format_index(FORMATS)
+
+    def pick(self, text, **kwargs):
+        entry = pick_format(self.index, parse_constraints(text), **kwargs)
+        return entry and entry.format_str
+
+    def test_quality_takes_the_best_allowed(self):
+        self.assertEqual(self.pick('<=1080p'), '299+140')
+        self.assertEqual(self.pick('<=1080p 30fps'), '137+140')
+        self.assertEqual(self.pick('<=720p'), '136+140')
+
+    def test_codec_asked_for(self):
+        self.assertEqual(self.pick('av1'), '399+140')
+        self.assertEqual(self.pick('webm'), '248+251')
+
+    def test_smallest(self):
+        self.assertEqual(self.pick('smallest', segments=[(0, 10)], duration=1000), '18')
+        self.assertEqual(self.pick('>=720p 30fps smallest', segments=[(0, 10)], duration=1000), '136+140')
+
+    def test_nothing_matches(self):
+        self.assertIsNone(self.pick('>=2160p'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import batch
+import job_queue
+from bandwidth import BandwidthScheduler
+from cutter import CUT_FAST, CUT_PRECISE
+from download_engine import SegmentResult, create_engine as real_create_engine
+from job_queue import STATE_CANCELLED, STATE_DONE, JobQueue, QueueRunner, is_transient_error
+from planner import STRATEGY_FULL, STRATEGY_SECTIONS
+
+
+class TransientErrorTest(unittest.TestCase):
+    def test_network_errors_are_retried(self):
+        for error in ('ERROR: unable to download video data: HTTP Error 403: Forbidden',
+                      'HTTP Error 429: Too Many Requests', 'HTTP Error 503: Service Unavailable',
+                      'The read operation timed out', 'Connection reset by peer', 'output failed validation'):
+            self.assertTrue(is_transient_error(error), error)
+
+    def test_permanent_errors_fail_at_once(self):
+        for error in ('ERROR: [youtube] xyz: Unable to download webpage: HTTP Error 404: Not Found',
+                      'ERROR: [youtube] xyz: Private video. Sign in if you\'ve been granted access to this video',
+                      'ERROR: [youtube] xyz: Video unavailable. This video has been removed by the uploader',
+                      'ERROR: fragment 1 not found, unable to continue', None, ''):
+            self.assertFalse(is_transient_error(error), error)
+
+
+class QueueRunnerCancelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.queue = JobQueue(os.path.join(self.tmp, 'jobs.sqlite3'))
+        self.addCleanup(self.queue.close)
+        self.segments = self.queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'title',
+                                           [(10.0, 20.0), (30.0, 40.0)], 'best', self.tmp)
+
+    def test_cancel_during_extraction_starts_no_download(self):
+        runner = QueueRunner(self.queue)
+
+        def extract(*args):
+            runner.cancel()
+            return {'id': 'aaaaaaaaaaa'}
+
+        with mock.patch.object(job_queue, 'fetch_video_info', side_effect=extract), \
+                mock.patch.object(job_queue, 'create_engine') as create_engine:
+            results = runner.run(self.segments)
+        create_engine.assert_not_called()
+        self.assertTrue(all(result.cancelled for result in results))
+        self.assertEqual({segment.state for segment in self.segments}, {STATE_CANCELLED})
+
+    def test_engine_shares_the_cancel_event(self):
+        runner = QueueRunner(self.queue)
+        engines = []
+
+        def create_engine(name, **kwargs):
+            engine = real_create_engine(name, **kwargs)
+            engines.append(engine)
+            runner.cancel()  # Lands after the engine exists but before it runs
+            return engine
+
+        with mock.patch.object(job_queue, 'fetch_video_info', return_value={'id': 'aaaaaaaaaaa'}), \
+                mock.patch.object(job_queue, 'create_engine', side_effect=create_engine), \
+                mock.patch('download_engine.DownloadEngine._fetch') as fetch:
+            results = runner.run(self.segments)
+        self.assertTrue(engines[0].cancelled)
+        fetch.assert_not_called()
+        self.assertTrue(all(result.cancelled for result in results))
+
+
+class QueueRunnerVideosTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.queue = JobQueue(os.path.join(self.tmp, 'jobs.sqlite3'))
+        self.addCleanup(self.queue.close)
+
+    def test_videos_run_side_by_side_under_a_shared_scheduler(self):
+        segments = []
+        for video_id in ('aaaaaaaaaaa', 'bbbbbbbbbbb'):
+            segments += self.queue.enqueue(f'https://www.youtube.com/watch?v={video_id}', video_id,
+                                           [(10.0, 20.0)], 'best', self.tmp)
+        runner = QueueRunner(self.queue, max_workers=2, scheduler=BandwidthScheduler(2))
+        # Both engines have to be running at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        class Engine:
+            def __init__(self, **kwargs):
+                pass
+
+            def cancel(self):
+                pass
+
+            def run(self, url, ranges, *args):
+                barrier.wait()
+                runner.cancel()
+                return [SegmentResult(i, start, end, False, cancelled=True) for i, (start, end) in enumerate(ranges)]
+
+        with mock.patch.object(job_queue, 'fetch_video_info', return_value={}), \
+                mock.patch.object(job_queue, 'create_engine', side_effect=lambda name, **kwargs: Engine()):
+            results = runner.run(segments)
+        self.assertFalse(barrier.broken)
+        self.assertEqual(len(results), 2)
+
+
+class QueueRunnerOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.queue = JobQueue(os.path.join(self.tmp, 'jobs.sqlite3'))
+        self.addCleanup(self.queue.close)
+
+    def test_records_the_file_the_engine_wrote(self):
+        segments = self.queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'a: b', [(10.0, 20.0)], 'best',
+                                      self.tmp)
+        # Named unlike the template, as yt-dlp does on Windows when it replaces characters
+        written = os.path.join(self.tmp, 'a\uff1a b-00-00-10-00-00-20.mp4')
+        with open(written, 'wb') as f:
+            f.write(b'x')
+
+        class Engine:
+            def run(self, url, ranges, *args):
+                return [SegmentResult(i, start, end, True, output=written) for i, (start, end) in enumerate(ranges)]
+
+        with mock.patch.object(job_queue, 'fetch_video_info', return_value={}), \
+                mock.patch.object(job_queue, 'create_engine', side_effect=lambda name, **kwargs: Engine()), \
+                mock.patch.object(job_queue, 'probe_duration', return_value=10.0):
+            results = QueueRunner(self.queue).run(segments)
+        self.assertTrue(results[0].ok)
+        self.assertEqual((segments[0].state, segments[0].output_path), (STATE_DONE, written))
+
+    def test_same_whole_seconds_are_not_skipped_as_existing(self):
+        first, second = self.queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'title',
+                                           [(10.2, 20.7), (10.9, 20.1)], 'best', self.tmp)
+        with open(os.path.join(self.tmp, 'title-00-00-10.200-00-00-20.700.mp4'), 'wb') as f:
+            f.write(b'x')
+        self.assertIsNotNone(first.existing_output())
+        self.assertIsNone(second.existing_output())
+        fetched = []
+
+        class Engine:
+            def run(self, url, ranges, *args):
+                fetched.extend(ranges)
+                return [SegmentResult(i, start, end, False, error='gone') for i, (start, end) in enumerate(ranges)]
+
+        with mock.patch.object(job_queue, 'fetch_video_info', return_value={}), \
+                mock.patch.object(job_queue, 'create_engine', side_effect=lambda name, **kwargs: Engine()), \
+                mock.patch.object(job_queue, 'probe_duration', side_effect=lambda path: 10.5):
+            results = QueueRunner(self.queue).run([first, second])
+        self.assertTrue(results[0].ok)
+        self.assertEqual(fetched, [(10.9, 20.1)])
+
+
+class QueueRunnerRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.queue = JobQueue(os.path.join(self.tmp, 'jobs.sqlite3'))
+        self.addCleanup(self.queue.close)
+
+    def run_once(self, failing):
+        segments = self.queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'title',
+                                      [(10.0, 20.0), (30.0, 40.0), (50.0, 60.0)], 'best', self.tmp,
+                                      strategy=STRATEGY_FULL)
+        runner = QueueRunner(self.queue)
+        tmp = self.tmp
+
+        class Engine:
+            def cancel(self):
+                pass
+
+            def run(self, url, ranges, *args):
+                results = []
+                for i, (start, end) in enumerate(ranges):
+                    output = os.path.join(tmp, f'{i}.mp4')
+                    with open(output, 'wb') as f:
+                        f.write(b'x')
+                    ok = i not in failing
+                    results.append(SegmentResult(i, start, end, ok, None if ok else 'HTTP Error 503', output=output))
+                runner.cancel()  # Stop before the retries come due; they end up cancelled
+                return results
+
+        with mock.patch.object(job_queue, 'fetch_video_info', return_value={}), \
+                mock.patch.object(job_queue, 'create_engine', side_effect=lambda name, **kwargs: Engine()), \
+                mock.patch.object(job_queue, 'probe_duration', return_value=10.0):
+            runner.run(segments)
+        return [(segment.state, segment.strategy) for segment in segments]
+
+    def test_partial_retry_of_a_full_download_uses_sections(self):
+        self.assertEqual(self.run_once({1}), [(STATE_DONE, STRATEGY_FULL), (STATE_CANCELLED, STRATEGY_SECTIONS),
+                                              (STATE_DONE, STRATEGY_FULL)])
+
+    def test_whole_group_retry_keeps_the_plan(self):
+        self.assertEqual(self.run_once({0, 1, 2}), [(STATE_CANCELLED, STRATEGY_FULL)] * 3)
+
+
+class QueuedCutModeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'jobs.sqlite3')
+
+    def open_queue(self):
+        queue = JobQueue(self.path)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_resume_cuts_segments_the_way_they_were_queued(self):
+        queue = self.open_queue()
+        queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'a', [(10.0, 20.0)], 'best', self.tmp,
+                      cut_mode=CUT_PRECISE)
+        queue.enqueue('https://www.youtube.com/watch?v=bbbbbbbbbbb', 'b', [(10.0, 20.0)], 'best', self.tmp)
+        runner = batch.BatchRunner(1, cache=mock.Mock(), queue=queue, telemetry=mock.Mock())
+        modes = {}
+
+        def run_segments(segments, job, infos=None):
+            modes[segments[0].title] = job['cut_mode']
+            return [], 0
+
+        with mock.patch.object(runner, 'run_segments', side_effect=run_segments):
+            runner.resume(dict(batch.JOB_DEFAULTS))
+            self.assertEqual(modes, {'a': CUT_PRECISE, 'b': CUT_FAST})
+            runner.resume(dict(batch.JOB_DEFAULTS), CUT_FAST)
+            self.assertEqual(modes, {'a': CUT_FAST, 'b': CUT_FAST})
+
+    def test_queue_from_before_cut_modes_is_migrated(self):
+        db = sqlite3.connect(self.path)
+        db.execute(job_queue.SCHEMA.replace('    cut_mode TEXT,\n', ''))
+        db.execute('INSERT INTO segments (video_key, url, title, start, "end", format_str, download_dir, strategy,'
+                   ' state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                   ('aaaaaaaaaaa', 'https://www.youtube.com/watch?v=aaaaaaaaaaa', 'a', 10.0, 20.0, 'best', self.tmp,
+                    STRATEGY_SECTIONS, 'pending', 0.0))
+        db.commit()
+        db.close()
+        queue = self.open_queue()
+        self.assertEqual([segment.cut_mode for segment in queue.unfinished()], [None])
+        segments = queue.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', 'a', [(10.0, 20.0)], 'best',
+                                 self.tmp, cut_mode=CUT_PRECISE)
+        self.assertEqual(segments[0].cut_mode, CUT_PRECISE)
+
+
+if __name__ == '__main__':
+    unittest.main()
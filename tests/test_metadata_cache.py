@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from metadata_cache import InfoCache
+
+
+class InfoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache = InfoCache(os.path.join(self.tmp, 'info'))
+
+    def test_second_fetch_is_served_from_the_cache(self):
+        fetch = mock.Mock(return_value={'id': 'a', 'formats': [{'format_id': 'old'}]})
+        self.cache.get_or_fetch('a:anonymous', fetch)
+        self.assertEqual(self.cache.get_or_fetch('a:anonymous', fetch), {'id': 'a', 'formats': [{'format_id': 'old'}]})
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_force_refreshes_the_entry(self):
+        self.cache.get_or_fetch('a:anonymous', lambda: {'id': 'a', 'formats': [{'format_id': 'old'}]})
+        fresh = {'id': 'a', 'formats': [{'format_id': 'new'}]}
+        self.assertEqual(self.cache.get_or_fetch('a:anonymous', lambda: fresh, force=True), fresh)
+        self.assertEqual(self.cache.get('a:anonymous'), fresh)
+
+    def test_expired_entry_is_fetched_again(self):
+        self.cache.ttl = -1
+        self.cache.get_or_fetch('a:anonymous', lambda: {'id': 'a'})
+        fetch = mock.Mock(return_value={'id': 'a'})
+        self.cache.get_or_fetch('a:anonymous', fetch)
+        fetch.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from planner import (STRATEGY_FULL, STRATEGY_SECTIONS, estimate_selected_formats, estimate_strategies,
+                     plan_download)
+
+# About 1 MB/s of video plus a little audio
+FORMATS = [{'format_id': '137', 'vcodec': 'avc1', 'acodec': 'none', 'height': 1080, 'tbr': 8 * 1024 * 1.024},
+           {'format_id': '140', 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128, 'tbr': 128}]
+
+
+class PlanDownloadTest(unittest.TestCase):
+    def test_few_short_segments_of_a_long_video_are_sections(self):
+        plan = plan_download(FORMATS, [(60, 70), (600, 610)], 3600)
+        self.assertEqual((plan.strategy, plan.reason), (STRATEGY_SECTIONS, 'lowest estimated time'))
+        self.assertLess(plan.estimate.total_bytes, plan.estimates[STRATEGY_FULL].total_bytes)
+
+    def test_segments_covering_most_of_a_short_video_are_full(self):
+        segments = [(i * 10, i * 10 + 8) for i in range(30)]
+        self.assertEqual(plan_download(FORMATS, segments, 300, max_workers=1).strategy, STRATEGY_FULL)
+
+    def test_many_workers_favour_sections(self):
+        segments = [(i * 15, i * 15 + 8) for i in range(12)]
+        self.assertEqual(plan_download(FORMATS, segments, 180, max_workers=1).strategy, STRATEGY_FULL)
+        self.assertEqual(plan_download(FORMATS, segments, 180, max_workers=8).strategy, STRATEGY_SECTIONS)
+
+    def test_manual_choice_is_kept(self):
+        plan = plan_download(FORMATS, [(60, 70)], 3600, strategy=STRATEGY_FULL)
+        self.assertEqual((plan.strategy, plan.reason), (STRATEGY_FULL, 'chosen manually'))
+
+    def test_no_size_information(self):
+        for formats, duration in (([], 3600), (FORMATS, None), ([{'format_id': '18', 'vcodec': 'avc1'}], 3600)):
+            plan = plan_download(formats, [(60, 70)], duration)
+            self.assertEqual((plan.strategy, plan.estimates), (STRATEGY_SECTIONS, {}))
+        self.assertEqual(plan_download([], [(60, 70)], None, strategy=STRATEGY_FULL).strategy, STRATEGY_FULL)
+
+    def test_merged_ranges_count_once(self):
+        apart = estimate_strategies(FORMATS, [(0, 10), (11, 20)], 3600)[STRATEGY_SECTIONS]
+        merged = estimate_strategies(FORMATS, [(0, 10), (11, 20)], 3600, merge_gap=2)[STRATEGY_SECTIONS]
+        self.assertEqual((apart.requests, merged.requests), (4, 2))
+        self.assertLess(merged.seconds, apart.seconds)
+
+
+class EstimateSelectedFormatsTest(unittest.TestCase):
+    def test_best_video_with_best_audio(self):
+        self.assertEqual([f['format_id'] for f in estimate_selected_formats(FORMATS, 'highest', 'video')],
+                         ['137', '140'])
+        self.assertEqual([f['format_id'] for f in estimate_selected_formats(FORMATS, 'highest', 'audio')], ['140'])
+
+    def test_custom(self):
+        self.assertEqual([f['format_id'] for f in estimate_selected_formats(FORMATS, 'custom', 'video', '137')],
+                         ['137', '140'])
+        self.assertEqual([f['format_id'] for f in estimate_selected_formats(FORMATS, 'custom', 'video', '137+140')],
+                         ['137', '140'])
+
+
+if __name__ == '__main__':
+    unittest.main()
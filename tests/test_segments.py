@@ -0,0 +1,59 @@
+import unittest
+
+from segments import SegmentList, coalesce_segments
+
+
+class SegmentListTest(unittest.TestCase):
+    def test_kept_sorted_without_duplicates(self):
+        segments = SegmentList([(30, 40), (10, 20), (10, 15)])
+        self.assertEqual(list(segments), [(10.0, 15.0), (10.0, 20.0), (30.0, 40.0)])
+        self.assertFalse(segments.add(10, 20))
+        self.assertEqual(len(segments), 3)
+
+    def test_rejects_empty_segment(self):
+        with self.assertRaises(ValueError):
+            SegmentList().add(5, 5)
+
+    def test_remove(self):
+        segments = SegmentList([(0, 100), (10, 20)])
+        segments.remove(0, 100)
+        self.assertEqual(list(segments), [(10.0, 20.0)])
+        with self.assertRaises(ValueError):
+            segments.remove(0, 100)
+
+    def test_overlapping(self):
+        segments = SegmentList([(0, 5), (10, 20), (18, 25), (30, 40)])
+        self.assertEqual(segments.overlapping(19, 31), [(10.0, 20.0), (18.0, 25.0), (30.0, 40.0)])
+        # Touching ends share no time
+        self.assertEqual(segments.overlapping(5, 10), [])
+        self.assertEqual(segments.overlapping(26, 29), [])
+
+    def test_overlapping_reaches_back_to_long_segments(self):
+        segments = SegmentList([(0, 1000), (500, 510), (990, 995)])
+        self.assertEqual(segments.overlapping(996, 999), [(0.0, 1000.0)])
+        segments.remove(0, 1000)
+        self.assertEqual(segments.overlapping(996, 999), [])
+        self.assertEqual(segments.overlapping(992, 999), [(990.0, 995.0)])
+
+
+class CoalesceTest(unittest.TestCase):
+    def test_merges_overlapping_and_nearby(self):
+        groups = coalesce_segments([(30, 40), (0, 10), (5, 12), (13, 15)], gap=1.0)
+        self.assertEqual(groups, [(0, 15, [(1, 0, 10), (2, 5, 12), (3, 13, 15)]), (30, 40, [(0, 30, 40)])])
+
+    def test_no_gap_keeps_apart(self):
+        groups = coalesce_segments([(0, 10), (10.5, 12)])
+        self.assertEqual([(start, end) for start, end, _ in groups], [(0, 10), (10.5, 12)])
+
+    def test_contained_segment_keeps_outer_end(self):
+        groups = coalesce_segments([(0, 100), (10, 20), (50, 60)])
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0][:2], (0, 100))
+        self.assertEqual([idx for idx, _, _ in groups[0][2]], [0, 1, 2])
+
+    def test_segment_list_coalesced(self):
+        self.assertEqual(SegmentList([(0, 5), (6, 8)]).coalesced(gap=2.0), [(0.0, 8.0, [(0, 0.0, 5.0), (1, 6.0, 8.0)])])
+
+
+if __name__ == '__main__':
+    unittest.main()
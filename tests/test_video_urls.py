@@ -0,0 +1,63 @@
+import unittest
+
+from video_urls import KIND_PLAYLIST, KIND_VIDEO, parse_youtube_url, split_urls
+
+VIDEO = 'dQw4w9WgXcQ'
+PLAYLIST = 'PLrAXtmErZgOeiKm4sgNOknGvNjby9efdf'
+
+CASES = [
+    (VIDEO, (KIND_VIDEO, VIDEO)),
+    (f'  {VIDEO}\n', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/watch?v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'http://youtube.com/watch?v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'www.youtube.com/watch?v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://m.youtube.com/watch?v={VIDEO}&feature=share', (KIND_VIDEO, VIDEO)),
+    (f'https://music.youtube.com/watch?v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://WWW.YouTube.com/watch?v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    # Time offsets don't change the video
+    (f'https://www.youtube.com/watch?v={VIDEO}&t=1m30s', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/watch?t=90&v={VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://youtu.be/{VIDEO}?t=42', (KIND_VIDEO, VIDEO)),
+    (f'https://youtu.be/{VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://youtu.be/{VIDEO}?si=abcdef', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/shorts/{VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://youtube.com/shorts/{VIDEO}?feature=share', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/live/{VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/embed/{VIDEO}?start=10', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube-nocookie.com/embed/{VIDEO}', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/v/{VIDEO}', (KIND_VIDEO, VIDEO)),
+    # A video in a playlist is the video; the playlist page is the playlist
+    (f'https://www.youtube.com/watch?v={VIDEO}&list={PLAYLIST}&index=3', (KIND_VIDEO, VIDEO)),
+    (f'https://www.youtube.com/playlist?list={PLAYLIST}', (KIND_PLAYLIST, PLAYLIST)),
+    (f'https://youtube.com/watch?list={PLAYLIST}', (KIND_PLAYLIST, PLAYLIST)),
+    # Rejected
+    ('', None),
+    (None, None),
+    ('dQw4w9WgXc', None),
+    ('not a url', None),
+    (f'https://vimeo.com/watch?v={VIDEO}', None),
+    (f'https://notyoutube.com/watch?v={VIDEO}', None),
+    (f'https://youtube.com.evil.example/watch?v={VIDEO}', None),
+    ('https://www.youtube.com/watch?v=tooshort', None),
+    ('https://www.youtube.com/', None),
+    ('https://www.youtube.com/@channel', None),
+    ('https://youtu.be/', None),
+    ('https://www.youtube.com/shorts/', None),
+]
+
+
+class ParseYoutubeUrlTest(unittest.TestCase):
+    def test_cases(self):
+        for text, expected in CASES:
+            with self.subTest(text=text):
+                self.assertEqual(parse_youtube_url(text), expected)
+
+
+class SplitUrlsTest(unittest.TestCase):
+    def test_whitespace_and_commas(self):
+        self.assertEqual(split_urls(' a\n b, c,,\td '), ['a', 'b', 'c', 'd'])
+        self.assertEqual(split_urls(None), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import re
+from urllib.parse import parse_qs, urlparse
+
+# Recognising the YouTube URL shapes people paste: watch pages, youtu.be links, shorts,
+# live and embed URLs, bare video ids, and playlists.
+
+VIDEO_ID_RE = re.compile(r'^[\w-]{11}$')
+YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com', 'youtu.be')
+PATH_PREFIXES = ('shorts', 'live', 'embed', 'v', 'e')
+
+KIND_VIDEO = 'video'
+KIND_PLAYLIST = 'playlist'
+
+
+def parse_youtube_url(text):
+    """(KIND_VIDEO, video id) or (KIND_PLAYLIST, playlist id) for a YouTube URL or bare id, else None.
+
+    A watch URL that also names a playlist is the video; only playlist pages (or a bare
+    list= link) are playlists.
+    """
+    text = (text or '').strip()
+    if VIDEO_ID_RE.match(text):
+        return KIND_VIDEO, text
+    parsed = urlparse(text if '://' in text else 'https://' + text)
+    host = (parsed.hostname or '').lower()
+    if not any(host == h or host.endswith('.' + h) for h in YOUTUBE_HOSTS):
+        return None
+    query = parse_qs(parsed.query)
+    parts = [p for p in parsed.path.split('/') if p]
+    video_id = None
+    if host.endswith('youtu.be'):
+        video_id = parts[0] if parts else None
+    elif query.get('v'):
+        video_id = query['v'][0]
+    elif len(parts) >= 2 and parts[0] in PATH_PREFIXES:
+        video_id = parts[1]
+    if video_id and VIDEO_ID_RE.match(video_id):
+        return KIND_VIDEO, video_id
+    if query.get('list'):
+        return KIND_PLAYLIST, query['list'][0]
+    return None
+
+
+def watch_url(video_id):
+    return f'https://www.youtube.com/watch?v={video_id}'
+
+
+def playlist_url(playlist_id):
+    return f'https://www.youtube.com/playlist?list={playlist_id}'
+
+
+def split_urls(text):
+    """URLs in pasted text, separated by whitespace or commas."""
+    return [part for part in re.split(r'[\s,]+', text or '') if part]